@@ -2,6 +2,7 @@ import configparser
 import inspect, os
 from SlicerDevelopmentToolboxUtils.mixins import ModuleWidgetMixin
 from .constants import SliceTrackerConstants as constants
+from .helpers import SeriesTypeManager
 
 
 class SliceTrackerConfiguration(ModuleWidgetMixin):
@@ -53,13 +54,44 @@ class SliceTrackerConfiguration(ModuleWidgetMixin):
     if not self.getSetting("Use_Deep_Learning"):
       self.setSetting("Use_Deep_Learning", config.get('Segmentation', 'Use_Deep_Learning'))
 
+    if not self.getSetting("Speculative_Preloading"):
+      self.setSetting("Speculative_Preloading", config.get('Registration', 'Speculative_Preloading'))
+
     if not self.getSetting("Incoming_DICOM_Port"):
       self.setSetting("Incoming_DICOM_Port", config.get('DICOM', 'Incoming_Port'))
 
+    if not self.getSetting("Series_Quiet_Period"):
+      self.setSetting("Series_Quiet_Period", config.get('DICOM', 'Series_Quiet_Period'))
+
+    if not self.getSetting("Series_Completion_Timeout"):
+      self.setSetting("Series_Completion_Timeout", config.get('DICOM', 'Series_Completion_Timeout'))
+
+    if not self.getSetting("Asynchronous_Writing"):
+      self.setSetting("Asynchronous_Writing", config.get('Storage', 'Asynchronous_Writing'))
+
+    if not self.getSetting("Writer_Threads"):
+      self.setSetting("Writer_Threads", config.get('Storage', 'Writer_Threads'))
+
+    if not self.getSetting("Compression"):
+      self.setSetting("Compression", config.get('Storage', 'Compression'))
+
+    if not self.getSetting("Compression_Level"):
+      self.setSetting("Compression_Level", config.get('Storage', 'Compression_Level'))
+
+    if not self.getSetting("Compression_Threads"):
+      self.setSetting("Compression_Threads", config.get('Storage', 'Compression_Threads'))
+
+    if not self.getSetting("Prefetched_Results"):
+      self.setSetting("Prefetched_Results", config.get('Storage', 'Prefetched_Results'))
+
     if not self.getSetting("CASE_NUMBER_OF_DIGITS"):
       self.setSetting("CASE_NUMBER_OF_DIGITS", config.get('General', 'CASE_NUMBER_OF_DIGITS'))
 
+    if not self.getSetting("Loaded_Series_Memory_Budget"):
+      self.setSetting("Loaded_Series_Memory_Budget", config.get('General', 'Loaded_Series_Memory_Budget'))
+
     self.replaceOldValues()
+    SeriesTypeManager.invalidateSeriesTypePatterns()
 
   def replaceOldValues(self):
     for setting in ['PLANNING_IMAGE', 'COVER_TEMPLATE', 'COVER_PROSTATE', 'NEEDLE_IMAGE', 'VIBE_IMAGE']:
@@ -9,6 +9,8 @@ class SliceTrackerConstants(object):
   INTRAOP_SAMPLE_DATA_URL = 'https://github.com/SlicerProstate/SliceTracker/releases/download/test-data/Intraop-deid.zip'
 
   JSON_FILENAME = "results.json"
+  DICOM_INDEX_FILENAME = "intraopDICOMIndex.json"
+  CONTENT_STORE_DIRECTORY = "store"
 
   MISSING_PREOP_ANNOTATION_TEXT = "No preop data available"
   LEFT_VIEWER_SLICE_ANNOTATION_TEXT = 'BIOPSY PLAN'
@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import logging
+
+try:
+  from pydicom import dcmread as readDICOMFile
+except ImportError:
+  from dicom import read_file as readDICOMFile
+
+from SlicerDevelopmentToolboxUtils.exceptions import DICOMValueError
+from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
+
+
+class DICOMHeaderRecord(object):
+  """ Compact record of all header attributes SliceTracker needs from a received DICOM file.
+
+  The header is parsed exactly once (without pixel data) and every consumer (series assembly, patient ID
+  verification, patient information) reads from the record instead of the file.
+  """
+
+  __slots__ = ["seriesNumber", "seriesDescription", "patientID", "patientName", "instanceNumber",
+               "acquisitionNumber", "imagesInAcquisition", "signature"]
+
+  @staticmethod
+  def createFromFile(filePath, signature=None):
+    dataset = readDICOMFile(filePath, stop_before_pixels=True)
+    record = DICOMHeaderRecord()
+    record.seriesNumber = DICOMHeaderRecord._getIntegerValue(dataset, "SeriesNumber")
+    record.seriesDescription = DICOMHeaderRecord._getStringValue(dataset, "SeriesDescription")
+    record.patientID = DICOMHeaderRecord._getStringValue(dataset, "PatientID")
+    record.patientName = DICOMHeaderRecord._getStringValue(dataset, "PatientName")
+    record.instanceNumber = DICOMHeaderRecord._getIntegerValue(dataset, "InstanceNumber")
+    record.acquisitionNumber = DICOMHeaderRecord._getIntegerValue(dataset, "AcquisitionNumber")
+    record.imagesInAcquisition = DICOMHeaderRecord._getIntegerValue(dataset, "ImagesInAcquisition") or \
+                                 DICOMHeaderRecord._getIntegerValue(dataset, "NumberOfSlices")
+    record.signature = signature
+    return record
+
+  @staticmethod
+  def createFromJSON(data):
+    record = DICOMHeaderRecord()
+    for attribute in DICOMHeaderRecord.__slots__:
+      setattr(record, attribute, data.get(attribute))
+    return record
+
+  @staticmethod
+  def _getIntegerValue(dataset, keyword):
+    try:
+      return int(getattr(dataset, keyword))
+    except (AttributeError, TypeError, ValueError):
+      return None
+
+  @staticmethod
+  def _getStringValue(dataset, keyword):
+    value = getattr(dataset, keyword, None)
+    return str(value).strip() if value is not None else ""
+
+  @property
+  def seriesNumberDescription(self):
+    if not (self.seriesNumber and self.seriesDescription):
+      raise DICOMValueError("Missing Attribute(s):\nseriesNumber: {}\nseriesDescription: {}"
+                            .format(self.seriesNumber, self.seriesDescription))
+    return "{}: {}".format(self.seriesNumber, self.seriesDescription)
+
+  def getPatientInformation(self):
+    return {
+      "PatientID": self.patientID,
+      "PatientName": self.patientName,
+      "SeriesDescription": self.seriesDescription}
+
+  def toJSON(self):
+    return {attribute: getattr(self, attribute) for attribute in self.__slots__}
+
+
+class IntraopDICOMIndex(ModuleLogicMixin):
+  """ Persistent per case index of the files received into the intraop DICOM directory.
+
+  Each file is parsed once into a DICOMHeaderRecord which is stored together with a size/mtime signature. Building
+  the loadable file list for a series is a lookup instead of a header read for every file in the directory.
+
+  Files which could not be parsed (e.g. files that are not DICOM) are kept as ignored files with only their signature,
+  so they are neither parsed nor reported again as long as they do not change.
+
+  The list of announced series and their receive timestamps are stored along with the records. Together with a
+  signature of the directory this allows to resume a case by only touching files that are new since it was closed.
+  """
+
+  VERSION = 3
+
+  def __init__(self, directory, indexFile):
+    self.directory = directory
+    self.indexFile = indexFile
+    self._entries = {}
+    self._seriesFiles = {}
+    self._ignoredFiles = {}
+    self.receivedSeries = []
+    self.seriesTimeStamps = {}
+    self.directorySignature = None
+    self.load()
+
+  def load(self):
+    self._entries = {}
+    self._seriesFiles = {}
+    self._ignoredFiles = {}
+    self.receivedSeries = []
+    self.seriesTimeStamps = {}
+    self.directorySignature = None
+    if not self.indexFile or not os.path.exists(self.indexFile):
+      return
+    try:
+      with open(self.indexFile) as indexFile:
+        data = json.load(indexFile)
+    except ValueError:
+      logging.warning("Intraop DICOM index %s could not be read and will be rebuilt" % self.indexFile)
+      return
+    if data.get("version") != self.VERSION:
+      return
+    for fileName, entry in data["files"].items():
+      self._addEntry(fileName, DICOMHeaderRecord.createFromJSON(entry))
+    self._ignoredFiles = data.get("ignoredFiles", {})
+    self.receivedSeries = data.get("receivedSeries", [])
+    self.seriesTimeStamps = data.get("seriesTimeStamps", {})
+    self.directorySignature = data.get("directorySignature")
+
+  def save(self):
+    if not self.indexFile:
+      return
+    directory = os.path.dirname(self.indexFile)
+    if not os.path.exists(directory):
+      self.createDirectory(directory)
+    self.directorySignature = self.getDirectorySignature()
+    with open(self.indexFile, 'w') as indexFile:
+      json.dump({"version": self.VERSION,
+                 "files": {fileName: record.toJSON() for fileName, record in self._entries.items()},
+                 "ignoredFiles": self._ignoredFiles,
+                 "receivedSeries": self.receivedSeries,
+                 "seriesTimeStamps": self.seriesTimeStamps,
+                 "directorySignature": self.directorySignature}, indexFile)
+
+  def setReceivedSeries(self, seriesList, seriesTimeStamps):
+    self.receivedSeries = list(seriesList)
+    self.seriesTimeStamps = {series: seriesTimeStamps[series] for series in seriesList if series in seriesTimeStamps}
+
+  def getDirectorySignature(self):
+    """ :return: number of indexed and ignored files and modification time of the directory """
+    if not os.path.exists(self.directory):
+      return None
+    return [len(self._entries) + len(self._ignoredFiles), os.stat(self.directory).st_mtime]
+
+  def synchronize(self, fileNames):
+    """ Compares the directory content with the index without reading any file
+
+    Entries of files which do not exist anymore are removed. If the directory signature did not change since the index
+    has been saved, no file has been added, removed or renamed and only files which are neither indexed nor ignored
+    (e.g. files that have not been indexed before closing the case) need to be looked at. Otherwise the size/mtime
+    signature of every file is compared with its record.
+
+    The modification time of the directory does not change if a file is overwritten in place. Such a file is only
+    indexed again once another file got added or removed, or when it is received again.
+
+    :param fileNames: file names relative to the indexed directory
+    :return: list of file names that are not indexed yet or changed since they have been indexed
+    """
+    fileNames = [self._relativePath(f) for f in fileNames]
+    if self.directorySignature is not None and self.directorySignature == self.getDirectorySignature():
+      return [f for f in fileNames if f not in self._entries and f not in self._ignoredFiles]
+    existingFiles = set(fileNames)
+    for fileName in [f for f in self._entries.keys() if f not in existingFiles]:
+      self._removeEntry(fileName)
+    for fileName in [f for f in self._ignoredFiles.keys() if f not in existingFiles]:
+      del self._ignoredFiles[fileName]
+    return [f for f in fileNames if not self.isUpToDate(f, self.getSignature(f))]
+
+  def update(self, fileNames):
+    """ Indexes all files which are unknown or changed since they have been indexed
+
+    :param fileNames: file names relative to the indexed directory
+    :return: list of file names that have been (re-)indexed
+    """
+    indexed = []
+    for fileName in [self._relativePath(f) for f in fileNames]:
+      signature = self.getSignature(fileName)
+      if self.isUpToDate(fileName, signature):
+        continue
+      self.addRecord(fileName, DICOMHeaderRecord.createFromFile(os.path.join(self.directory, fileName), signature))
+      indexed.append(fileName)
+    return indexed
+
+  def addRecord(self, fileName, record):
+    fileName = self._relativePath(fileName)
+    if fileName in self._entries:
+      self._removeEntry(fileName)
+    self._ignoredFiles.pop(fileName, None)
+    self._addEntry(fileName, record)
+
+  def ignoreFile(self, fileName, signature):
+    """ Remembers a file which could not be parsed so that it is skipped until its signature changes """
+    fileName = self._relativePath(fileName)
+    if fileName in self._entries:
+      self._removeEntry(fileName)
+    self._ignoredFiles[fileName] = signature
+
+  def isUpToDate(self, fileName, signature):
+    """ :return: True if the file has been indexed or ignored with the given signature """
+    fileName = self._relativePath(fileName)
+    record = self._entries.get(fileName)
+    if record is None:
+      return self._ignoredFiles.get(fileName) == signature
+    return record.signature == signature
+
+  def getSignature(self, fileName):
+    stat = os.stat(os.path.join(self.directory, fileName))
+    return [stat.st_size, stat.st_mtime]
+
+  def isIndexed(self, fileName):
+    return self._relativePath(fileName) in self._entries
+
+  def getRecord(self, fileName):
+    return self._entries.get(self._relativePath(fileName))
+
+  def getSeriesNumbers(self):
+    return sorted(n for n in self._seriesFiles.keys() if n is not None)
+
+  def getRecordsForSeries(self, seriesNumber):
+    return [self._entries[f] for f in self._seriesFiles.get(seriesNumber, [])]
+
+  def getFilesForSeries(self, seriesNumber):
+    fileNames = sorted(self._seriesFiles.get(seriesNumber, []),
+                       key=lambda f: (self._entries[f].instanceNumber or 0, f))
+    return [os.path.join(self.directory, f) for f in fileNames]
+
+  def removeSeries(self, seriesNumber):
+    for fileName in list(self._seriesFiles.get(seriesNumber, [])):
+      self._removeEntry(fileName)
+
+  def _relativePath(self, fileName):
+    return os.path.relpath(os.path.join(self.directory, fileName), self.directory)
+
+  def _addEntry(self, fileName, record):
+    self._entries[fileName] = record
+    self._seriesFiles.setdefault(record.seriesNumber, set()).add(fileName)
+
+  def _removeEntry(self, fileName):
+    record = self._entries.pop(fileName)
+    seriesFiles = self._seriesFiles[record.seriesNumber]
+    seriesFiles.discard(fileName)
+    if not seriesFiles:
+      del self._seriesFiles[record.seriesNumber]
+
+
+class SeriesCompletenessDetector(object):
+  """ Decides whether all files of a received series have arrived.
+
+  The expected number of images (ImagesInAcquisition or NumberOfSlices) counts the images of one acquisition, so
+  received instances are counted per AcquisitionNumber. A series is considered complete once every acquisition
+  received so far has its expected number of images and no file has been received for quietPeriod seconds, as further
+  acquisitions (e.g. of a multi-echo series) may follow. Without an expected number, a series is complete once its
+  instance numbers are contiguous and it has been quiet for quietPeriod seconds. Any series without new files for
+  timeout seconds is considered complete so that incomplete transfers are still announced eventually.
+  """
+
+  def __init__(self, index, quietPeriod, timeout):
+    self.index = index
+    self.quietPeriod = quietPeriod
+    self.timeout = timeout
+
+  def isComplete(self, seriesNumber, now=None):
+    records = self.index.getRecordsForSeries(seriesNumber)
+    if not len(records):
+      return False
+    now = now if now is not None else time.time()
+    quietTime = now - max(record.signature[1] for record in records)
+    if quietTime >= self.timeout:
+      return True
+    if quietTime < self.quietPeriod:
+      return False
+    acquisitions = self._getAcquisitions(records)
+    if all(expected for expected, _ in acquisitions.values()):
+      return all(received >= expected for expected, received in acquisitions.values())
+    return self._hasContiguousInstanceNumbers(records)
+
+  @staticmethod
+  def _getAcquisitions(records):
+    """ :return: dictionary acquisition number -> [expected number of images, number of received images] """
+    acquisitions = {}
+    for record in records:
+      acquisition = acquisitions.setdefault(record.acquisitionNumber, [0, 0])
+      acquisition[0] = max(acquisition[0], record.imagesInAcquisition or 0)
+      acquisition[1] += 1
+    return acquisitions
+
+  @staticmethod
+  def _hasContiguousInstanceNumbers(records):
+    instanceNumbers = set(record.instanceNumber for record in records)
+    if None in instanceNumbers:
+      return False
+    instanceNumbers = sorted(instanceNumbers)
+    return instanceNumbers[-1] - instanceNumbers[0] + 1 == len(instanceNumbers)
@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+import ctk
+import qt
+import vtk
+import slicer
+
+from SlicerDevelopmentToolboxUtils.constants import DICOMTAGS
+from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
+
+from .dicomIndex import DICOMHeaderRecord
+
+
+class IntraopDICOMIngestPipeline(ModuleLogicMixin):
+  """ Ingests received intraop DICOM files without blocking the GUI thread.
+
+  Header parsing runs on a worker thread. Parsed files are added to the Slicer DICOM database and to the intraop index
+  on the main thread in chunks driven by a timer, so that the event loop keeps running in between. Each chunk is
+  inserted into the database with a single list based indexer call (one transaction). Once all files of an enqueued
+  batch are committed, BatchCommittedEvent is invoked (on the main thread) with the batch file names as call data.
+  Progress is published with IngestProgressEvent at most once every PROGRESS_INTERVAL seconds.
+  """
+
+  IngestProgressEvent = vtk.vtkCommand.UserEvent + 471
+  BatchCommittedEvent = vtk.vtkCommand.UserEvent + 472
+
+  POLL_INTERVAL = 50
+  PROGRESS_INTERVAL = 0.25
+  COMMIT_CHUNK_SIZE = 100
+
+  TAGS_TO_PRECACHE = [DICOMTAGS.PATIENT_NAME, DICOMTAGS.PATIENT_ID, DICOMTAGS.PATIENT_BIRTH_DATE, DICOMTAGS.STUDY_DATE,
+                      DICOMTAGS.SERIES_NUMBER, DICOMTAGS.SERIES_DESCRIPTION]
+
+  @property
+  def busy(self):
+    return self._numberOfEnqueuedFiles > self._numberOfCommittedFiles
+
+  def __init__(self, index):
+    self.index = index
+    self._inputQueue = queue.Queue()
+    self._outputQueue = queue.Queue()
+    self._pendingBatches = deque()
+    self._numberOfEnqueuedFiles = 0
+    self._numberOfCommittedFiles = 0
+    self._lastProgressTime = 0
+    self._stopped = False
+    self._tagPrecachingInitialized = False
+    self._timer = qt.QTimer()
+    self._timer.setInterval(self.POLL_INTERVAL)
+    self._timer.timeout.connect(self._onTimeout)
+    self._worker = threading.Thread(target=self._parseHeaders, name="IntraopDICOMIngest")
+    self._worker.daemon = True
+    self._worker.start()
+
+  def enqueue(self, fileNames):
+    if self._stopped or not len(fileNames):
+      return
+    self._numberOfEnqueuedFiles += len(fileNames)
+    self._inputQueue.put(list(fileNames))
+    if not self._timer.isActive():
+      self._timer.start()
+
+  def waitForCompletion(self):
+    """ Blocks until every enqueued file has been parsed and committed. Must be called from the main thread. """
+    self._inputQueue.join()
+    self._collectParsedBatches()
+    while self._pendingBatches:
+      self._commitParsedFiles(maximum=None)
+    self._timer.stop()
+
+  def stop(self):
+    self._stopped = True
+    self._timer.stop()
+    self._inputQueue.put(None)
+
+  def _parseHeaders(self):
+    while True:
+      fileNames = self._inputQueue.get()
+      try:
+        if fileNames is None:
+          return
+        records = {}
+        ignoredFiles = {}
+        for fileName in fileNames:
+          if self._stopped:
+            break
+          signature = None
+          try:
+            signature = self.index.getSignature(fileName)
+            if not self.index.isUpToDate(fileName, signature):
+              records[fileName] = DICOMHeaderRecord.createFromFile(os.path.join(self.index.directory, fileName),
+                                                                   signature)
+          except Exception as exc:
+            logging.error("Failed to read DICOM header of %s: %s" % (fileName, exc))
+            if signature is not None:
+              ignoredFiles[fileName] = signature
+        self._outputQueue.put((fileNames, records, ignoredFiles))
+      finally:
+        self._inputQueue.task_done()
+
+  def _onTimeout(self):
+    self._collectParsedBatches()
+    self._commitParsedFiles(maximum=self.COMMIT_CHUNK_SIZE)
+    if not self.busy:
+      self._timer.stop()
+
+  def _collectParsedBatches(self):
+    while True:
+      try:
+        fileNames, records, ignoredFiles = self._outputQueue.get_nowait()
+      except queue.Empty:
+        return
+      for fileName, signature in ignoredFiles.items():
+        self.index.ignoreFile(fileName, signature)
+      self._pendingBatches.append([fileNames, records, 0])
+
+  def _commitParsedFiles(self, maximum):
+    committed = 0
+    while self._pendingBatches and (maximum is None or committed < maximum):
+      batch = self._pendingBatches[0]
+      fileNames, records, position = batch
+      chunk = fileNames[position:] if maximum is None else fileNames[position:position + maximum - committed]
+      self._insertIntoDatabase(chunk, records)
+      batch[2] += len(chunk)
+      committed += len(chunk)
+      self._numberOfCommittedFiles += len(chunk)
+      self._publishProgress(chunk[-1] if len(chunk) else None)
+      if batch[2] == len(fileNames):
+        self._pendingBatches.popleft()
+        self.index.save()
+        self.invokeEvent(self.BatchCommittedEvent, str(fileNames))
+
+  def _insertIntoDatabase(self, fileNames, records):
+    if not slicer.dicomDatabase:
+      logging.error("slicer.dicomDatabase is not initialized!")
+      return
+    self._initializeTagPrecaching()
+    filePaths = [os.path.join(self.index.directory, fileName) for fileName in fileNames]
+    indexer = ctk.ctkDICOMIndexer()
+    if hasattr(indexer, "addListOfFiles"):
+      indexer.addListOfFiles(slicer.dicomDatabase, filePaths, None)
+    else:
+      logging.debug("ctkDICOMIndexer.addListOfFiles is not available. Adding files one by one.")
+      for filePath in filePaths:
+        indexer.addFile(slicer.dicomDatabase, filePath, None)
+    for fileName in [f for f in fileNames if f in records]:
+      self.index.addRecord(fileName, records[fileName])
+
+  def _initializeTagPrecaching(self):
+    if self._tagPrecachingInitialized:
+      return
+    tags = list(slicer.dicomDatabase.tagsToPrecache)
+    slicer.dicomDatabase.tagsToPrecache = tags + [tag for tag in self.TAGS_TO_PRECACHE if tag not in tags]
+    self._tagPrecachingInitialized = True
+
+  def _publishProgress(self, fileName):
+    now = time.time()
+    if fileName is None or (now - self._lastProgressTime < self.PROGRESS_INTERVAL and self.busy):
+      return
+    self._lastProgressTime = now
+    self.invokeEvent(self.IngestProgressEvent, str(["Indexing file %s" % fileName,
+                                                    self._numberOfEnqueuedFiles, self._numberOfCommittedFiles]))
@@ -104,16 +104,71 @@ class SeriesTypeManager(LogicBase):
 
   MODULE_NAME = constants.MODULE_NAME
 
+  # series types in the order of precedence of their patterns
+  SERIES_TYPE_PATTERN_SETTINGS = [(constants.COVER_PROSTATE, "COVER_PROSTATE_PATTERN"),
+                                  (constants.COVER_TEMPLATE, "COVER_TEMPLATE_PATTERN"),
+                                  (constants.GUIDANCE_IMAGE, "NEEDLE_IMAGE_PATTERN"),
+                                  (constants.VIBE_IMAGE, "VIBE_IMAGE_PATTERN")]
+
+  TRACKABLE_SERIES_TYPES = frozenset(constants.TRACKABLE_IMAGE_TYPES)
+  NOT_SKIPPABLE_SERIES_TYPES = frozenset([constants.COVER_PROSTATE, constants.COVER_TEMPLATE])
+
   __metaclass__ = Singleton
 
   assignedSeries = {}
 
+  _seriesTypeMatcher = None
+
+  # prefix of series description patterns which are regular expressions rather than literal substrings
+  REGEX_PATTERN_PREFIX = "re:"
+
+  @classmethod
+  def invalidateSeriesTypePatterns(cls):
+    """ Needs to be called whenever one of the series description pattern settings changed """
+    cls._seriesTypeMatcher = None
+
   def __init__(self):
     LogicBase.__init__(self)
     self.seriesTypes = self.getSetting("SERIES_TYPES")
 
   def clear(self):
     self.assignedSeries = {}
+    self.invalidateSeriesTypePatterns()
+
+  def getSeriesTypeMatcher(self):
+    if SeriesTypeManager._seriesTypeMatcher is None:
+      SeriesTypeManager._seriesTypeMatcher = self.compileSeriesTypePatterns()
+    return SeriesTypeManager._seriesTypeMatcher
+
+  def compileSeriesTypePatterns(self):
+    """ Compiles all series description patterns into a single regular expression
+
+    Patterns are matched literally as a substring of the description unless they start with REGEX_PATTERN_PREFIX,
+    the rest of those is searched for as a regular expression. Invalid expressions are logged and ignored. Each
+    pattern is a lookahead alternative anchored at the start of the description, so the first pattern (in order of
+    SERIES_TYPE_PATTERN_SETTINGS) found anywhere in the description wins.
+
+    :return: tuple of the compiled expression and a dictionary group name -> series type
+    """
+    alternatives = []
+    groupTypes = {}
+    for seriesType, setting in self.SERIES_TYPE_PATTERN_SETTINGS:
+      pattern = self.getSetting(setting)
+      if not pattern:
+        continue
+      if pattern.startswith(self.REGEX_PATTERN_PREFIX):
+        pattern = pattern[len(self.REGEX_PATTERN_PREFIX):]
+        try:
+          re.compile(pattern)
+        except re.error as exc:
+          logging.error("Ignoring invalid regular expression %s of %s: %s" % (pattern, setting, exc))
+          continue
+      else:
+        pattern = re.escape(pattern)
+      groupName = "seriesType%d" % len(alternatives)
+      alternatives.append("(?=.*?(?P<%s>%s))" % (groupName, pattern))
+      groupTypes[groupName] = seriesType
+    return re.compile("^(?:%s)" % "|".join(alternatives), re.DOTALL) if alternatives else None, groupTypes
 
   def getSeriesType(self, series):
     try:
@@ -123,17 +178,11 @@ class SeriesTypeManager(LogicBase):
     return self.assignedSeries[series]
 
   def computeSeriesType(self, series):
-    if self.getSetting("COVER_PROSTATE_PATTERN") in series:
-      seriesType = constants.COVER_PROSTATE
-    elif self.getSetting("COVER_TEMPLATE_PATTERN") in series:
-      seriesType = constants.COVER_TEMPLATE
-    elif self.getSetting("NEEDLE_IMAGE_PATTERN") in series:
-      seriesType = constants.GUIDANCE_IMAGE
-    elif self.getSetting("VIBE_IMAGE_PATTERN") in series:
-      seriesType = constants.VIBE_IMAGE
-    else:
-      seriesType = constants.OTHER_IMAGE
-    return seriesType
+    expression, groupTypes = self.getSeriesTypeMatcher()
+    match = expression.match(series) if expression else None
+    if match is None:
+      return constants.OTHER_IMAGE
+    return next(seriesType for name, seriesType in groupTypes.items() if match.group(name) is not None)
 
   def autoAssign(self, series):
     self.assignedSeries[series] = self.getSeriesType(series)
@@ -166,6 +215,12 @@ class SeriesTypeManager(LogicBase):
                                                                       self.isGuidance(series) or
                                                                       self.isVibe(series))
 
+  def isTrackable(self, series):
+    return self.getSeriesType(series) in self.TRACKABLE_SERIES_TYPES
+
+  def isSkippable(self, series):
+    return self.getSeriesType(series) not in self.NOT_SKIPPABLE_SERIES_TYPES
+
   def _hasSeriesType(self, series, seriesType):
     return self.getSeriesType(series) == seriesType
 
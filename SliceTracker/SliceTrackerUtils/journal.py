@@ -0,0 +1,159 @@
+import os
+import json
+import logging
+
+from .storage import replaceFile
+
+
+class SessionJournal(object):
+  """ Append only journal of the changes to the session data stored in results.json.
+
+  save(data) compares the session data with what has been persisted before and appends one JSON line per change to
+  <snapshot>.journal: resultCreated, statusChanged, targetsModified, resultModified or resultRemoved for registration
+  results and sectionChanged/sectionRemoved for all other top level sections. Entries carry the complete new value, so
+  replaying them is idempotent. Once COMPACTION_THRESHOLD entries have been appended (and on compact()) the data is
+  written to the snapshot file via a temporary file and a rename, then the journal is removed.
+
+  read(snapshotFileName) returns the snapshot with the journal replayed on top of it. A truncated last line, e.g. after
+  a crash while appending, is ignored.
+  """
+
+  JOURNAL_EXTENSION = ".journal"
+  COMPACTION_THRESHOLD = 50
+
+  @classmethod
+  def getJournalFileName(cls, snapshotFileName):
+    return os.path.splitext(snapshotFileName)[0] + cls.JOURNAL_EXTENSION
+
+  @classmethod
+  def read(cls, snapshotFileName):
+    with open(snapshotFileName) as f:
+      data = json.load(f)
+    journalFileName = cls.getJournalFileName(snapshotFileName)
+    if os.path.exists(journalFileName):
+      cls.replay(data, cls.readEntries(journalFileName))
+    return data
+
+  @staticmethod
+  def readEntries(journalFileName):
+    entries = []
+    with open(journalFileName) as f:
+      for lineNumber, line in enumerate(f, start=1):
+        if not line.strip():
+          continue
+        try:
+          entries.append(json.loads(line))
+        except ValueError:
+          logging.warning("Ignoring incomplete journal entry %s:%d" % (journalFileName, lineNumber))
+    return entries
+
+  @staticmethod
+  def replay(data, entries):
+    results = data.setdefault("results", [])
+    for entry in entries:
+      event = entry["event"]
+      if event == "sectionChanged":
+        data[entry["section"]] = entry["value"]
+      elif event == "sectionRemoved":
+        data.pop(entry["section"], None)
+      elif event == "resultRemoved":
+        results[:] = [r for r in results if r["name"] != entry["name"]]
+      else:
+        index = next((i for i, r in enumerate(results) if r["name"] == entry["result"]["name"]), None)
+        if index is None:
+          results.append(entry["result"])
+        else:
+          results[index] = entry["result"]
+    return data
+
+  def __init__(self, snapshotFileName):
+    self.snapshotFileName = snapshotFileName
+    self.journalFileName = self.getJournalFileName(snapshotFileName)
+    self._persistedSections = None
+    self._persistedResults = None
+    self._numberOfEntries = 0
+    self._data = None
+    self._serialized = None
+
+  def save(self, data):
+    """ :return: True if anything was written """
+    self._data = data
+    self._serialized = self._serializeSections(data), self._serializeResults(data)
+    if self._persistedSections is None or not os.path.exists(self.snapshotFileName):
+      self.compact()
+      return True
+    entries = self.createEntries(data, *self._serialized)
+    if not entries:
+      return False
+    if self._numberOfEntries + len(entries) > self.COMPACTION_THRESHOLD:
+      self.compact()
+    else:
+      self.append(entries)
+    return True
+
+  def createEntries(self, data, sections, results):
+    entries = []
+    for section in [s for s in sections if sections[s] != self._persistedSections.get(s)]:
+      entries.append({"event": "sectionChanged", "section": section, "value": data[section]})
+    for section in [s for s in self._persistedSections if s not in sections]:
+      entries.append({"event": "sectionRemoved", "section": section})
+
+    for name, (serialized, result) in results.items():
+      persisted = self._persistedResults.get(name)
+      if persisted is None:
+        entries.append({"event": "resultCreated", "result": result})
+      elif persisted[0] != serialized:
+        entries.append({"event": self._getResultChangeEvent(persisted[1], result), "result": result})
+    for name in [n for n in self._persistedResults if n not in results]:
+      entries.append({"event": "resultRemoved", "name": name})
+    return entries
+
+  @staticmethod
+  def _getResultChangeEvent(persisted, result):
+    if persisted.get("status") != result.get("status"):
+      return "statusChanged"
+    if persisted.get("targets") != result.get("targets"):
+      return "targetsModified"
+    return "resultModified"
+
+  def append(self, entries):
+    # a line cut off by a crash while appending would otherwise swallow the first new entry
+    separator = "\n" if self._endsWithIncompleteLine() else ""
+    with open(self.journalFileName, 'a') as f:
+      f.write(separator + "".join(json.dumps(entry) + "\n" for entry in entries))
+      f.flush()
+      os.fsync(f.fileno())
+    self._numberOfEntries += len(entries)
+    self._persistedSections, self._persistedResults = self._serialized
+    logging.debug("Appended %d entries to %s" % (len(entries), self.journalFileName))
+
+  def _endsWithIncompleteLine(self):
+    if not os.path.exists(self.journalFileName) or not os.path.getsize(self.journalFileName):
+      return False
+    with open(self.journalFileName, 'rb') as f:
+      f.seek(-1, os.SEEK_END)
+      return f.read(1) != b"\n"
+
+  def compact(self):
+    """ Writes the data of the last save into the snapshot file and removes the journal """
+    if self._data is None:
+      return
+    temporaryFileName = self.snapshotFileName + ".tmp"
+    with open(temporaryFileName, 'w') as f:
+      json.dump(self._data, f, indent=2)
+      f.flush()
+      os.fsync(f.fileno())
+    replaceFile(temporaryFileName, self.snapshotFileName)
+    if os.path.exists(self.journalFileName):
+      os.remove(self.journalFileName)
+    self._numberOfEntries = 0
+    self._persistedSections, self._persistedResults = self._serialized
+    logging.debug("Wrote registration results to %s" % self.snapshotFileName)
+
+  @staticmethod
+  def _serializeSections(data):
+    return {key: json.dumps(value, sort_keys=True) for key, value in data.items() if key != "results"}
+
+  @staticmethod
+  def _serializeResults(data):
+    return {result["name"]: (json.dumps(result, sort_keys=True), result) for result in data.get("results", [])}
@@ -0,0 +1,147 @@
+import logging
+from collections import deque
+
+import qt
+import slicer
+
+from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
+
+
+class PreparedFixedLabel(object):
+
+  def __init__(self, series, label, coverProstateResult, initialTransform):
+    self.series = series
+    self.label = label
+    self.inputs = PreparedFixedLabel.getInputsSignature(coverProstateResult, initialTransform)
+    self.cliNode = None
+    self.finished = False
+
+  @staticmethod
+  def getInputsSignature(coverProstateResult, initialTransform):
+    return (coverProstateResult.name,
+            initialTransform.GetID() if initialTransform else None,
+            initialTransform.GetMTime() if initialTransform else None)
+
+
+class SpeculativeRegistrationPreloader(ModuleLogicMixin):
+  """ Prepares registration inputs for newly received series before the user asks for tracking.
+
+  The series volume is loaded once the main thread is idle. For guidance series, the fixed label is created by
+  resampling the approved cover prostate label into the guidance volume with an asynchronously running BRAINSResample
+  and dilating it afterwards. SliceTrackerSession.applyRegistration takes the prepared label if its inputs (approved
+  cover prostate result and initial transform) are still the same.
+  """
+
+  def __init__(self, session):
+    self.session = session
+    self._queue = deque()
+    self._prepared = {}
+
+  def schedule(self, series):
+    if series in self._queue:
+      return
+    self._queue.append(series)
+    qt.QTimer.singleShot(0, self._processNext)
+
+  def clear(self):
+    self._queue.clear()
+    for series in list(self._prepared.keys()):
+      self._discard(series)
+
+  def isPending(self, series):
+    return series in self._queue or series in self._prepared
+
+  def takePreparedFixedLabel(self, series, coverProstateResult, initialTransform):
+    prepared = self._prepared.get(series)
+    if not prepared:
+      return None
+    if not prepared.finished or \
+       prepared.inputs != PreparedFixedLabel.getInputsSignature(coverProstateResult, initialTransform):
+      self._discard(series)
+      return None
+    del self._prepared[series]
+    logging.debug("Using speculatively prepared fixed label for series %s" % series)
+    return prepared.label
+
+  def _processNext(self):
+    if not len(self._queue):
+      return
+    series = self._queue.popleft()
+    if not self.session.isTrackingPossible(series):
+      return
+    volume = self.session.getOrCreateVolumeForSeries(series)
+    if self.session.seriesTypeManager.isGuidance(series):
+      self._prepareFixedLabel(series, volume)
+
+  def _prepareFixedLabel(self, series, volume):
+    coverProstateResult = self.session.data.getMostRecentApprovedCoverProstateRegistration()
+    if not coverProstateResult:
+      return
+    initialTransform = self.session.data.getMostRecentApprovedTransform()
+    if not initialTransform and sum([1 for result in self.session.data.getResultsAsList() if result.approved]) > 1:
+      return
+    self._discard(series)
+    label = self.volumesLogic.CreateAndAddLabelVolume(slicer.mrmlScene, volume, volume.GetName() + '-label')
+    prepared = PreparedFixedLabel(series, label, coverProstateResult, initialTransform)
+    params = {'inputVolume': coverProstateResult.labels.fixed, 'referenceVolume': volume, 'outputVolume': label,
+              'interpolationMode': 'NearestNeighbor', 'pixelType': 'short'}
+    if initialTransform:
+      params['warpTransform'] = initialTransform
+    prepared.cliNode = slicer.cli.run(slicer.modules.brainsresample, None, params, wait_for_completion=False)
+    prepared.cliNode.AddObserver(slicer.vtkMRMLCommandLineModuleNode.StatusModifiedEvent,
+                                 lambda caller, event: self._onResampleStatusModified(prepared))
+    self._prepared[series] = prepared
+
+  def _onResampleStatusModified(self, prepared):
+    if prepared.cliNode is None or prepared.cliNode.IsBusy():
+      return
+    cliNode, prepared.cliNode = prepared.cliNode, None
+    if self._prepared.get(prepared.series) is not prepared:
+      return
+    if cliNode.GetStatusString() != 'Completed':
+      logging.debug("Speculative fixed label preparation failed for series %s" % prepared.series)
+      self._discard(prepared.series)
+      return
+    self.dilateMask(prepared.label, dilateValue=self.session.segmentedLabelValue)
+    prepared.finished = True
+
+  def _discard(self, series):
+    prepared = self._prepared.pop(series, None)
+    if not prepared:
+      return
+    if prepared.cliNode:
+      prepared.cliNode.Cancel()
+      prepared.cliNode = None
+    if prepared.label and prepared.label.GetScene():
+      slicer.mrmlScene.RemoveNode(prepared.label)
+
+
+class RegistrationResultPrefetcher(object):
+  """ Loads the data of registration results of a resumed case while the main thread is idle.
+
+  SessionData.load only reads the metadata of results, their MRML nodes are loaded on first access. Results that are
+  likely to be looked at next (see SessionData.getResultsToPrefetch) are loaded ahead of time, one result per event
+  loop iteration so that the user interface stays responsive.
+  """
+
+  def __init__(self):
+    self._queue = deque()
+
+  def schedule(self, results):
+    wasIdle = not len(self._queue)
+    self._queue.extend(result for result in results if not result.dataLoaded and result not in self._queue)
+    if wasIdle and len(self._queue):
+      qt.QTimer.singleShot(0, self._processNext)
+
+  def clear(self):
+    self._queue.clear()
+
+  def _processNext(self):
+    if not len(self._queue):
+      return
+    result = self._queue.popleft()
+    if not result.dataLoaded:
+      logging.debug("Prefetching data of registration result %s" % result.name)
+      result.loadData()
+    if len(self._queue):
+      qt.QTimer.singleShot(0, self._processNext)
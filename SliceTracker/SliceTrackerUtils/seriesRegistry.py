@@ -0,0 +1,93 @@
+import bisect
+
+from .sessionData import RegistrationResult
+
+
+class SeriesRegistry(object):
+  """ Received intraop series keyed by their integer series number.
+
+  Series are kept ordered by series number (bisect insertion), the "N: Description" strings are parsed only once.
+  seriesList is a read only view in series number order for the UI. Lookups by number, by series string and by
+  series type are dictionary lookups; the per type lists are rebuilt lazily after series or type assignments changed.
+  """
+
+  def __init__(self, seriesTypeManager):
+    self.seriesTypeManager = seriesTypeManager
+    self.clear()
+
+  @property
+  def seriesList(self):
+    if self._seriesList is None:
+      self._seriesList = tuple(self._seriesByNumber[n] for n in self._seriesNumbers)
+    return self._seriesList
+
+  def clear(self):
+    self._seriesNumbers = []
+    self._seriesByNumber = {}
+    self._numberBySeries = {}
+    self._seriesList = None
+    self._seriesByType = None
+
+  def __contains__(self, series):
+    return series in self._numberBySeries
+
+  def __len__(self):
+    return len(self._seriesNumbers)
+
+  def __iter__(self):
+    return iter(self.seriesList)
+
+  def add(self, series):
+    seriesNumber = RegistrationResult.getSeriesNumberFromString(series)
+    if self._seriesByNumber.get(seriesNumber) == series:
+      return
+    if seriesNumber in self._seriesByNumber:
+      del self._numberBySeries[self._seriesByNumber[seriesNumber]]
+    else:
+      bisect.insort(self._seriesNumbers, seriesNumber)
+    self._seriesByNumber[seriesNumber] = series
+    self._numberBySeries[series] = seriesNumber
+    self.invalidate()
+
+  def remove(self, seriesNumber):
+    series = self._seriesByNumber.pop(seriesNumber, None)
+    if series is None:
+      return None
+    del self._numberBySeries[series]
+    del self._seriesNumbers[bisect.bisect_left(self._seriesNumbers, seriesNumber)]
+    self.invalidate()
+    return series
+
+  def invalidate(self):
+    self._seriesList = None
+    self.invalidateSeriesTypes()
+
+  def invalidateSeriesTypes(self):
+    self._seriesByType = None
+
+  def getSeriesNumber(self, series):
+    try:
+      return self._numberBySeries[series]
+    except KeyError:
+      return RegistrationResult.getSeriesNumberFromString(series)
+
+  def getSeries(self, seriesNumber):
+    return self._seriesByNumber.get(seriesNumber)
+
+  def getSeriesNumbers(self):
+    return list(self._seriesNumbers)
+
+  def getSeriesBefore(self, seriesNumber):
+    """ :return: series with a series number lower than seriesNumber in ascending order """
+    return self.seriesList[:bisect.bisect_left(self._seriesNumbers, seriesNumber)]
+
+  def getSeriesOfType(self, seriesType):
+    if self._seriesByType is None:
+      self._seriesByType = {}
+      for series in self.seriesList:
+        self._seriesByType.setdefault(self.seriesTypeManager.getSeriesType(series), []).append(series)
+    return self._seriesByType.get(seriesType, [])
+
+  def getMostRecentSeriesOfType(self, seriesType):
+    series = self.getSeriesOfType(seriesType)
+    return series[-1] if series else None
@@ -0,0 +1,99 @@
+import bisect
+import qt
+
+from SlicerDevelopmentToolboxUtils.constants import COLOR
+
+from .session import SliceTrackerSession
+from .sessionData import RegistrationResult
+
+
+class IntraopSeriesSelectorModel(qt.QStandardItemModel):
+  """ Item model of the intraop series selector which is updated in place
+
+  Rows mirror SliceTrackerSession.seriesList. update() inserts rows for new series, removes rows of deleted series and
+  sets the background color only for rows whose color differs from the one they currently have. Rows are recolored when
+  they are new or have been invalidated, invalidate() without arguments marks all rows (e.g. after series types or
+  registration results changed outside of the overview). invalidateResults() marks the rows of the series whose
+  registration results changed their status.
+  """
+
+  def __init__(self):
+    super(IntraopSeriesSelectorModel, self).__init__()
+    self.session = SliceTrackerSession()
+    self._resetRows()
+
+  def clear(self):
+    super(IntraopSeriesSelectorModel, self).clear()
+    self._resetRows()
+
+  def _resetRows(self):
+    self._series = []
+    self._seriesNumbers = []
+    self._colors = {}
+    self._invalidSeries = set()
+
+  def invalidate(self, seriesList=None):
+    self._invalidSeries.update(self._series if seriesList is None else seriesList)
+
+  def invalidateResults(self, resultNames):
+    for seriesNumber in set(RegistrationResult.getSeriesNumberFromString(name) for name in resultNames):
+      row = bisect.bisect_left(self._seriesNumbers, seriesNumber)
+      if row < len(self._series) and self._seriesNumbers[row] == seriesNumber:
+        self._invalidSeries.add(self._series[row])
+
+  def getRow(self, series):
+    row = bisect.bisect_left(self._seriesNumbers, self.session.seriesRegistry.getSeriesNumber(series))
+    return row if row < len(self._series) and self._series[row] == series else -1
+
+  def getSeries(self, row):
+    return self._series[row]
+
+  def update(self):
+    """ :return: number of rows which have been inserted, removed or recolored """
+    changes = self._synchronizeRows(self.session.seriesList)
+    for series in [s for s in self._invalidSeries if s in self._colors]:
+      color = self.getSeriesColor(series)
+      if color != self._colors[series]:
+        self._colors[series] = color
+        self.setData(self.index(self.getRow(series), 0), color, qt.Qt.BackgroundRole)
+        changes += 1
+    self._invalidSeries = set()
+    return changes
+
+  def _synchronizeRows(self, seriesList):
+    if len(seriesList) >= len(self._series) and tuple(seriesList[:len(self._series)]) == tuple(self._series):
+      newSeries = list(seriesList[len(self._series):])
+      for series in newSeries:
+        self._insertSeries(len(self._series), series)
+      return len(newSeries)
+    changes = 0
+    present = set(seriesList)
+    for row in reversed([r for r, s in enumerate(self._series) if s not in present]):
+      self.removeRow(row)
+      del self._colors[self._series.pop(row)]
+      del self._seriesNumbers[row]
+      changes += 1
+    for row, series in enumerate(seriesList):
+      if row >= len(self._series) or self._series[row] != series:
+        self._insertSeries(row, series)
+        changes += 1
+    return changes
+
+  def _insertSeries(self, row, series):
+    color = self.getSeriesColor(series)
+    item = qt.QStandardItem(series)
+    item.setData(color, qt.Qt.BackgroundRole)
+    self.insertRow(row, item)
+    self._series.insert(row, series)
+    self._seriesNumbers.insert(row, self.session.seriesRegistry.getSeriesNumber(series))
+    self._colors[series] = color
+
+  def getSeriesColor(self, series):
+    if self.session.data.registrationResultWasApproved(series) or \
+      (self.session.seriesTypeManager.isCoverTemplate(series) and not self.session.isCoverTemplateTrackable(series)):
+      return COLOR.GREEN
+    elif self.session.data.registrationResultWasSkipped(series):
+      return COLOR.RED
+    elif self.session.data.registrationResultWasRejected(series):
+      return COLOR.GRAY
+    return COLOR.YELLOW
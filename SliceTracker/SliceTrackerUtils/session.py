@@ -1,14 +1,20 @@
 import os, logging
-import vtk, ctk, ast
+import vtk, ast
 import qt
 
 import slicer
 from .sessionData import SessionData, RegistrationResult, RegistrationTypeData
+from .storage import NodeStorage, CompressionPolicy
 from .constants import SliceTrackerConstants
 from .helpers import SeriesTypeManager
+from .dicomIndex import IntraopDICOMIndex, DICOMHeaderRecord, SeriesCompletenessDetector
+from .dicomIngest import IntraopDICOMIngestPipeline
+from .preloader import SpeculativeRegistrationPreloader, RegistrationResultPrefetcher
+from .volumeCache import LoadedSeriesCache
+from .seriesRegistry import SeriesRegistry
 from .preopHandler import PreopDataHandler
 
-from SlicerDevelopmentToolboxUtils.constants import DICOMTAGS, STYLE
+from SlicerDevelopmentToolboxUtils.constants import STYLE
 from SlicerDevelopmentToolboxUtils.events import SlicerDevelopmentToolboxEvents
 from SlicerDevelopmentToolboxUtils.helpers import SmartDICOMReceiver
 from SlicerDevelopmentToolboxUtils.mixins import ModuleWidgetMixin
@@ -65,6 +71,45 @@ class SliceTrackerSession(StepBasedSession):
   def outputDirectory(self):
     return os.path.join(self.directory, "SliceTrackerOutputs")
 
+  @property
+  def seriesList(self):
+    return self.seriesRegistry.seriesList
+
+  @property
+  def intraopDICOMIndex(self):
+    if not self._intraopDICOMIndex and self.directory:
+      self._intraopDICOMIndex = IntraopDICOMIndex(self.intraopDICOMDirectory,
+                                                  os.path.join(self.outputDirectory,
+                                                               SliceTrackerConstants.DICOM_INDEX_FILENAME))
+    return self._intraopDICOMIndex
+
+  @property
+  def intraopDICOMIngestPipeline(self):
+    if not self._intraopDICOMIngestPipeline and self.intraopDICOMIndex:
+      self._intraopDICOMIngestPipeline = IntraopDICOMIngestPipeline(self.intraopDICOMIndex)
+      self._intraopDICOMIngestPipeline.addEventObserver(IntraopDICOMIngestPipeline.IngestProgressEvent,
+                                                        self.onDICOMIngestProgress)
+      self._intraopDICOMIngestPipeline.addEventObserver(IntraopDICOMIngestPipeline.BatchCommittedEvent,
+                                                        self.onDICOMBatchCommitted)
+    return self._intraopDICOMIngestPipeline
+
+  @property
+  def speculativePreloadingEnabled(self):
+    return str(self.getSetting("Speculative_Preloading")).lower() == 'true'
+
+  @property
+  def asynchronousWritingEnabled(self):
+    return str(self.getSetting("Asynchronous_Writing")).lower() == 'true'
+
+  def getCompressionPolicy(self):
+    try:
+      return CompressionPolicy(self.getSetting("Compression") or CompressionPolicy.GZIP,
+                               int(self.getSetting("Compression_Level") or CompressionPolicy.DEFAULT_LEVEL),
+                               int(self.getSetting("Compression_Threads") or 1))
+    except ValueError as exc:
+      logging.warning("Invalid compression settings, falling back to gzip: %s" % exc)
+      return CompressionPolicy()
+
   @property
   def approvedCoverTemplate(self):
     try:
@@ -102,7 +147,8 @@ class SliceTrackerSession(StepBasedSession):
     if self.currentResult and self.currentResult.name == series:
       return
     if self.currentResult is not None:
-      self.currentResult.removeEventObservers()
+      for event in RegistrationResult.StatusEvents.values():
+        self.currentResult.removeEventObserver(event, self.onRegistrationResultStatusChanged)
     self._currentResult = series
     if self.currentResult:
       for event in RegistrationResult.StatusEvents.values():
@@ -118,7 +164,7 @@ class SliceTrackerSession(StepBasedSession):
   def currentSeries(self, series):
     if series == self.currentSeries:
       return
-    if series and series not in self.seriesList :
+    if series and series not in self.seriesRegistry:
       raise UnknownSeriesError("Series %s is unknown" % series)
     self._currentSeries = series
     self.invokeEvent(self.CurrentSeriesChangedEvent, series)
@@ -193,9 +239,16 @@ class SliceTrackerSession(StepBasedSession):
   def __init__(self):
     StepBasedSession.__init__(self)
     self.registrationLogic = SliceTrackerRegistrationLogic()
+    self._seriesCompletenessTimer = qt.QTimer()
+    self._seriesCompletenessTimer.setSingleShot(True)
+    self._seriesCompletenessTimer.setInterval(1000)
+    self._seriesCompletenessTimer.timeout.connect(self.announceCompletedSeries)
+    self.speculativePreloader = SpeculativeRegistrationPreloader(self)
+    self.resultPrefetcher = RegistrationResultPrefetcher()
     self.seriesTypeManager = SeriesTypeManager()
     self.seriesTypeManager.addEventObserver(self.seriesTypeManager.SeriesTypeManuallyAssignedEvent,
-                                            lambda caller, event: self.invokeEvent(self.SeriesTypeManuallyAssignedEvent))
+                                            self.onSeriesTypeManuallyAssigned)
+    self.seriesRegistry = SeriesRegistry(self.seriesTypeManager)
     self.resetAndInitializeMembers()
 
   def resetAndInitializeMembers(self):
@@ -204,14 +257,26 @@ class SliceTrackerSession(StepBasedSession):
     self.initializeColorNodes()
     self.directory = None
     self.data = SessionData()
+    NodeStorage().clear()
+    NodeStorage().setNumberOfWriterThreads(int(self.getSetting("Writer_Threads") or 1)
+                                           if self.asynchronousWritingEnabled else 0)
+    NodeStorage().setCompressionPolicy(self.getCompressionPolicy())
     self.data.addEventObserver(self.data.NewResultCreatedEvent, self.onNewRegistrationResultCreated)
+    self.data.addEventObserver(self.data.ResultsStatusChangedEvent, self.onRegistrationResultsStatusChanged)
     self.trainingMode = False
     self.resetPreopDICOMReceiver()
     self.resetIntraopDICOMReceiver()
     self.loadableList = {}
-    self.seriesList = []
+    self.seriesRegistry.clear()
     self.seriesTimeStamps = dict()
-    self.alreadyLoadedSeries = {}
+    self._pendingSeries = dict()
+    self._seriesCompletenessTimer.stop()
+    self.speculativePreloader.clear()
+    self.resultPrefetcher.clear()
+    self.loadedSeries = LoadedSeriesCache(float(self.getSetting("Loaded_Series_Memory_Budget") or 0),
+                                          isInUse=self.isSeriesVolumeInUse)
+    self.resetIntraopDICOMIngestPipeline()
+    self._intraopDICOMIndex = None
     self._currentResult = None
     self._currentSeries = None
     self.retryMode = False
@@ -228,6 +293,11 @@ class SliceTrackerSession(StepBasedSession):
     super(SliceTrackerSession, self).__del__()
     self.clearData()
 
+  def onSeriesTypeManuallyAssigned(self, caller, event):
+    self.seriesRegistry.invalidateSeriesTypes()
+    self.data.updateApprovedResultsIndex()
+    self.invokeEvent(self.SeriesTypeManuallyAssignedEvent)
+
   def clearData(self):
     self.resetAndInitializeMembers()
 
@@ -281,6 +351,8 @@ class SliceTrackerSession(StepBasedSession):
       success, failedFileNames = self.data.close(self.outputDirectory)
       message = "Case data has been saved successfully." if success else \
         "The following data failed to saved:\n %s" % failedFileNames
+    else:
+      NodeStorage().waitForPendingWrites()
     self.resetAndInitializeMembers()
     self.invokeEvent(self.CloseCaseEvent, str(message))
 
@@ -325,6 +397,7 @@ class SliceTrackerSession(StepBasedSession):
       if self.data.initialTargets:
         self.setupPreopLoadedTargets()
       self.startIntraopDICOMReceiver()
+    self.resultPrefetcher.schedule(self.data.getResultsToPrefetch(int(self.getSetting("Prefetched_Results") or 0)))
 
   def createPreopHandler(self):
     preopDataManager = PreopDataHandler(self.preopDICOMDirectory, self.preprocessedDirectory, self.data)
@@ -381,7 +454,8 @@ class SliceTrackerSession(StepBasedSession):
       self.intraopDICOMReceiver.start(not (self.trainingMode or self.data.completed))
     else:
       self.invokeEvent(SlicerDevelopmentToolboxEvents.StoppedEvent)
-    self.importDICOMSeries(self.getFileList(self.intraopDICOMDirectory))
+    self.restoreReceivedSeries()
+    self.importDICOMSeries(self.intraopDICOMIndex.synchronize(self.getFileList(self.intraopDICOMDirectory)))
     if self.intraopDICOMReceiver:
       self.intraopDICOMReceiver.forceStatusChangeEventUpdate()
 
@@ -391,6 +465,13 @@ class SliceTrackerSession(StepBasedSession):
       self.intraopDICOMReceiver.stop()
       self.intraopDICOMReceiver.removeEventObservers()
 
+  def resetIntraopDICOMIngestPipeline(self):
+    self._intraopDICOMIngestPipeline = getattr(self, "_intraopDICOMIngestPipeline", None)
+    if self._intraopDICOMIngestPipeline:
+      self._intraopDICOMIngestPipeline.stop()
+      self._intraopDICOMIngestPipeline.removeEventObservers()
+      self._intraopDICOMIngestPipeline = None
+
   def _observeIntraopDICOMReceiverEvents(self):
     self.intraopDICOMReceiver.addEventObserver(self.intraopDICOMReceiver.IncomingDataReceiveFinishedEvent,
                                                self.onDICOMSeriesReceived)
@@ -409,29 +490,76 @@ class SliceTrackerSession(StepBasedSession):
     customStatusProgressBar.text = callData
     customStatusProgressBar.busy = "Waiting" in callData
 
+  def restoreReceivedSeries(self):
+    index = self.intraopDICOMIndex
+    seriesNumbers = index.getSeriesNumbers()
+    indexedSeriesNumbers = set(seriesNumbers)
+    restoredSeries = [series for series in index.receivedSeries if series not in self.seriesRegistry and
+                      RegistrationResult.getSeriesNumberFromString(series) in indexedSeriesNumbers]
+    for series in restoredSeries:
+      self.seriesRegistry.add(series)
+      self.seriesTimeStamps[series] = index.seriesTimeStamps.get(series, self.getTime())
+      self.loadableList[series] = self.createLoadableFileListForSeries(series)
+    if len(restoredSeries):
+      self.invokeEvent(self.NewImageSeriesReceivedEvent, restoredSeries.__str__())
+    unannouncedFiles = [index.getFilesForSeries(seriesNumber)[0] for seriesNumber in seriesNumbers
+                        if self.seriesRegistry.getSeries(seriesNumber) is None]
+    if len(unannouncedFiles):
+      self.registerReceivedSeries(unannouncedFiles)
+
   def importDICOMSeries(self, newFileList):
-    indexer = ctk.ctkDICOMIndexer()
-
-    newSeries = []
-    for currentIndex, currentFile in enumerate(newFileList, start=1):
-      self.invokeEvent(SlicerDevelopmentToolboxEvents.NewFileIndexedEvent,
-                       ["Indexing file %s" % currentFile, len(newFileList), currentIndex].__str__())
-      slicer.app.processEvents()
-      currentFile = os.path.join(self.intraopDICOMDirectory, currentFile)
-      if not slicer.dicomDatabase:
-          logging.error("slicer.dicomDatabase is not initialized!")
-      indexer.addFile(slicer.dicomDatabase, currentFile, None)
-      series = self.makeSeriesNumberDescription(currentFile)
-      if series not in self.seriesList:
-        self.seriesTimeStamps[series] = self.getTime()
-        self.seriesList.append(series)
-        newSeries.append(series)
-        self.loadableList[series] = self.createLoadableFileListForSeries(series)
-    self.seriesList = sorted(self.seriesList, key=lambda s: RegistrationResult.getSeriesNumberFromString(s))
+    self.intraopDICOMIngestPipeline.enqueue(newFileList)
+
+  def waitForDICOMImport(self):
+    if self._intraopDICOMIngestPipeline:
+      self._intraopDICOMIngestPipeline.waitForCompletion()
 
-    if len(newFileList):
-      self.verifyPatientIDEquality(newFileList)
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onDICOMIngestProgress(self, caller, event, callData):
+    self.invokeEvent(SlicerDevelopmentToolboxEvents.NewFileIndexedEvent, callData)
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onDICOMBatchCommitted(self, caller, event, callData):
+    self.registerReceivedSeries(ast.literal_eval(callData))
+
+  def registerReceivedSeries(self, receivedFiles):
+    for currentFile in [f for f in receivedFiles if self.intraopDICOMIndex.isIndexed(f)]:
+      try:
+        series = self.makeSeriesNumberDescription(currentFile)
+      except DICOMValueError as exc:
+        logging.error(exc)
+        continue
+      if series in self.seriesRegistry:
+        self.loadableList[series] = self.createLoadableFileListForSeries(series)
+      elif series not in self._pendingSeries:
+        self._pendingSeries[series] = self.getTime()
+    self.announceCompletedSeries()
+
+  def announceCompletedSeries(self):
+    self._seriesCompletenessTimer.stop()
+    detector = SeriesCompletenessDetector(self.intraopDICOMIndex, float(self.getSetting("Series_Quiet_Period")),
+                                          float(self.getSetting("Series_Completion_Timeout")))
+    newSeries = [series for series in self._pendingSeries.keys()
+                 if detector.isComplete(RegistrationResult.getSeriesNumberFromString(series))]
+    for series in newSeries:
+      self.seriesTimeStamps[series] = self._pendingSeries.pop(series)
+      self.seriesRegistry.add(series)
+      self.loadableList[series] = self.createLoadableFileListForSeries(series)
+
+    if len(newSeries):
+      self.verifyPatientIDEquality([self.loadableList[series][0] for series in newSeries])
+      newSeries = [series for series in newSeries if series in self.seriesRegistry]
+      self.storeReceivedSeries()
       self.invokeEvent(self.NewImageSeriesReceivedEvent, newSeries.__str__())
+      self.scheduleSpeculativePreloading(newSeries)
+    if len(self._pendingSeries):
+      self._seriesCompletenessTimer.start()
+
+  def scheduleSpeculativePreloading(self, seriesList):
+    if not self.speculativePreloadingEnabled:
+      return
+    for series in [s for s in seriesList if s in self.seriesRegistry and self.isTrackingPossible(s)]:
+      self.speculativePreloader.schedule(series)
 
   def verifyPatientIDEquality(self, receivedFiles):
     seriesNumberPatientID = self.getAdditionalInformationForReceivedSeries(receivedFiles)
@@ -463,59 +591,64 @@ class SliceTrackerSession(StepBasedSession):
       return None
 
   def getOrCreateVolumeForSeries(self, series):
-    try:
-      volume = self.alreadyLoadedSeries[series]
-    except KeyError:
+    volume = self.loadedSeries.get(series)
+    if volume is None:
       files = self.loadableList[series]
       loadables = self.scalarVolumePlugin.examine([files])
       assert len(loadables)
       volume = self.scalarVolumePlugin.load(loadables[0])
       volume.SetName(loadables[0].name)
-      self.alreadyLoadedSeries[series] = volume
+      self.loadedSeries.add(series, volume)
     slicer.app.processEvents()
     return volume
 
+  def isSeriesVolumeInUse(self, series, volume):
+    if series == self.currentSeries or self.speculativePreloader.isPending(series):
+      return True
+    if volume in [self.fixedVolume, self.movingVolume, self.data.initialVolume, self.approvedCoverTemplate]:
+      return True
+    return any(volume in result.volumes.asList() for result in self.data.getResultsAsList() if result.dataLoaded)
+
   def createLoadableFileListForSeries(self, series):
     seriesNumber = RegistrationResult.getSeriesNumberFromString(series)
-    loadableList = []
-    for dcm in self.getFileList(self.intraopDICOMDirectory):
-      currentFile = os.path.join(self.intraopDICOMDirectory, dcm)
-      currentSeriesNumber = int(self.getDICOMValue(currentFile, DICOMTAGS.SERIES_NUMBER))
-      if currentSeriesNumber and currentSeriesNumber == seriesNumber:
-        loadableList.append(currentFile)
-    return loadableList
+    return self.intraopDICOMIndex.getFilesForSeries(seriesNumber)
 
   def deleteSeriesFromSeriesList(self, seriesNumber):
-    for series in self.seriesList:
-      currentSeriesNumber = RegistrationResult.getSeriesNumberFromString(series)
-      if currentSeriesNumber == seriesNumber:
-        self.seriesList.remove(series)
-        for seriesFile in self.loadableList[series]:
-          logging.debug("removing {} from filesystem".format(seriesFile))
-          os.remove(seriesFile)
-        del self.loadableList[series]
+    series = self.seriesRegistry.remove(seriesNumber)
+    if series:
+      for seriesFile in self.loadableList[series]:
+        logging.debug("removing {} from filesystem".format(seriesFile))
+        os.remove(seriesFile)
+      del self.loadableList[series]
+    self.intraopDICOMIndex.removeSeries(seriesNumber)
+    self.storeReceivedSeries()
+
+  def storeReceivedSeries(self):
+    self.intraopDICOMIndex.setReceivedSeries(self.seriesList, self.seriesTimeStamps)
+    self.intraopDICOMIndex.save()
 
   def makeSeriesNumberDescription(self, dcmFile):
-    seriesDescription = self.getDICOMValue(dcmFile, DICOMTAGS.SERIES_DESCRIPTION)
-    seriesNumber = self.getDICOMValue(dcmFile, DICOMTAGS.SERIES_NUMBER)
-    if not (seriesNumber and seriesDescription):
-      raise DICOMValueError("Missing Attribute(s):\nFile: {}\nseriesNumber: {}\nseriesDescription: {}"
-                            .format(dcmFile, seriesNumber, seriesDescription))
-    return "{}: {}".format(seriesNumber, seriesDescription)
+    record = self.getDICOMHeaderRecord(dcmFile)
+    try:
+      return record.seriesNumberDescription
+    except DICOMValueError as exc:
+      raise DICOMValueError("{}\nFile: {}".format(exc, dcmFile))
+
+  def getDICOMHeaderRecord(self, dcmFile):
+    record = self.intraopDICOMIndex.getRecord(dcmFile)
+    if not record:
+      record = DICOMHeaderRecord.createFromFile(os.path.join(self.intraopDICOMDirectory, dcmFile))
+    return record
 
   def getAdditionalInformationForReceivedSeries(self, fileList):
     seriesNumberPatientID = {}
-    for currentFile in [os.path.join(self.intraopDICOMDirectory, f) for f in fileList]:
-      seriesNumber = int(self.getDICOMValue(currentFile, DICOMTAGS.SERIES_NUMBER))
-      if seriesNumber not in seriesNumberPatientID.keys():
-        seriesNumberPatientID[seriesNumber]= self.getPatientInformation(currentFile)
+    for record in [self.getDICOMHeaderRecord(f) for f in fileList]:
+      if record.seriesNumber not in seriesNumberPatientID.keys():
+        seriesNumberPatientID[record.seriesNumber] = record.getPatientInformation()
     return seriesNumberPatientID
 
   def getPatientInformation(self, currentFile):
-    return {
-      "PatientID": self.getDICOMValue(currentFile, DICOMTAGS.PATIENT_ID),
-      "PatientName": self.getDICOMValue(currentFile, DICOMTAGS.PATIENT_NAME),
-      "SeriesDescription": self.getDICOMValue(currentFile, DICOMTAGS.SERIES_DESCRIPTION)}
+    return self.getDICOMHeaderRecord(currentFile).getPatientInformation()
 
   def getSeriesForSubstring(self, substring):
     for series in reversed(self.seriesList):
@@ -613,10 +746,7 @@ class SliceTrackerSession(StepBasedSession):
     return currentSeriesNumber > approvedSeriesNumber
 
   def isInGeneralTrackable(self, series):
-    seriesType = self.seriesTypeManager.getSeriesType(series)
-    return self.isAnyListItemInString(seriesType, [self.getSetting("COVER_TEMPLATE_PATTERN"),
-                                                   self.getSetting("COVER_PROSTATE_PATTERN"),
-                                                   self.getSetting("NEEDLE_IMAGE_PATTERN")])
+    return self.seriesTypeManager.isTrackable(series)
 
   def resultHasNotBeenProcessed(self, series):
     return not (self.data.registrationResultWasApproved(series) or
@@ -624,9 +754,7 @@ class SliceTrackerSession(StepBasedSession):
                 self.data.registrationResultWasRejected(series))
 
   def isEligibleForSkipping(self, series):
-    seriesType = self.seriesTypeManager.getSeriesType(series)
-    return not self.isAnyListItemInString(seriesType,[self.getSetting("COVER_PROSTATE_PATTERN"),
-                                                      self.getSetting("COVER_TEMPLATE_PATTERN")])
+    return self.seriesTypeManager.isSkippable(series)
 
   def takeActionForCurrentSeries(self):
     event = None
@@ -692,18 +820,22 @@ class SliceTrackerSession(StepBasedSession):
   def applyRegistration(self, progressCallback=None):
 
     coverProstateRegResult = self.data.getMostRecentApprovedCoverProstateRegistration()
-    lastRigidTfm = self.data.getLastApprovedRigidTransformation()
     lastApprovedTfm = self.data.getMostRecentApprovedTransform()
-    initialTransform = lastApprovedTfm if lastApprovedTfm else lastRigidTfm
 
+    fixedLabel = self.speculativePreloader.takePreparedFixedLabel(self.currentSeries, coverProstateRegResult,
+                                                                  lastApprovedTfm)
+    if not fixedLabel:
+      lastRigidTfm = self.data.getLastApprovedRigidTransformation()
+      initialTransform = lastApprovedTfm if lastApprovedTfm else lastRigidTfm
 
-    fixedLabel = self.volumesLogic.CreateAndAddLabelVolume(slicer.mrmlScene, self.currentSeriesVolume,
-                                                           self.currentSeriesVolume.GetName() + '-label')
+      fixedLabel = self.volumesLogic.CreateAndAddLabelVolume(slicer.mrmlScene, self.currentSeriesVolume,
+                                                             self.currentSeriesVolume.GetName() + '-label')
 
-    self.runBRAINSResample(inputVolume=coverProstateRegResult.labels.fixed, referenceVolume=self.currentSeriesVolume,
-                           outputVolume=fixedLabel, warpTransform=initialTransform)
+      self.runBRAINSResample(inputVolume=coverProstateRegResult.labels.fixed,
+                             referenceVolume=self.currentSeriesVolume, outputVolume=fixedLabel,
+                             warpTransform=initialTransform)
 
-    self.dilateMask(fixedLabel, dilateValue=self.segmentedLabelValue)
+      self.dilateMask(fixedLabel, dilateValue=self.segmentedLabelValue)
     self._runRegistration(self.currentSeriesVolume, fixedLabel, coverProstateRegResult.volumes.fixed,
                           coverProstateRegResult.labels.fixed, coverProstateRegResult.targets.approved, None,
                           progressCallback)
@@ -743,39 +875,58 @@ class SliceTrackerSession(StepBasedSession):
                                         self.temporaryIntraopTargets.GetNthFiducialLabel(i))
 
   def onRegistrationResultStatusChanged(self, caller, event):
-    self.skipAllUnregisteredPreviousSeries(self.currentResult.name)
+    skippedResults = self.skipAllUnregisteredPreviousSeries(self.currentResult.name, invokeEvent=False)
+    self.processRegistrationStatusChange([self.currentResult.name] + [result.name for result in skippedResults])
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onRegistrationResultsStatusChanged(self, caller, event, callData):
+    self.processRegistrationStatusChange(ast.literal_eval(callData))
+
+  def processRegistrationStatusChange(self, resultNames):
+    """ Saves the session and invokes RegistrationStatusChangedEvent with the names of the changed results """
     if self._busy:
       return
     self.save()
-    self.invokeEvent(self.RegistrationStatusChangedEvent)
+    self.invokeEvent(self.RegistrationStatusChangedEvent, str(resultNames))
+    mostRecentTrackableSeries = next((s for s in reversed(self.seriesList) if self.isTrackingPossible(s)), None)
+    if mostRecentTrackableSeries:
+      self.scheduleSpeculativePreloading([mostRecentTrackableSeries])
 
   @vtk.calldata_type(vtk.VTK_STRING)
   def onNewRegistrationResultCreated(self, caller, event, callData):
     self.currentResult = callData
 
-  def skipAllUnregisteredPreviousSeries(self, series):
+  def skipAllUnregisteredPreviousSeries(self, series, invokeEvent=True):
+    return self.skipSeries(self.getUnregisteredPreviousSeries(series), invokeEvent=invokeEvent)
+
+  def getUnregisteredPreviousSeries(self, series):
     selectedSeriesNumber = RegistrationResult.getSeriesNumberFromString(series)
-    for series in [series for series in self.seriesList if not self.seriesTypeManager.isCoverTemplate(series)]:
-      currentSeriesNumber = RegistrationResult.getSeriesNumberFromString(series)
-      if currentSeriesNumber < selectedSeriesNumber and self.isTrackingPossible(series):
-        results = self.data.getResultsBySeriesNumber(currentSeriesNumber)
-        if len(results) == 0:
-          self.skipSeries(series)
-      elif currentSeriesNumber >= selectedSeriesNumber:
-        break
-
-  def skipSeries(self, series):
+    return [s for s in self.seriesRegistry.getSeriesBefore(selectedSeriesNumber)
+            if not self.seriesTypeManager.isCoverTemplate(s) and
+            not self.data.getResultsBySeriesNumber(self.seriesRegistry.getSeriesNumber(s)) and
+            self.isTrackingPossible(s)]
+
+  def skipSeries(self, seriesList, invokeEvent=True):
+    """ Skips all series of seriesList as one transaction
+
+    The skipped results are created silently and their status is changed at once, which results in a single
+    ResultsStatusChangedEvent and therefore a single save instead of one for every skipped series.
+    """
+    results = [self.createResultForSkippedSeries(series) for series in seriesList]
+    self.data.changeResultsStatus(results, RegistrationResult.SKIPPED_STATUS, invokeEvent=invokeEvent)
+    return results
+
+  def createResultForSkippedSeries(self, series):
     volume = self.getOrCreateVolumeForSeries(series)
     name, suffix = self.getRegistrationResultNameAndGeneratedSuffix(volume.GetName())
-    result = self.data.createResult(name+suffix)
+    result = self.data.createResult(name+suffix, invokeEvent=False)
     result.volumes.fixed = volume
     result.receivedTime = self.seriesTimeStamps[result.name.replace(result.suffix, "")]
-    result.skip()
+    return result
 
   def skip(self, series):
-    self.skipAllUnregisteredPreviousSeries(series)
-    self.skipSeries(series)
-    self.save()
+    results = self.skipSeries(self.getUnregisteredPreviousSeries(series) + [series])
+    self.currentResult = results[-1].name
 
   def _getConsent(self):
     return RadioButtonChoiceMessageBox("Who gave consent?", options=["Clinician", "Operator"]).exec_()
@@ -1,7 +1,8 @@
 import logging
 import slicer, vtk
 import os, json
-import shutil
+import copy
+import bisect
 from collections import OrderedDict
 
 from SlicerDevelopmentToolboxUtils.constants import FileExtension
@@ -11,11 +12,41 @@ from SlicerDevelopmentToolboxUtils.widgets import CustomStatusProgressbar
 
 from .constants import SliceTrackerConstants
 from .helpers import SeriesTypeManager
+from .storage import NodeStorage
+from .journal import SessionJournal
+
+
+class ApprovedResultsIndex(object):
+  """ Approved registration results ordered by a key, kept sorted with bisect on every status change """
+
+  def __init__(self):
+    self._keys = []
+    self._results = {}
+
+  def __len__(self):
+    return len(self._keys)
+
+  def update(self, key, result):
+    if key in self._results:
+      del self._keys[bisect.bisect_left(self._keys, key)]
+      del self._results[key]
+    if result is not None:
+      bisect.insort(self._keys, key)
+      self._results[key] = result
+
+  def first(self):
+    return self._results[self._keys[0]] if self._keys else None
+
+  def last(self, priorTo=None):
+    """ :return: approved result with the highest key lower than priorTo (or the highest overall) """
+    index = len(self._keys) if priorTo is None else bisect.bisect_left(self._keys, priorTo)
+    return self._results[self._keys[index - 1]] if index else None
 
 
 class SessionData(ModuleLogicMixin):
 
   NewResultCreatedEvent = vtk.vtkCommand.UserEvent + 901
+  ResultsStatusChangedEvent = vtk.vtkCommand.UserEvent + 902
 
   _completed = False
   _resumed = False
@@ -43,10 +74,8 @@ class SessionData(ModuleLogicMixin):
 
   @staticmethod
   def wasSessionCompleted(filename):
-    with open(filename) as data_file:
-      data = json.load(data_file)
-      procedureEvents = data["procedureEvents"]
-      return "caseCompleted" in procedureEvents.keys()
+    procedureEvents = SessionJournal.read(filename)["procedureEvents"]
+    return "caseCompleted" in procedureEvents.keys()
 
   @property
   def usedAutomaticPreopSegmentation(self):
@@ -85,6 +114,8 @@ class SessionData(ModuleLogicMixin):
     self.zFrameRegistrationResult = None
 
     self._savedRegistrationResults = []
+    self._gitRevisionInformation = None
+    self._journal = None
     self.initializeRegistrationResults()
 
     self.customProgressBar = CustomStatusProgressbar()
@@ -92,6 +123,37 @@ class SessionData(ModuleLogicMixin):
 
   def initializeRegistrationResults(self):
     self.registrationResults = OrderedDict()
+    self._updateResultsIndex()
+
+  def _updateResultsIndex(self):
+    self._resultsBySeriesNumber = {}
+    self._statusSummaries = {}
+    self._resultOrder = {}
+    for result in self.registrationResults.values():
+      self._resultsBySeriesNumber.setdefault(result.seriesNumber, []).append(result)
+      self._resultOrder[result.name] = len(self._resultOrder)
+    self._nextResultOrder = len(self._resultOrder)
+    self.updateApprovedResultsIndex()
+
+  def updateApprovedResultsIndex(self):
+    """ Rebuilds the most recent approved lookups, needed after series types have been reassigned """
+    self._approvedResults = ApprovedResultsIndex()
+    self._approvedCoverProstateResults = ApprovedResultsIndex()
+    self._approvedTransformResults = ApprovedResultsIndex()
+    for result in self.registrationResults.values():
+      self._updateApprovedResults(result)
+
+  def _updateApprovedResults(self, result, removed=False):
+    order = self._resultOrder[result.name]
+    approved = result if result.approved and not removed else None
+    isCoverProstate = SeriesTypeManager().isCoverProstate(result.name)
+    self._approvedResults.update((result.seriesNumber, order), approved)
+    self._approvedCoverProstateResults.update((order,), approved if isCoverProstate else None)
+    self._approvedTransformResults.update((result.seriesNumber, order), None if isCoverProstate else approved)
+
+  def _onResultStatusChanged(self, result):
+    self._statusSummaries.pop(result.seriesNumber, None)
+    self._updateApprovedResults(result)
 
   def createZFrameRegistrationResult(self, series):
     self.zFrameRegistrationResult = ZFrameRegistrationResult(series)
@@ -99,26 +161,43 @@ class SessionData(ModuleLogicMixin):
 
   def createResult(self, series, invokeEvent=True):
     assert series not in self.registrationResults.keys()
-    self.registrationResults[series] = RegistrationResult(series)
+    result = RegistrationResult(series)
+    self.registrationResults[series] = result
+    self._resultsBySeriesNumber.setdefault(result.seriesNumber, []).append(result)
+    self._statusSummaries.pop(result.seriesNumber, None)
+    self._resultOrder[series] = self._nextResultOrder
+    self._nextResultOrder += 1
+    result.statusChangedCallback = self._onResultStatusChanged
     if invokeEvent is True:
       self.invokeEvent(self.NewResultCreatedEvent, series)
     return self.registrationResults[series]
 
+  def changeResultsStatus(self, results, status, invokeEvent=True):
+    """ Sets the status of all results at once and invokes a single ResultsStatusChangedEvent with their names
+
+    The status events of the individual results are still invoked, so observers of a single result stay informed.
+    """
+    for result in results:
+      result.status = status
+    if invokeEvent is True and len(results):
+      self.invokeEvent(self.ResultsStatusChangedEvent, str([result.name for result in results]))
+
   def load(self, filename):
     directory = os.path.dirname(filename)
     self.resetAndInitializeData()
-    with open(filename) as dataFile:
-      self.customProgressBar.visible = True
-      self.customProgressBar.text = "Reading meta information"
-
-      logging.debug("reading json file %s" % filename)
-      data = json.load(dataFile)
-      self.readInitialTargetsAndVolume(data, directory)
-      self.loadZFrameRegistrationData(data, directory)
-      self.loadProcedureEvents(data)
-      self.loadPreopData(data)
-      self.loadResults(data, directory)
+    self.customProgressBar.visible = True
+    self.customProgressBar.text = "Reading meta information"
+
+    logging.debug("reading json file %s" % filename)
+    data = SessionJournal.read(filename)
+    self.readInitialTargetsAndVolume(data, directory)
+    self.loadZFrameRegistrationData(data, directory)
+    self.loadProcedureEvents(data)
+    self.loadPreopData(data)
+    self.loadResults(data, directory)
     self.registrationResults = OrderedDict(sorted(self.registrationResults.items()))
+    self._updateResultsIndex()
+    self.loadRequiredResultData()
     return True
 
   def readInitialTargetsAndVolume(self, data, directory):
@@ -159,34 +238,18 @@ class SessionData(ModuleLogicMixin):
       self.preopData = PreopData.createFromJSON(data["preop"])
 
   def loadResults(self, data, directory):
-    if len(data["results"]):
-      self.customProgressBar.maximum = len(data["results"])
-    for index, jsonResult in enumerate(data["results"], start=1):
+    """ Creates the registration results from their JSON metadata. Loading of their volumes, transforms, targets and
+    labels is deferred until the data of a result is accessed (see RegistrationResult.loadData) """
+    for jsonResult in data["results"]:
       name = jsonResult["name"]
       logging.debug("processing %s" % name)
       result = self.createResult(name, invokeEvent=False)
-      self.customProgressBar.updateStatus("Loading series registration result %s" % result.name, index)
-      slicer.app.processEvents()
 
+      fileReferences = {}
       for attribute, value in jsonResult.items():
         logging.debug("found %s: %s" % (attribute, value))
-        if attribute == 'volumes':
-          self._loadResultFileData(value, directory, slicer.util.loadVolume, result.setVolume)
-        elif attribute == 'transforms':
-          self._loadResultFileData(value, directory, slicer.util.loadTransform, result.setTransform)
-        elif attribute == 'targets':
-          approved = value.pop('approved', None)
-          original = value.pop('original', None)
-          self._loadResultFileData(value, directory, slicer.util.loadMarkupsFiducialList, result.setTargets)
-          if approved:
-            approvedTargets = self._loadOrGetFileData(directory, approved["fileName"], slicer.util.loadMarkupsFiducialList)
-            setattr(result.targets, 'approved', approvedTargets)
-            result.targets.modifiedTargets[jsonResult["status"]["registrationType"]] = approved["userModified"]
-          if original:
-            originalTargets = self._loadOrGetFileData(directory, original, slicer.util.loadMarkupsFiducialList)
-            setattr(result.targets, 'original', originalTargets)
-        elif attribute == 'labels':
-          self._loadResultFileData(value, directory, slicer.util.loadLabelVolume, result.setLabel)
+        if attribute in RegistrationResult.FILE_DATA_ATTRIBUTES:
+          fileReferences[attribute] = value
         elif attribute == 'status':
           result.status = value["state"]
           result.timestamp = value["time"]
@@ -203,7 +266,48 @@ class SessionData(ModuleLogicMixin):
           result.segmentationData = SegmentationData.createFromJSON(value)
         else:
           setattr(result, attribute, value)
-        self.customProgressBar.text = "Finished loading registration results"
+      if fileReferences:
+        result.setDataLoader(self._createResultDataLoader(fileReferences, directory), fileReferences)
+
+  def _createResultDataLoader(self, fileReferences, directory):
+    def loadResultData(result):
+      logging.debug("loading data of registration result %s" % result.name)
+      for attribute, value in copy.deepcopy(fileReferences).items():
+        if attribute == 'volumes':
+          self._loadResultFileData(value, directory, slicer.util.loadVolume, result.setVolume)
+        elif attribute == 'transforms':
+          self._loadResultFileData(value, directory, slicer.util.loadTransform, result.setTransform)
+        elif attribute == 'targets':
+          approved = value.pop('approved', None)
+          original = value.pop('original', None)
+          self._loadResultFileData(value, directory, slicer.util.loadMarkupsFiducialList, result.setTargets)
+          if approved:
+            approvedTargets = self._loadOrGetFileData(directory, approved["fileName"], slicer.util.loadMarkupsFiducialList)
+            setattr(result.targets, 'approved', approvedTargets)
+            result.targets.modifiedTargets[result.registrationType] = approved["userModified"]
+          if original:
+            originalTargets = self._loadOrGetFileData(directory, original, slicer.util.loadMarkupsFiducialList)
+            setattr(result.targets, 'original', originalTargets)
+        elif attribute == 'labels':
+          self._loadResultFileData(value, directory, slicer.util.loadLabelVolume, result.setLabel)
+    return loadResultData
+
+  def loadRequiredResultData(self):
+    """ Loads the data of the results needed right after resuming: the most recent approved result and the approved
+    cover prostate result the next registrations use """
+    for result in [self.getMostRecentApprovedResult(), self.getMostRecentApprovedCoverProstateRegistration()]:
+      if result and not result.dataLoaded:
+        self.customProgressBar.visible = True
+        self.customProgressBar.text = "Loading data of registration result %s" % result.name
+        result.loadData()
+    self.customProgressBar.text = "Finished loading registration results"
+
+  def getResultsToPrefetch(self, numberOfResults):
+    """ :return: up to numberOfResults results whose data has not been loaded yet, approved results first and most
+    recent first """
+    results = sorted([r for r in self.getResultsAsList() if not r.dataLoaded],
+                     key=lambda r: (not r.approved, -r.seriesNumber, -self._resultOrder.get(r.name, 0)))
+    return results[:numberOfResults]
 
   def _loadResultFileData(self, dictionary, directory, loadFunction, setFunction):
     for regType, filename in dictionary.items():
@@ -213,11 +317,27 @@ class SessionData(ModuleLogicMixin):
   def _loadOrGetFileData(self, directory, filename, loadFunction):
     if not filename:
       return None
+    if isinstance(filename, dict):
+      return self._loadOrGetStoredData(directory, filename, loadFunction)
     try:
       data = self.alreadyLoadedFileNames[filename]
     except KeyError:
       _, data = loadFunction(os.path.join(directory, filename), returnNode=True)
       self.alreadyLoadedFileNames[filename] = data
+      if data:
+        NodeStorage().markNodeSaved(data, os.path.join(directory, filename))
+    return data
+
+  def _loadOrGetStoredData(self, directory, reference, loadFunction):
+    key = (reference["hash"], reference["name"])
+    try:
+      data = self.alreadyLoadedFileNames[key]
+    except KeyError:
+      _, data = loadFunction(NodeStorage().getStoredFileName(directory, reference["hash"]), returnNode=True)
+      self.alreadyLoadedFileNames[key] = data
+      if data:
+        data.SetName(reference["name"])
+        NodeStorage().markNodeStored(data, reference["hash"])
     return data
 
   def generateLogfileTimeStampDict(self):
@@ -229,7 +349,10 @@ class SessionData(ModuleLogicMixin):
   def close(self, outputDir):
     if not self.completed:
       self.closedLogTimeStamps.append(self.generateLogfileTimeStampDict())
-    return self.save(outputDir)
+    success, failedFileNames = self.save(outputDir)
+    self.getJournal(outputDir).compact()
+    failedFileNames += NodeStorage().waitForPendingWrites()
+    return len(failedFileNames) == 0, failedFileNames
 
   def save(self, outputDir):
     if not os.path.exists(outputDir):
@@ -239,26 +362,26 @@ class SessionData(ModuleLogicMixin):
     failedSaveOfFileNames = []
 
     logFilePath = self.getSlicerErrorLogPath()
-    shutil.copy(logFilePath, os.path.join(outputDir, os.path.basename(logFilePath)))
-    successfullySavedFileNames.append(os.path.join(outputDir, os.path.basename(logFilePath)))
+    if NodeStorage().copyFile(logFilePath, os.path.join(outputDir, os.path.basename(logFilePath))):
+      successfullySavedFileNames.append(os.path.join(outputDir, os.path.basename(logFilePath)))
 
     def saveManualSegmentation():
       if self.segmentModelNode:
-        success, name = self.saveNodeData(self.segmentModelNode, outputDir, FileExtension.VTK)
+        success, name = NodeStorage().saveNodeData(self.segmentModelNode, outputDir, FileExtension.VTK)
         self.handleSaveNodeDataReturn(success, name, successfullySavedFileNames, failedSaveOfFileNames)
 
       if self.inputMarkupNode:
-        success, name = self.saveNodeData(self.inputMarkupNode, outputDir, FileExtension.FCSV)
+        success, name = NodeStorage().saveNodeData(self.inputMarkupNode, outputDir, FileExtension.FCSV)
         self.handleSaveNodeDataReturn(success, name, successfullySavedFileNames, failedSaveOfFileNames)
 
     def saveInitialTargets():
-      success, name = self.saveNodeData(self.initialTargets, outputDir, FileExtension.FCSV,
+      success, name = NodeStorage().saveNodeData(self.initialTargets, outputDir, FileExtension.FCSV,
                                         name="Initial_Targets")
       self.handleSaveNodeDataReturn(success, name, successfullySavedFileNames, failedSaveOfFileNames)
       return name + FileExtension.FCSV
 
     def saveInitialVolume():
-      success, name = self.saveNodeData(self.initialVolume, outputDir, FileExtension.NRRD)
+      success, name = NodeStorage().saveNodeData(self.initialVolume, outputDir, FileExtension.NRRD)
       self.handleSaveNodeDataReturn(success, name, successfullySavedFileNames, failedSaveOfFileNames)
       return name + FileExtension.NRRD
 
@@ -269,6 +392,9 @@ class SessionData(ModuleLogicMixin):
       return results
 
     saveManualSegmentation()
+    self._forgetResultsWithFailedStores(NodeStorage().popFailedStores())
+    NodeStorage().computeContentHashes([node for result in self.getUnsavedRegistrationResults()
+                                        for node in result.getStoredNodes()], whileWaiting=slicer.app.processEvents)
 
     data = {
       "results": createResultsList()
@@ -303,10 +429,7 @@ class SessionData(ModuleLogicMixin):
     if self.initialVolume:
       data["initialVolume"] = saveInitialVolume()
 
-    destinationFile = os.path.join(outputDir, SliceTrackerConstants.JSON_FILENAME)
-    with open(destinationFile, 'w') as outfile:
-      logging.debug("Writing registration results to %s" % destinationFile)
-      json.dump(data, outfile, indent=2)
+    self.getJournal(outputDir).save(data)
 
     failedSaveOfFileNames += self.saveRegistrationResults(outputDir)
 
@@ -314,7 +437,18 @@ class SessionData(ModuleLogicMixin):
     self.printOutput("The following data failed to saved:\n", failedSaveOfFileNames)
     return len(failedSaveOfFileNames) == 0, failedSaveOfFileNames
 
+  def getJournal(self, outputDir):
+    snapshotFileName = os.path.join(outputDir, SliceTrackerConstants.JSON_FILENAME)
+    if self._journal is None or self._journal.snapshotFileName != snapshotFileName:
+      self._journal = SessionJournal(snapshotFileName)
+    return self._journal
+
   def getGITRevisionInformation(self):
+    if self._gitRevisionInformation is None:
+      self._gitRevisionInformation = self._readGITRevisionInformation()
+    return self._gitRevisionInformation
+
+  def _readGITRevisionInformation(self):
     import inspect
     dirname = os.path.dirname(inspect.getfile(self.__class__))
 
@@ -350,23 +484,47 @@ class SessionData(ModuleLogicMixin):
   @logmethod(level=logging.DEBUG)
   def saveRegistrationResults(self, outputDir):
     failedToSave = []
+    self._forgetResultsWithFailedStores(NodeStorage().popFailedStores())
     self.customProgressBar.visible = True
+    unsavedResults = self.getUnsavedRegistrationResults()
     for index, result in enumerate(self.getResultsAsList(), start=1):
       self.customProgressBar.maximum = len(self.registrationResults)
       self.customProgressBar.updateStatus("Saving registration result for series %s" % result.name, index)
       slicer.app.processEvents()
-      if result not in self._savedRegistrationResults:
+      if result in unsavedResults:
         successfulList, failedList = result.save(outputDir)
         failedToSave += failedList
-        self._savedRegistrationResults.append(result)
+        if not failedList:
+          self._savedRegistrationResults.append(result)
     self.customProgressBar.text = "Registration data successfully saved" if len(failedToSave) == 0 else "Error/s occurred during saving"
     return failedToSave
 
+  def getUnsavedRegistrationResults(self):
+    # results whose data has not been loaded are unchanged since they were read from the output directory
+    return [result for result in self.getResultsAsList()
+            if result.dataLoaded and result not in self._savedRegistrationResults]
+
+  def _forgetResultsWithFailedStores(self, failedStoreHashes):
+    """ Saves results again whose volumes failed to be written into the content store, results.json refers to them """
+    if failedStoreHashes:
+      self._savedRegistrationResults = [result for result in self._savedRegistrationResults
+                                        if not failedStoreHashes & result.getStoredContentHashes()]
+
   def _registrationResultHasStatus(self, series, status, method=all):
     if not type(series) is int:
       series = RegistrationResult.getSeriesNumberFromString(series)
-    results = self.getResultsBySeriesNumber(series)
-    return method(result.status == status for result in results) if len(results) else False
+    statuses = self._getStatusSummary(series)
+    if not len(statuses):
+      return False
+    return status in statuses if method is any else statuses == frozenset([status])
+
+  def _getStatusSummary(self, seriesNumber):
+    try:
+      return self._statusSummaries[seriesNumber]
+    except KeyError:
+      summary = frozenset(result.status for result in self._resultsBySeriesNumber.get(seriesNumber, []))
+      self._statusSummaries[seriesNumber] = summary
+      return summary
 
   def registrationResultWasApproved(self, series):
     return self._registrationResultHasStatus(series, RegistrationStatus.APPROVED_STATUS, method=any)
@@ -385,14 +543,10 @@ class SessionData(ModuleLogicMixin):
     return self.registrationResults.values()
 
   def getMostRecentApprovedCoverProstateRegistration(self):
-    seriesTypeManager = SeriesTypeManager()
-    for result in self.registrationResults.values():
-      if seriesTypeManager.isCoverProstate(result.name) and result.approved:
-        return result
-    return None
+    return self._approvedCoverProstateResults.first()
 
   def getLastApprovedRigidTransformation(self):
-    if sum([1 for result in self.registrationResults.values() if result.approved]) == 1:
+    if len(self._approvedResults) == 1:
       lastRigidTfm = None
     else:
       lastRigidTfm = self.getMostRecentApprovedResult().transforms.rigid
@@ -403,12 +557,8 @@ class SessionData(ModuleLogicMixin):
 
   @onExceptionReturnNone
   def getMostRecentApprovedTransform(self):
-    seriesTypeManager = SeriesTypeManager()
-    results = sorted(self.registrationResults.values(), key=lambda s: s.seriesNumber)
-    for result in reversed(results):
-      if result.approved and not seriesTypeManager.isCoverProstate(result.name):
-        return result.getTransform(result.registrationType)
-    return None
+    result = self._approvedTransformResults.last()
+    return result.getTransform(result.registrationType) if result else None
 
   @onExceptionReturnNone
   def getResult(self, series):
@@ -419,27 +569,25 @@ class SessionData(ModuleLogicMixin):
     return self.getResultsBySeriesNumber(seriesNumber)
 
   def getResultsBySeriesNumber(self, seriesNumber):
-    return [result for result in self.getResultsAsList() if seriesNumber == result.seriesNumber]
+    return list(self._resultsBySeriesNumber.get(seriesNumber, []))
 
   def removeResult(self, series):
     # TODO: is this method ever used?
     try:
-      del self.registrationResults[series]
+      result = self.registrationResults.pop(series)
     except KeyError:
-      pass
+      return
+    self._resultsBySeriesNumber[result.seriesNumber].remove(result)
+    self._statusSummaries.pop(result.seriesNumber, None)
+    self._updateApprovedResults(result, removed=True)
+    del self._resultOrder[series]
 
   def exists(self, series):
     return series in self.registrationResults.keys()
 
   @onExceptionReturnNone
   def getMostRecentApprovedResult(self, priorToSeriesNumber=None):
-    results = sorted(self.registrationResults.values(), key=lambda s: s.seriesNumber)
-    if priorToSeriesNumber:
-      results = [result for result in results if result.seriesNumber < priorToSeriesNumber]
-    for result in reversed(results):
-      if result.approved:
-        return result
-    return None
+    return self._approvedResults.last(priorTo=(priorToSeriesNumber,) if priorToSeriesNumber else None)
 
   def getApprovedOrLastResultForSeries(self, series):
     results = self.getResultsBySeries(series)
@@ -452,6 +600,7 @@ class SessionData(ModuleLogicMixin):
 class AbstractRegistrationData(ModuleLogicMixin):
 
   FILE_EXTENSION = None
+  USE_CONTENT_STORE = False
 
   def __init__(self):
     self.initializeMembers()
@@ -474,11 +623,26 @@ class AbstractRegistrationData(ModuleLogicMixin):
   def getFileNameByAttributeName(self, name):
     return self.getFileName(getattr(self, name))
 
+  def isStored(self, node):
+    return self.USE_CONTENT_STORE and NodeStorage().canStore(node)
+
+  def getReference(self, node):
+    """ :return: file name of the node or content hash and name if its data is kept in the content store """
+    if self.isStored(node):
+      return {"hash": NodeStorage().getContentHash(node), "name": node.GetName()}
+    return self.getFileName(node)
+
+  def getStoredNodes(self):
+    return [node for node in self.asList() if node and self.isStored(node)]
+
+  def getStoredContentHashes(self):
+    return set(NodeStorage().getContentHash(node) for node in self.getStoredNodes())
+
   def getAllFileNames(self):
     fileNames = {}
     for regType, node in self.asDict().items():
       if node:
-        fileNames[regType] = self.getFileName(node)
+        fileNames[regType] = self.getReference(node)
     return fileNames
 
   def save(self, directory):
@@ -486,9 +650,13 @@ class AbstractRegistrationData(ModuleLogicMixin):
     savedSuccessfully = []
     failedToSave = []
     for node in [node for node in self.asList() if node]:
+      if self.isStored(node):
+        success, _ = NodeStorage().storeNodeData(node, directory)
+        self.handleSaveNodeDataReturn(success, node.GetName(), savedSuccessfully, failedToSave)
+        continue
       filename = self.getFileName(node, withExtension=False)
       if filename:
-        success, name = self.saveNodeData(node, directory, self.FILE_EXTENSION, name=filename)
+        success, name = NodeStorage().saveNodeData(node, directory, self.FILE_EXTENSION, name=filename)
         self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
     return savedSuccessfully, failedToSave
 
@@ -568,11 +736,11 @@ class SegmentationData(Serializable, ModuleLogicMixin):
     savedSuccessfully = []
     failedToSave = []
     if self._label:
-      success, name = self.saveNodeData(self._label, directory, self.FILE_EXTENSION)
+      success, name = NodeStorage().saveNodeData(self._label, directory, self.FILE_EXTENSION)
       self.fileName = name + self.FILE_EXTENSION if success else None
       self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
     if self._modifiedLabel:
-      success, name = self.saveNodeData(self._modifiedLabel, directory, self.FILE_EXTENSION)
+      success, name = NodeStorage().saveNodeData(self._modifiedLabel, directory, self.FILE_EXTENSION)
       self.userModified["fileName"] = name + self.FILE_EXTENSION if success else None
       self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
     return savedSuccessfully, failedToSave
@@ -655,7 +823,7 @@ class Targets(RegistrationTypeData):
   def save(self, directory):
     savedSuccessfully, failedToSave = super(Targets, self).save(directory)
     if self.approved:
-      success, name = self.saveNodeData(self.approved, directory, self.FILE_EXTENSION)
+      success, name = NodeStorage().saveNodeData(self.approved, directory, self.FILE_EXTENSION)
       self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
     return savedSuccessfully, failedToSave
 
@@ -676,6 +844,7 @@ class Targets(RegistrationTypeData):
 class Volumes(RegistrationTypeData):
 
   FILE_EXTENSION = FileExtension.NRRD
+  USE_CONTENT_STORE = True
 
   def __init__(self):
     super(Volumes, self).__init__()
@@ -697,6 +866,7 @@ class Volumes(RegistrationTypeData):
 class Labels(AbstractRegistrationData):
 
   FILE_EXTENSION = FileExtension.NRRD
+  USE_CONTENT_STORE = True
 
   def __init__(self):
     super(Labels, self).__init__()
@@ -735,6 +905,8 @@ class RegistrationStatus(ModuleLogicMixin):
     assert value in self.__allowedStates
     self.timestamp = self.getTime()
     self._status = value
+    if self.statusChangedCallback:
+      self.statusChangedCallback(self)
     self.invokeEvent(self.StatusEvents[value])
 
   @property
@@ -752,6 +924,7 @@ class RegistrationStatus(ModuleLogicMixin):
   def __init__(self):
     self._status = self.UNDEFINED_STATUS
     self.consentGivenBy = None
+    self.statusChangedCallback = None
 
   def hasStatus(self, status):
     return self.status == status
@@ -813,9 +986,28 @@ class RegistrationResultBase(ModuleLogicMixin):
     self.name = series
 
 
+def lazilyLoaded(attribute):
+  """ Property of RegistrationResult data which loads the data of the result on first access """
+
+  def getter(self):
+    self.loadData()
+    return getattr(self, attribute)
+
+  def setter(self, value):
+    setattr(self, attribute, value)
+
+  return property(getter, setter)
+
+
 class RegistrationResult(RegistrationResultBase, RegistrationStatus):
 
   REGISTRATION_TYPE_NAMES = ['rigid', 'affine', 'bSpline']
+  FILE_DATA_ATTRIBUTES = ['volumes', 'transforms', 'targets', 'labels']
+
+  volumes = lazilyLoaded("_volumes")
+  transforms = lazilyLoaded("_transforms")
+  targets = lazilyLoaded("_targets")
+  labels = lazilyLoaded("_labels")
 
   @staticmethod
   def getSeriesNumberFromString(text):
@@ -834,7 +1026,13 @@ class RegistrationResult(RegistrationResultBase, RegistrationStatus):
   def cmdFileName(self):
     return str(self.seriesNumber) + "-CMD-PARAMETERS" + self.suffix + FileExtension.TXT
 
+  @property
+  def dataLoaded(self):
+    return self._dataLoader is None
+
   def __init__(self, series):
+    self._dataLoader = None
+    self._fileReferences = None
     RegistrationStatus.__init__(self)
     RegistrationResultBase.__init__(self, series)
 
@@ -857,6 +1055,22 @@ class RegistrationResult(RegistrationResultBase, RegistrationStatus):
 
     self.segmentationData = None
 
+  def setDataLoader(self, dataLoader, fileReferences):
+    """ Defers loading of volumes, transforms, targets and labels of a result which has been read from results.json
+
+    :param dataLoader: callable taking the result, invoked by loadData
+    :param fileReferences: the file sections of the result in results.json, written again as long as nothing got loaded
+    """
+    self._dataLoader = dataLoader
+    self._fileReferences = fileReferences
+
+  def loadData(self):
+    if self._dataLoader is None:
+      return
+    dataLoader, self._dataLoader = self._dataLoader, None
+    dataLoader(self)
+    self._fileReferences = None
+
   def setVolume(self, name, volume):
     setattr(self.volumes, name, volume)
 
@@ -924,6 +1138,34 @@ class RegistrationResult(RegistrationResultBase, RegistrationStatus):
       modified = [False for i in range(self.targets.approved.GetNumberOfFiducials())]
     return modified
 
+  def getStoredNodes(self):
+    """ :return: volumes and labels of the result which are kept in the content store """
+    return self.volumes.getStoredNodes() + self.labels.getStoredNodes() if self.dataLoaded else []
+
+  def getStoredContentHashes(self):
+    return self.volumes.getStoredContentHashes() | self.labels.getStoredContentHashes() if self.dataLoaded else set()
+
+  def getFileReferences(self):
+    """ :return: the file sections (targets, transforms, volumes, labels) of the result in results.json """
+    if not self.dataLoaded:
+      return copy.deepcopy(self._fileReferences)
+    references = {}
+    if self.approved or self.rejected:
+      references["targets"] = self.targets.getAllFileNames()
+      references["transforms"] = self.transforms.getAllFileNames()
+      references["volumes"] = self.volumes.getAllFileNames()
+      references["labels"] = self.labels.getAllFileNames()
+    elif self.skipped:
+      references["volumes"] = {
+        "fixed": self.volumes.getReference(self.volumes.fixed)
+      }
+    if self.approved:
+      references["targets"]["approved"] = {
+        "userModified": self.getApprovedTargetsModifiedStatus(),
+        "fileName": self.targets.getFileNameByAttributeName("approved")
+      }
+    return references
+
   def asDict(self):
     seriesTypeManager = SeriesTypeManager()
     dictionary = super(RegistrationResult, self).asDict()
@@ -934,11 +1176,8 @@ class RegistrationResult(RegistrationResultBase, RegistrationStatus):
         "receivedTime": self.receivedTime
       }
     })
+    dictionary.update(self.getFileReferences())
     if self.approved or self.rejected:
-      dictionary["targets"] = self.targets.getAllFileNames()
-      dictionary["transforms"] = self.transforms.getAllFileNames()
-      dictionary["volumes"] = self.volumes.getAllFileNames()
-      dictionary["labels"] = self.labels.getAllFileNames()
       dictionary["suffix"] = self.suffix
       if self.startTime and self.endTime:
         dictionary["registration"] = {
@@ -947,17 +1186,8 @@ class RegistrationResult(RegistrationResultBase, RegistrationStatus):
         }
       if self.approved:
         dictionary["status"]["registrationType"] = self.registrationType
-    elif self.skipped:
-      dictionary["volumes"] = {
-        "fixed": self.volumes.getFileName(self.volumes.fixed)
-      }
     if self.score:
       dictionary["score"] = self.score
-    if self.approved:
-      dictionary["targets"]["approved"] = {
-        "userModified": self.getApprovedTargetsModifiedStatus(),
-        "fileName": self.targets.getFileNameByAttributeName("approved")
-      }
     if self.segmentationData:
       dictionary["segmentation"] = self.segmentationData.toJSON()
     return dictionary
@@ -978,10 +1208,10 @@ class ZFrameRegistrationResult(RegistrationResultBase):
     }
     savedSuccessfully = []
     failedToSave = []
-    success, name = self.saveNodeData(self.transform, outputDir, FileExtension.H5)
+    success, name = NodeStorage().saveNodeData(self.transform, outputDir, FileExtension.H5)
     dictionary["transform"] = name + FileExtension.H5
     self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
-    success, name = self.saveNodeData(self.volume, outputDir, FileExtension.NRRD)
+    success, name = NodeStorage().saveNodeData(self.volume, outputDir, FileExtension.NRRD)
     dictionary["volume"] = name + FileExtension.NRRD
     self.handleSaveNodeDataReturn(success, name, savedSuccessfully, failedToSave)
     return dictionary
@@ -13,8 +13,8 @@ from .plugins.charts import SliceTrackerDisplacementChartPlugin
 from ..constants import SliceTrackerConstants as constants
 from ..sessionData import RegistrationResult
 from ..helpers import IncomingDataMessageBox, SeriesTypeToolButton, SeriesTypeManager
+from ..seriesSelectorModel import IntraopSeriesSelectorModel
 
-from SlicerDevelopmentToolboxUtils.constants import COLOR
 from SlicerDevelopmentToolboxUtils.widgets import CustomStatusProgressbar
 from SlicerDevelopmentToolboxUtils.icons import Icons
 
@@ -121,7 +121,7 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
   def setupIntraopSeriesSelector(self):
     self.intraopSeriesSelector = qt.QComboBox()
     self.intraopSeriesSelector.setSizePolicy(qt.QSizePolicy.Expanding, qt.QSizePolicy.Minimum)
-    self._seriesModel = qt.QStandardItemModel()
+    self._seriesModel = IntraopSeriesSelectorModel()
     self.intraopSeriesSelector.setModel(self._seriesModel)
     self.intraopSeriesSelector.setToolTip(constants.IntraopSeriesSelectorToolTip)
 
@@ -146,7 +146,7 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
   def onSkipIntraopSeriesButtonClicked(self):
     if slicer.util.confirmYesNoDisplay("Do you really want to skip this series?", windowTitle="Skip series?"):
       self.session.skip(self.intraopSeriesSelector.currentText)
-      self.updateIntraopSeriesSelectorTable()
+      self.updateIntraopSeriesSelectorTable(invalidate=True)
 
   def onTrackTargetsButtonClicked(self):
     self.session.takeActionForCurrentSeries()
@@ -207,17 +207,22 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
   @vtk.calldata_type(vtk.VTK_STRING)
   def onCurrentSeriesChanged(self, caller, event, callData=None):
     if callData:
-      model = self.intraopSeriesSelector.model()
-      index = next((i for i in range(model.rowCount()) if model.item(i).text() == callData), None)
-      self.intraopSeriesSelector.currentIndex = index
+      self.intraopSeriesSelector.currentIndex = self._seriesModel.getRow(callData)
 
   def onZFrameRegistrationSuccessful(self, caller, event):
+    self._seriesModel.invalidate()
     self.active = True
 
-  def onRegistrationStatusChanged(self, caller, event):
-    self.active = True
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onRegistrationStatusChanged(self, caller, event, callData):
+    self._seriesModel.invalidateResults(ast.literal_eval(callData))
+    if self.active:
+      self.updateIntraopSeriesSelectorTable()
+    else:
+      self.active = True
 
   def onLoadingMetadataSuccessful(self, caller, event):
+    self._seriesModel.invalidate()
     self.active = True
 
   @vtk.calldata_type(vtk.VTK_STRING)
@@ -231,7 +236,7 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
     self.targetTablePlugin.currentTargets = None
 
   def onPreprocessingSuccessful(self, caller, event):
-    self.updateIntraopSeriesSelectorTable()
+    self.updateIntraopSeriesSelectorTable(invalidate=True)
     self.configureRedSliceNodeForPreopData()
     self.promptUserAndApplyBiasCorrectionIfNeeded()
     if not self.session.isBusy():
@@ -242,7 +247,7 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
     self.updateIntraopSeriesSelectorTable()
 
   def onSeriesTypeManuallyAssigned(self, caller, event):
-    self.updateIntraopSeriesSelectorTable()
+    self.updateIntraopSeriesSelectorTable(invalidate=True)
 
   @vtk.calldata_type(vtk.VTK_STRING)
   def onNewImageSeriesReceived(self, caller, event, callData):
@@ -285,23 +290,13 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
       if hasattr(self, "notifyUserAboutNewDataAnswer") and self.notifyUserAboutNewDataAnswer == qt.QMessageBox.AcceptRole:
         self.onTrackTargetsButtonClicked()
 
-  def updateIntraopSeriesSelectorTable(self):
+  def updateIntraopSeriesSelectorTable(self, invalidate=False):
     self.intraopSeriesSelector.blockSignals(True)
-    currentIndex = self.intraopSeriesSelector.currentIndex
-    self._seriesModel.clear()
-    for series in self.session.seriesList:
-      sItem = qt.QStandardItem(series)
-      self._seriesModel.appendRow(sItem)
-      color = COLOR.YELLOW
-      if self.session.data.registrationResultWasApproved(series) or \
-        (self.session.seriesTypeManager.isCoverTemplate(series) and not self.session.isCoverTemplateTrackable(series)):
-        color = COLOR.GREEN
-      elif self.session.data.registrationResultWasSkipped(series):
-        color = COLOR.RED
-      elif self.session.data.registrationResultWasRejected(series):
-        color = COLOR.GRAY
-      self._seriesModel.setData(sItem.index(), color, qt.Qt.BackgroundRole)
-    self.intraopSeriesSelector.setCurrentIndex(currentIndex)
+    currentSeries = self.intraopSeriesSelector.currentText
+    if invalidate:
+      self._seriesModel.invalidate()
+    self._seriesModel.update()
+    self.intraopSeriesSelector.setCurrentIndex(self._seriesModel.getRow(currentSeries) if currentSeries else -1)
     self.intraopSeriesSelector.blockSignals(False)
     colorStyle = self.session.getColorForSelectedSeries(self.intraopSeriesSelector.currentText)
     self.intraopSeriesSelector.setStyleSheet("QComboBox{%s} QToolTip{background-color: white;}" % colorStyle)
@@ -309,26 +304,26 @@ class SliceTrackerOverviewStep(SliceTrackerStep):
       self.selectMostRecentEligibleSeries()
 
   def selectMostRecentEligibleSeries(self):
-    substring = self.getSetting("NEEDLE_IMAGE_PATTERN")
+    seriesType = constants.GUIDANCE_IMAGE
     seriesTypeManager = SeriesTypeManager()
     self.intraopSeriesSelector.blockSignals(True)
     self.intraopSeriesSelector.setCurrentIndex(-1)
     self.intraopSeriesSelector.blockSignals(False)
     index = -1
     if not self.session.data.getMostRecentApprovedCoverProstateRegistration():
-      substring = self.getSetting("COVER_TEMPLATE_PATTERN") \
-        if not self.session.zFrameRegistrationSuccessful else self.getSetting("COVER_PROSTATE_PATTERN")
-    for item in list(reversed(range(len(self.session.seriesList)))):
-      series = self._seriesModel.item(item).text()
-      if substring in seriesTypeManager.getSeriesType(series):
+      seriesType = constants.COVER_TEMPLATE if not self.session.zFrameRegistrationSuccessful \
+        else constants.COVER_PROSTATE
+    for row in reversed(range(self._seriesModel.rowCount())):
+      series = self._seriesModel.getSeries(row)
+      if seriesTypeManager.getSeriesType(series) == seriesType:
         if index != -1:
           if self.session.data.registrationResultWasApprovedOrRejected(series) or \
             self.session.data.registrationResultWasSkipped(series):
             break
-        index = self.intraopSeriesSelector.findText(series)
+        index = row
         break
       elif self.session.seriesTypeManager.isVibe(series) and index == -1:
-        index = self.intraopSeriesSelector.findText(series)
+        index = row
     rowCount = self.intraopSeriesSelector.model().rowCount()
 
     self.intraopSeriesSelector.setCurrentIndex(index if index != -1 else (rowCount-1 if rowCount else -1))
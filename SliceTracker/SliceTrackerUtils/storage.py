@@ -0,0 +1,524 @@
+import os
+import sys
+import zlib
+import gzip
+import struct
+import shutil
+import hashlib
+import logging
+import threading
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+from multiprocessing.pool import ThreadPool
+
+import vtk
+import slicer
+from vtk.util import numpy_support
+
+from SlicerDevelopmentToolboxUtils.constants import FileExtension
+from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
+from SlicerDevelopmentToolboxUtils.decorators import singleton
+
+from .constants import SliceTrackerConstants
+
+
+def replaceFile(source, destination):
+  try:
+    os.replace(source, destination)
+  except AttributeError:
+    if os.path.exists(destination):
+      os.remove(destination)
+    os.rename(source, destination)
+
+
+class CompressionPolicy(object):
+  """ Encoding of saved NRRD volumes
+
+  NONE writes the voxels raw, GZIP as a single gzip stream with the given level. PARALLEL_GZIP splits the voxels into
+  blocks of BLOCK_SIZE bytes which are deflated by numberOfThreads threads (zlib releases the GIL). Every block but the
+  last ends with a full flush, so the blocks join into one deflate stream which is written as a single gzip member
+  with one CRC. The result is an ordinary gzip stream any NRRD reader can decode, it is only slightly larger than with
+  GZIP because blocks do not refer back to earlier ones.
+  """
+
+  NONE = "none"
+  GZIP = "gzip"
+  PARALLEL_GZIP = "parallel-gzip"
+  CODECS = [NONE, GZIP, PARALLEL_GZIP]
+
+  DEFAULT_LEVEL = 6
+  BLOCK_SIZE = 1 << 20
+
+  def __init__(self, codec=GZIP, level=DEFAULT_LEVEL, numberOfThreads=1):
+    if codec not in self.CODECS:
+      raise ValueError("Unknown compression %s, expected one of %s" % (codec, ", ".join(self.CODECS)))
+    if not 0 <= level <= 9:
+      raise ValueError("Compression level has to be between 0 and 9, got %d" % level)
+    self.codec = codec
+    self.level = level
+    self.numberOfThreads = max(1, numberOfThreads)
+    self._pool = None
+    self._lock = threading.Lock()
+
+  def __repr__(self):
+    return "%s(%r, %d, %d)" % (self.__class__.__name__, self.codec, self.level, self.numberOfThreads)
+
+  @property
+  def encoding(self):
+    return "raw" if self.codec == self.NONE else "gzip"
+
+  def write(self, f, data):
+    if self.codec == self.NONE:
+      f.write(data)
+    elif self.codec == self.GZIP:
+      with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=self.level) as compressed:
+        compressed.write(data)
+    else:
+      blocks = [(data[offset:offset + self.BLOCK_SIZE], offset + self.BLOCK_SIZE >= len(data))
+                for offset in range(0, len(data), self.BLOCK_SIZE)] or [(b"", True)]
+      # gzip header without file name and modification time, see RFC 1952
+      f.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+      crc = 0
+      for (block, _), deflated in zip(blocks, self._getPool().imap(self._deflateBlock, blocks)):
+        crc = zlib.crc32(block, crc)
+        f.write(deflated)
+      f.write(struct.pack("<II", crc & 0xffffffff, len(data) & 0xffffffff))
+
+  def _deflateBlock(self, job):
+    block, isLast = job
+    compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if isLast else zlib.Z_FULL_FLUSH)
+
+  def _getPool(self):
+    with self._lock:
+      if self._pool is None:
+        self._pool = ThreadPool(self.numberOfThreads)
+      return self._pool
+
+  def stop(self):
+    with self._lock:
+      if self._pool is not None:
+        self._pool.close()
+        self._pool = None
+
+
+class VolumeSnapshot(object):
+  """ Copy of the voxels and geometry of a single component scalar volume which can be written as NRRD, encoded by a
+  CompressionPolicy, off the main thread """
+
+  NRRD_TYPES = {
+    'int8': 'signed char', 'uint8': 'unsigned char', 'int16': 'short', 'uint16': 'unsigned short',
+    'int32': 'int', 'uint32': 'unsigned int', 'int64': 'long long', 'uint64': 'unsigned long long',
+    'float32': 'float', 'float64': 'double'
+  }
+
+  @staticmethod
+  def canSnapshot(node):
+    imageData = node.GetImageData() if isinstance(node, slicer.vtkMRMLScalarVolumeNode) else None
+    return imageData is not None and imageData.GetNumberOfScalarComponents() == 1 and \
+      imageData.GetPointData().GetScalars() is not None
+
+  @staticmethod
+  def getVoxelsAndGeometry(node):
+    """ :return: voxel array (not a copy), dimensions and the upper three rows of the IJK to RAS matrix """
+    imageData = node.GetImageData()
+    ijkToRAS = vtk.vtkMatrix4x4()
+    node.GetIJKToRASMatrix(ijkToRAS)
+    return numpy_support.vtk_to_numpy(imageData.GetPointData().GetScalars()), imageData.GetDimensions(), \
+      [[ijkToRAS.GetElement(row, column) for column in range(4)] for row in range(3)]
+
+  @staticmethod
+  def hashVoxelsAndGeometry(array, dimensions, ijkToRAS):
+    geometry = " ".join("%.6f" % (round(value, 6) + 0.0) for row in ijkToRAS for value in row)
+    header = "%s %s %s\n" % (array.dtype.name, " ".join(str(d) for d in dimensions), geometry)
+    digest = hashlib.sha1(header.encode("ascii"))
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+  @classmethod
+  def computeContentHash(cls, node):
+    """ :return: SHA-1 of voxel type, dimensions, geometry (rounded to 1e-6) and voxels of the node. It does not
+    depend on the node name or on how the volume is stored """
+    return cls.hashVoxelsAndGeometry(*cls.getVoxelsAndGeometry(node))
+
+  def __init__(self, node, compression=None):
+    self.compression = compression or CompressionPolicy()
+    array, self.dimensions, self.ijkToRAS = self.getVoxelsAndGeometry(node)
+    self.array = array.copy()
+
+  def getContentHash(self):
+    """ :return: VolumeSnapshot.computeContentHash of the node the snapshot has been taken of, computed from the copy so
+    it can be called off the main thread """
+    return self.hashVoxelsAndGeometry(self.array, self.dimensions, self.ijkToRAS)
+
+  def getHeader(self, encoding):
+    # NRRD geometry is stored in LPS while Slicer uses RAS
+    toLPS = [-1, -1, 1]
+    directions = ["(%s)" % ",".join(repr(toLPS[row] * self.ijkToRAS[row][axis]) for row in range(3))
+                  for axis in range(3)]
+    origin = "(%s)" % ",".join(repr(toLPS[row] * self.ijkToRAS[row][3]) for row in range(3))
+    return "\n".join([
+      "NRRD0004",
+      "# Complete NRRD file format specification at:",
+      "# http://teem.sourceforge.net/nrrd/format.html",
+      "type: %s" % self.NRRD_TYPES[self.array.dtype.name],
+      "dimension: 3",
+      "space: left-posterior-superior",
+      "sizes: %d %d %d" % tuple(self.dimensions),
+      "space directions: %s" % " ".join(directions),
+      "kinds: domain domain domain",
+      "endian: %s" % sys.byteorder,
+      "encoding: %s" % encoding,
+      "space origin: %s" % origin,
+      "", ""])
+
+  def write(self, fileName):
+    with open(fileName, 'wb') as f:
+      f.write(self.getHeader(self.compression.encoding).encode("ascii"))
+      self.compression.write(f, self.array.tobytes())
+
+
+class FiducialsSnapshot(object):
+  """ Copy of the control points of a markups fiducial node which can be written as FCSV off the main thread """
+
+  HEADER = ["# Markups fiducial file version = 4.6",
+            "# CoordinateSystem = 0",
+            "# columns = id,x,y,z,ow,ox,oy,oz,vis,sel,lock,label,desc,associatedNodeID"]
+
+  @staticmethod
+  def canSnapshot(node):
+    return isinstance(node, slicer.vtkMRMLMarkupsFiducialNode)
+
+  def __init__(self, node):
+    self.rows = []
+    position = [0.0, 0.0, 0.0]
+    for index in range(node.GetNumberOfFiducials()):
+      node.GetNthFiducialPosition(index, position)
+      self.rows.append([node.GetNthMarkupID(index)] + [repr(p) for p in position] + ["0", "0", "0", "1"] +
+                       [str(int(flag)) for flag in [node.GetNthFiducialVisibility(index),
+                                                    node.GetNthFiducialSelected(index),
+                                                    node.GetNthFiducialLocked(index)]] +
+                       [node.GetNthFiducialLabel(index), node.GetNthMarkupDescription(index),
+                        node.GetNthMarkupAssociatedNodeID(index) or ""])
+
+  @staticmethod
+  def toStorageFormat(field):
+    """ Quotes fields containing commas or quotes and doubles the quotes inside, like the fiducial storage node """
+    return '"%s"' % field.replace('"', '""') if "," in field or '"' in field else field
+
+  def write(self, fileName):
+    with open(fileName, 'w') as f:
+      f.write("\n".join(self.HEADER + [",".join(self.toStorageFormat(field) for field in row)
+                                        for row in self.rows]) + "\n")
+
+
+class AsyncNodeWriter(object):
+  """ Writes snapshots of MRML node data from a pool of worker threads.
+
+  Snapshots are taken on the calling (main) thread, encoding, compression and disk access happen on the workers. All
+  writes of the same file go to the same worker so they are applied in order. Files are written to a temporary name
+  first and then renamed. waitForPendingWrites() is the completion barrier, e.g. before a case gets closed.
+  """
+
+  def __init__(self, numberOfThreads=2):
+    self.numberOfThreads = max(1, numberOfThreads)
+    self._lock = threading.Lock()
+    self._pendingFileNames = {}
+    self._failedFileNames = []
+    self._queues = [queue.Queue() for _ in range(self.numberOfThreads)]
+    self._workers = [threading.Thread(target=self._work, args=(q,), name="SliceTrackerWriter%d" % index)
+                     for index, q in enumerate(self._queues)]
+    for worker in self._workers:
+      worker.daemon = True
+      worker.start()
+
+  def isPending(self, fileName):
+    with self._lock:
+      return fileName in self._pendingFileNames
+
+  def write(self, snapshot, fileName, onFailure=None):
+    with self._lock:
+      self._pendingFileNames[fileName] = self._pendingFileNames.get(fileName, 0) + 1
+    self._queues[hash(fileName) % self.numberOfThreads].put((snapshot, fileName, onFailure))
+
+  def waitForPendingWrites(self):
+    """ :return: names of the files which failed to be written since the last call """
+    for q in self._queues:
+      q.join()
+    with self._lock:
+      failedFileNames, self._failedFileNames = self._failedFileNames, []
+    return failedFileNames
+
+  def stop(self):
+    self.waitForPendingWrites()
+    for q in self._queues:
+      q.put(None)
+
+  def _work(self, jobs):
+    while True:
+      job = jobs.get()
+      if job is None:
+        jobs.task_done()
+        return
+      snapshot, fileName, onFailure = job
+      temporaryFileName = fileName + ".writing"
+      try:
+        snapshot.write(temporaryFileName)
+        replaceFile(temporaryFileName, fileName)
+      except Exception:
+        logging.exception("Failed to write %s" % fileName)
+        with self._lock:
+          self._failedFileNames.append(fileName)
+        if onFailure:
+          onFailure()
+      finally:
+        with self._lock:
+          self._pendingFileNames[fileName] -= 1
+          if not self._pendingFileNames[fileName]:
+            del self._pendingFileNames[fileName]
+        jobs.task_done()
+
+
+@singleton
+class NodeStorage(ModuleLogicMixin):
+  """ Dirty tracking for everything SessionData writes into the case output directory.
+
+  For every file the state of its last successful write is remembered: the MRML node ID and modification time for node
+  data and size and modification time of the source for copied files. A write is skipped if nothing changed since then
+  and the file still exists, so saving costs what has changed rather than what the case contains.
+
+  Scalar volumes and point lists are written from snapshots, volumes with the encoding of the CompressionPolicy
+  (setCompressionPolicy). With an AsyncNodeWriter (setNumberOfWriterThreads) they are only snapshotted by saveNodeData
+  and written in the background. Their state is recorded right away and dropped again (from the writer thread) if the
+  write fails, so the saved states are guarded by a lock.
+
+  Volumes of registration results go into the content store of the output directory instead (storeNodeData): one file
+  per content hash, so identical volumes of different results and retries are written once. computeContentHashes
+  hashes them on the writer threads beforehand. Hashes of volumes which
+  failed to be written into the store in the background are collected for popFailedStores.
+  """
+
+  def __init__(self):
+    self.writer = None
+    self.compression = CompressionPolicy()
+    self._lock = threading.Lock()
+    self._hashPool = None
+    self.clear()
+
+  def clear(self):
+    self.waitForPendingWrites()
+    with self._lock:
+      self._savedStates = {}
+      self._failedStoreHashes = set()
+    self._contentHashes = {}
+    self._snapshots = {}
+
+  def setNumberOfWriterThreads(self, numberOfThreads):
+    """ :param numberOfThreads: 0 to write synchronously """
+    if self.writer and self.writer.numberOfThreads == numberOfThreads:
+      return
+    if self.writer:
+      self.writer.stop()
+    if self._hashPool:
+      self._hashPool.close()
+      self._hashPool = None
+    self.writer = AsyncNodeWriter(numberOfThreads) if numberOfThreads > 0 else None
+
+  def setCompressionPolicy(self, compression):
+    self.waitForPendingWrites()
+    self.compression.stop()
+    self.compression = compression
+
+  def waitForPendingWrites(self):
+    """ :return: names of the files which failed to be written in the background """
+    return self.writer.waitForPendingWrites() if self.writer else []
+
+  @staticmethod
+  def getModifiedTime(node):
+    """ :return: latest modification time of the node and of the data it stores (image data, transform) """
+    modifiedTime = node.GetMTime()
+    for getter in ["GetImageData", "GetTransformToParent"]:
+      data = getattr(node, getter)() if hasattr(node, getter) else None
+      if data is not None:
+        modifiedTime = max(modifiedTime, data.GetMTime())
+    return modifiedTime
+
+  def getNodeState(self, node):
+    return node.GetID(), self.getModifiedTime(node)
+
+  def isUpToDate(self, fileName, state):
+    fileName = os.path.abspath(fileName)
+    with self._lock:
+      savedState = self._savedStates.get(fileName)
+    return savedState == state and \
+      (os.path.exists(fileName) or (self.writer is not None and self.writer.isPending(fileName)))
+
+  def markSaved(self, fileName, state):
+    with self._lock:
+      self._savedStates[os.path.abspath(fileName)] = state
+
+  def _forgetSavedState(self, fileName, state):
+    """ Drops the state of a failed background write (called from the writer thread) unless a newer one was saved """
+    with self._lock:
+      if self._savedStates.get(fileName) == state:
+        del self._savedStates[fileName]
+
+  def _storeFailed(self, contentHash):
+    """ Called from the writer thread if a volume could not be written into the content store """
+    with self._lock:
+      self._failedStoreHashes.add(contentHash)
+
+  def popFailedStores(self):
+    """ :return: content hashes of the volumes which failed to be written into the content store since the last call """
+    with self._lock:
+      failedStoreHashes, self._failedStoreHashes = self._failedStoreHashes, set()
+    return failedStoreHashes
+
+  def markNodeSaved(self, node, fileName):
+    """ Marks a node as in sync with fileName, e.g. after it has been loaded from that file """
+    self.markSaved(fileName, self.getNodeState(node))
+
+  def saveNodeData(self, node, outputDir, extension, name=None):
+    """ Same as ModuleLogicMixin.saveNodeData but only writes if the node changed since it was saved to that file """
+    name = self.replaceUnwantedCharacters(name if name else node.GetName())
+    fileName = os.path.join(outputDir, name + extension)
+    state = self.getNodeState(node)
+    if self.isUpToDate(fileName, state):
+      logging.debug("%s is up to date" % fileName)
+      return True, name
+    snapshot = self.createSnapshot(node, extension)
+    if snapshot and self.writer:
+      fileName = os.path.abspath(fileName)
+      self.markSaved(fileName, state)
+      self.writer.write(snapshot, fileName, onFailure=lambda: self._forgetSavedState(fileName, state))
+      return True, name
+    if snapshot:
+      try:
+        snapshot.write(fileName)
+      except (IOError, OSError):
+        logging.exception("Failed to write %s" % fileName)
+        return False, name
+      self.markSaved(fileName, state)
+      return True, name
+    success, name = super(NodeStorage, self).saveNodeData(node, outputDir, extension, name=name)
+    if success:
+      self.markSaved(fileName, state)
+    return success, name
+
+  def createSnapshot(self, node, extension):
+    """ :return: VolumeSnapshot or FiducialsSnapshot of the node or None if it has to be saved by Slicer """
+    if extension == FileExtension.NRRD and VolumeSnapshot.canSnapshot(node):
+      return VolumeSnapshot(node, self.compression)
+    if extension == FileExtension.FCSV and FiducialsSnapshot.canSnapshot(node):
+      return FiducialsSnapshot(node)
+    return None
+
+  @staticmethod
+  def getStoredFileName(outputDir, contentHash):
+    return os.path.join(outputDir, SliceTrackerConstants.CONTENT_STORE_DIRECTORY, contentHash + FileExtension.NRRD)
+
+  @staticmethod
+  def canStore(node):
+    return VolumeSnapshot.canSnapshot(node)
+
+  def getContentHash(self, node):
+    """ :return: VolumeSnapshot.computeContentHash of the node, computed again only if the node has been modified """
+    modifiedTime = self.getModifiedTime(node)
+    try:
+      hashedTime, contentHash = self._contentHashes[node.GetID()]
+      if hashedTime == modifiedTime:
+        return contentHash
+    except KeyError:
+      pass
+    contentHash = VolumeSnapshot.computeContentHash(node)
+    self._contentHashes[node.GetID()] = (modifiedTime, contentHash)
+    return contentHash
+
+  def computeContentHashes(self, nodes, whileWaiting=None):
+    """ Hashes the volumes whose content hash is not known yet on the writer threads
+
+    The voxels are copied into snapshots on the calling thread, which calls whileWaiting (e.g. to process GUI events)
+    until all hashes are computed. The snapshots are kept for storeNodeData, so the voxels are copied only once.
+    """
+    snapshots = {}
+    for node in nodes:
+      if node.GetID() not in snapshots and not self._isContentHashKnown(node):
+        snapshots[node.GetID()] = (self.getModifiedTime(node), VolumeSnapshot(node, self.compression))
+    if not snapshots:
+      return
+    nodeIDs = list(snapshots.keys())
+    getContentHash = lambda nodeID: snapshots[nodeID][1].getContentHash()
+    if self.writer:
+      contentHashes = self._getHashPool().map_async(getContentHash, nodeIDs)
+      while not contentHashes.ready():
+        if whileWaiting:
+          whileWaiting()
+        contentHashes.wait(0.01)
+      contentHashes = contentHashes.get()
+    else:
+      contentHashes = [getContentHash(nodeID) for nodeID in nodeIDs]
+    for nodeID, contentHash in zip(nodeIDs, contentHashes):
+      modifiedTime, snapshot = snapshots[nodeID]
+      self._contentHashes[nodeID] = (modifiedTime, contentHash)
+      self._snapshots[nodeID] = (modifiedTime, snapshot)
+
+  def _isContentHashKnown(self, node):
+    try:
+      return self._contentHashes[node.GetID()][0] == self.getModifiedTime(node)
+    except KeyError:
+      return False
+
+  def _popSnapshot(self, node):
+    """ :return: snapshot taken by computeContentHashes unless the node has been modified since """
+    modifiedTime, snapshot = self._snapshots.pop(node.GetID(), (None, None))
+    if snapshot is None or modifiedTime != self.getModifiedTime(node):
+      return None
+    snapshot.compression = self.compression
+    return snapshot
+
+  def _getHashPool(self):
+    if self._hashPool is None:
+      self._hashPool = ThreadPool(self.writer.numberOfThreads)
+    return self._hashPool
+
+  def markNodeStored(self, node, contentHash):
+    """ Remembers the content hash of a node, e.g. after it has been loaded from the content store """
+    self._contentHashes[node.GetID()] = (self.getModifiedTime(node), contentHash)
+
+  def storeNodeData(self, node, outputDir):
+    """ Writes the volume into the content store of outputDir unless a volume with the same content is stored already
+
+    :return: success, content hash
+    """
+    contentHash = self.getContentHash(node)
+    snapshot = self._popSnapshot(node)
+    fileName = os.path.abspath(self.getStoredFileName(outputDir, contentHash))
+    if os.path.exists(fileName) or (self.writer is not None and self.writer.isPending(fileName)):
+      return True, contentHash
+    if not os.path.exists(os.path.dirname(fileName)):
+      os.makedirs(os.path.dirname(fileName))
+    snapshot = snapshot or VolumeSnapshot(node, self.compression)
+    if self.writer:
+      self.writer.write(snapshot, fileName, onFailure=lambda: self._storeFailed(contentHash))
+      return True, contentHash
+    temporaryFileName = fileName + ".writing"
+    try:
+      snapshot.write(temporaryFileName)
+      replaceFile(temporaryFileName, fileName)
+    except (IOError, OSError):
+      logging.exception("Failed to write %s" % fileName)
+      return False, contentHash
+    return True, contentHash
+
+  def copyFile(self, source, destination):
+    """ :return: True if the file was copied, False if the destination was up to date already """
+    sourceStat = os.stat(source)
+    state = (os.path.abspath(source), sourceStat.st_size, sourceStat.st_mtime)
+    if self.isUpToDate(destination, state):
+      return False
+    shutil.copy(source, destination)
+    self.markSaved(destination, state)
+    return True
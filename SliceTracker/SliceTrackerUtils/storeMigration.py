@@ -0,0 +1,164 @@
+""" Migration of existing cases to the content store
+
+Moves the volumes and labels of registration results that were saved as individual files into the content store of
+the case output directory (SliceTrackerOutputs/store/<hash>.nrrd), rewrites their references in results.json and
+removes the original files, so identical volumes of different results and retries are kept once. Files which are
+referenced from anywhere else in results.json stay where they are. The cases must not be open in SliceTracker:
+
+  Slicer --no-main-window --python-code "from SliceTrackerUtils.storeMigration import main; main(['<cases>'])"
+
+Pass --dry-run to only report the space that would be reclaimed.
+"""
+
+import os
+import shutil
+import logging
+import argparse
+
+import slicer
+
+from .constants import SliceTrackerConstants
+from .journal import SessionJournal
+from .storage import NodeStorage, VolumeSnapshot
+
+STORED_SECTIONS = ["volumes", "labels"]
+
+
+class ContentStoreMigration(object):
+
+  def __init__(self, dryRun=False):
+    self.dryRun = dryRun
+
+  @staticmethod
+  def findCaseOutputDirectories(directory):
+    return sorted(root for root, _, fileNames in os.walk(directory) if SliceTrackerConstants.JSON_FILENAME in fileNames)
+
+  def run(self, directories):
+    """ :return: report with the number of migrated files and the bytes reclaimed per case and in total """
+    cases = {}
+    for outputDir in [d for directory in directories for d in self.findCaseOutputDirectories(directory)]:
+      try:
+        cases[outputDir] = self.migrateCase(outputDir)
+      except (IOError, OSError, ValueError, KeyError) as exc:
+        logging.exception("Failed to migrate %s" % outputDir)
+        cases[outputDir] = {"error": str(exc)}
+    migrated = [case for case in cases.values() if "error" not in case]
+    return {
+      "cases": cases,
+      "files": sum(case["files"] for case in migrated),
+      "storedFiles": sum(case["storedFiles"] for case in migrated),
+      "bytesReclaimed": sum(case["bytesReclaimed"] for case in migrated),
+      "dryRun": self.dryRun
+    }
+
+  def migrateCase(self, outputDir):
+    snapshotFileName = os.path.join(outputDir, SliceTrackerConstants.JSON_FILENAME)
+    data = SessionJournal.read(snapshotFileName)
+    fileNames = self.getResultFileNames(data) - self.getOtherFileNames(data)
+
+    contentHashes = {}
+    for fileName in sorted(fileNames):
+      contentHash = self.computeContentHash(os.path.join(outputDir, fileName))
+      if contentHash:
+        contentHashes[fileName] = contentHash
+
+    removedBytes = sum(os.path.getsize(os.path.join(outputDir, f)) for f in contentHashes)
+    addedBytes = 0
+    newFileNames = {}
+    for fileName, contentHash in sorted(contentHashes.items()):
+      storedFileName = NodeStorage().getStoredFileName(outputDir, contentHash)
+      if not os.path.exists(storedFileName) and storedFileName not in newFileNames:
+        newFileNames[storedFileName] = os.path.join(outputDir, fileName)
+        addedBytes += os.path.getsize(newFileNames[storedFileName])
+
+    report = {
+      "files": len(contentHashes),
+      "storedFiles": len(newFileNames),
+      "bytesReclaimed": removedBytes - addedBytes
+    }
+    if self.dryRun or not contentHashes:
+      return report
+
+    for storedFileName, source in newFileNames.items():
+      self.linkOrCopy(source, storedFileName)
+    self.replaceReferences(data, contentHashes)
+    journal = SessionJournal(snapshotFileName)
+    journal.save(data)
+    for fileName in contentHashes:
+      os.remove(os.path.join(outputDir, fileName))
+    logging.info("Migrated %d files of %s, reclaimed %d bytes" % (report["files"], outputDir, report["bytesReclaimed"]))
+    return report
+
+  @staticmethod
+  def getResultFileNames(data):
+    return set(fileName for result in data.get("results", []) for section in STORED_SECTIONS
+               for fileName in result.get(section, {}).values() if fileName and not isinstance(fileName, dict))
+
+  @staticmethod
+  def getOtherFileNames(data):
+    """ :return: all strings in results.json apart from the file names of the stored sections of results """
+    strings = set()
+
+    def collect(value):
+      if isinstance(value, dict):
+        for child in value.values():
+          collect(child)
+      elif isinstance(value, list):
+        for child in value:
+          collect(child)
+      elif value and not isinstance(value, (bool, int, float)):
+        strings.add(value)
+
+    collect({key: value for key, value in data.items() if key != "results"})
+    for result in data.get("results", []):
+      collect({key: value for key, value in result.items() if key not in STORED_SECTIONS})
+    return strings
+
+  @staticmethod
+  def computeContentHash(fileName):
+    """ :return: content hash of the volume in fileName or None if it cannot be loaded or stored """
+    if not os.path.exists(fileName):
+      logging.warning("Skipping missing file %s" % fileName)
+      return None
+    success, node = slicer.util.loadVolume(fileName, returnNode=True)
+    if not success or node is None:
+      logging.warning("Skipping %s which could not be loaded" % fileName)
+      return None
+    try:
+      return VolumeSnapshot.computeContentHash(node) if NodeStorage().canStore(node) else None
+    finally:
+      slicer.mrmlScene.RemoveNode(node)
+
+  @staticmethod
+  def linkOrCopy(source, destination):
+    if not os.path.exists(os.path.dirname(destination)):
+      os.makedirs(os.path.dirname(destination))
+    try:
+      os.link(source, destination)
+    except (AttributeError, OSError):
+      shutil.copyfile(source, destination)
+
+  @staticmethod
+  def replaceReferences(data, contentHashes):
+    for result in data.get("results", []):
+      for section in STORED_SECTIONS:
+        references = result.get(section, {})
+        for regType, fileName in references.items():
+          if not isinstance(fileName, dict) and fileName in contentHashes:
+            # slicer names loaded nodes after the file
+            references[regType] = {"hash": contentHashes[fileName], "name": os.path.splitext(fileName)[0]}
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Move the result volumes of SliceTracker cases into the content store")
+  parser.add_argument("directories", nargs="+", help="case directories or directories containing cases")
+  parser.add_argument("--dry-run", dest="dryRun", action="store_true", help="only report the reclaimable space")
+  args = parser.parse_args(argv)
+  report = ContentStoreMigration(args.dryRun).run(args.directories)
+  for outputDir, case in sorted(report["cases"].items()):
+    print("%s: %s" % (outputDir, case.get("error") or "%d files, %.1f MB reclaimed" %
+                                                   (case["files"], case["bytesReclaimed"] / (1024.0 * 1024.0))))
+  print("%s: %.1f MB in %d cases (%d files, %d stored)" %
+        ("Reclaimable" if args.dryRun else "Reclaimed", report["bytesReclaimed"] / (1024.0 * 1024.0),
+         len(report["cases"]), report["files"], report["storedFiles"]))
+  return report
@@ -0,0 +1,77 @@
+import logging
+from collections import OrderedDict
+
+import slicer
+
+
+class LoadedSeriesCache(object):
+  """ Memory bounded cache for loaded intraop series volumes.
+
+  Volumes are kept in least recently used order. Whenever the accumulated image data exceeds the memory budget, the
+  least recently used volumes are removed from the MRML scene unless isInUse(series, volume) reports that they are
+  still needed (e.g. referenced by a registration result). Evicted series are reloaded by the caller on next access.
+  """
+
+  def __init__(self, memoryBudget, isInUse=None):
+    """
+    :param memoryBudget: budget in megabytes, None or 0 for an unbounded cache
+    :param isInUse: callable(series, volume) returning True for volumes that must not be evicted
+    """
+    self.memoryBudget = memoryBudget
+    self.isInUse = isInUse if isInUse else lambda series, volume: False
+    self._volumes = OrderedDict()
+
+  def __contains__(self, series):
+    return series in self._volumes
+
+  def __len__(self):
+    return len(self._volumes)
+
+  def get(self, series):
+    volume = self._volumes.pop(series, None)
+    if volume is None:
+      return None
+    if not volume.GetScene():
+      logging.debug("Volume of series %s has been removed from the scene" % series)
+      return None
+    self._volumes[series] = volume
+    return volume
+
+  def add(self, series, volume):
+    self._volumes.pop(series, None)
+    self._volumes[series] = volume
+    self.evict()
+
+  def remove(self, series):
+    return self._volumes.pop(series, None)
+
+  def clear(self):
+    self._volumes.clear()
+
+  def values(self):
+    return list(self._volumes.values())
+
+  def getMemorySize(self):
+    return sum(self.getVolumeMemorySize(volume) for volume in self._volumes.values())
+
+  @staticmethod
+  def getVolumeMemorySize(volume):
+    """ :return: size of the volume's image data in megabytes """
+    imageData = volume.GetImageData() if volume.GetScene() else None
+    return imageData.GetActualMemorySize() / 1024.0 if imageData else 0
+
+  def evict(self):
+    if not self.memoryBudget:
+      return
+    memorySize = self.getMemorySize()
+    mostRecentSeries = next(reversed(self._volumes)) if len(self._volumes) else None
+    for series, volume in list(self._volumes.items()):
+      if memorySize <= self.memoryBudget:
+        break
+      if series == mostRecentSeries or self.isInUse(series, volume):
+        continue
+      memorySize -= self.getVolumeMemorySize(volume)
+      del self._volumes[series]
+      if volume.GetScene():
+        slicer.mrmlScene.RemoveNode(volume)
+      logging.debug("Evicted volume of series %s from the scene" % series)
@@ -1,68 +1,467 @@
 __author__ = 'Christian'
 
-import sys, getopt, os, dicom
+import sys, getopt, os
 import time
+import json
+import datetime
+import threading
+import subprocess
+from collections import OrderedDict
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+try:
+  from pydicom import dcmread as readDICOMFile
+except ImportError:
+  from dicom import read_file as readDICOMFile
+
+try:
+  from pynetdicom import AE, StoragePresentationContexts
+except ImportError:
+  AE = None
+
+try:
+  from watchdog.observers import Observer
+  from watchdog.events import FileSystemEventHandler
+except ImportError:
+  Observer = None
+  FileSystemEventHandler = object
+
 
 class NotDirectoryError(Exception):
   pass
 
+
+def listdirRecursive(rootDir):
+  files = []
+  for root, subFolders, dirFiles in os.walk(rootDir):
+    for f in dirFiles:
+      files.append(os.path.join(root, f))
+  return files
+
+
+class StatSignatureCache(object):
+  """ Remembers size and mtime of every file seen so far.
+
+  A file is reported once its signature differs from the last reported one and did not change since the previous
+  check, which means that files still being written are only reported after they are stable for one interval.
+  """
+
+  def __init__(self):
+    self._reported = {}
+    self._pending = {}
+
+  @staticmethod
+  def getSignature(fileName):
+    try:
+      stat = os.stat(fileName)
+    except OSError:
+      return None
+    return stat.st_size, stat.st_mtime
+
+  def getChangedFiles(self, candidates):
+    changedFiles = []
+    for fileName in set(candidates) | set(self._pending.keys()):
+      signature = self.getSignature(fileName)
+      if signature is None:
+        self._pending.pop(fileName, None)
+        self._reported.pop(fileName, None)
+        continue
+      if signature == self._reported.get(fileName):
+        self._pending.pop(fileName, None)
+        continue
+      if self._pending.get(fileName) == signature:
+        del self._pending[fileName]
+        self._reported[fileName] = signature
+        changedFiles.append(fileName)
+      else:
+        self._pending[fileName] = signature
+    return sorted(changedFiles)
+
+
+class PollingDirectoryMonitor(object):
+  """ Reports every file of the directory tree as candidate. Only listing and stat calls are involved. """
+
+  def __init__(self, directory):
+    self.directory = directory
+
+  def start(self):
+    pass
+
+  def stop(self):
+    pass
+
+  def getCandidates(self):
+    return listdirRecursive(self.directory)
+
+
+class WatchdogDirectoryMonitor(FileSystemEventHandler):
+  """ Reports files which have been created, modified or moved into the directory tree since the last call.
+
+  Relies on the watchdog package which uses inotify (Linux), FSEvents (macOS) or ReadDirectoryChangesW (Windows).
+  The first call reports all files that already existed when the monitor was started.
+  """
+
+  def __init__(self, directory):
+    super(WatchdogDirectoryMonitor, self).__init__()
+    self.directory = directory
+    self._observer = None
+    self._lock = threading.Lock()
+    self._candidates = set()
+
+  def start(self):
+    self._observer = Observer()
+    self._observer.schedule(self, self.directory, recursive=True)
+    self._observer.start()
+    with self._lock:
+      self._candidates.update(listdirRecursive(self.directory))
+
+  def stop(self):
+    if self._observer:
+      self._observer.stop()
+      self._observer.join()
+      self._observer = None
+
+  def getCandidates(self):
+    with self._lock:
+      candidates, self._candidates = self._candidates, set()
+    return candidates
+
+  def on_created(self, event):
+    self._addCandidate(event, event.src_path)
+
+  def on_modified(self, event):
+    self._addCandidate(event, event.src_path)
+
+  def on_moved(self, event):
+    self._addCandidate(event, event.dest_path)
+
+  def _addCandidate(self, event, path):
+    if event.is_directory:
+      return
+    with self._lock:
+      self._candidates.add(path)
+
+
+def createDirectoryMonitor(directory, polling=False):
+  if polling or Observer is None:
+    return PollingDirectoryMonitor(directory)
+  return WatchdogDirectoryMonitor(directory)
+
+
+def readDICOMHeader(fileName):
+  """ :return: dataset of the file without pixel data or None if it is not a DICOM file """
+  try:
+    return readDICOMFile(fileName, stop_before_pixels=True)
+  except Exception:
+    return None
+
+
+def groupFilesBySeries(fileNames, headers=None):
+  """ :param headers: dictionary file name -> dataset of files whose header has been read already
+  :return: lists of the files of each series
+  """
+  series = OrderedDict()
+  for fileName in fileNames:
+    dataset = headers.get(fileName) if headers else None
+    dataset = dataset if dataset is not None else readDICOMHeader(fileName)
+    series.setdefault(getattr(dataset, "SeriesInstanceUID", None), []).append(fileName)
+  return list(series.values())
+
+
+class StorageSCUSender(object):
+  """ In-process C-STORE client based on pynetdicom.
+
+  Keeps numberOfAssociations associations open to the destination and reuses them for all subsequent sends. Each call
+  of send distributes whole series over the associations, so that the files of one series go over one association.
+  """
+
+  AE_TITLE = "SLICETRACKER"
+
+  def __init__(self, host, port, numberOfAssociations=1, calledAETitle="ANY-SCP"):
+    self.host = host
+    self.port = int(port)
+    self.numberOfAssociations = max(1, int(numberOfAssociations))
+    self.calledAETitle = calledAETitle
+    self._series = queue.Queue()
+    self._failedFiles = []
+    self._lock = threading.Lock()
+    self._workers = []
+    for index in range(self.numberOfAssociations):
+      worker = threading.Thread(target=self._sendSeries, name="StorageSCU-%d" % index)
+      worker.daemon = True
+      worker.start()
+      self._workers.append(worker)
+
+  def send(self, fileNames, headers=None):
+    """ Sends all files and blocks until they have been transferred
+
+    :param headers: dictionary file name -> dataset of files whose header has been read already
+    :return: list of files that could not be sent
+    """
+    return self.sendSeries(groupFilesBySeries(fileNames, headers))
+
+  def sendSeries(self, seriesList):
+    """ Same as send for files which are grouped by series already
+
+    :param seriesList: lists of the files of each series
+    """
+    self._failedFiles = []
+    for seriesFiles in seriesList:
+      self._series.put(seriesFiles)
+    self._series.join()
+    return list(self._failedFiles)
+
+  def close(self):
+    for _ in self._workers:
+      self._series.put(None)
+    for worker in self._workers:
+      worker.join()
+    self._workers = []
+
+  def _createAssociation(self):
+    applicationEntity = AE(ae_title=self.AE_TITLE)
+    applicationEntity.requested_contexts = StoragePresentationContexts
+    association = applicationEntity.associate(self.host, self.port, ae_title=self.calledAETitle)
+    return association if association.is_established else None
+
+  def _sendSeries(self):
+    association = None
+    while True:
+      seriesFiles = self._series.get()
+      try:
+        if seriesFiles is None:
+          if association and association.is_established:
+            association.release()
+          return
+        for fileName in seriesFiles:
+          if not (association and association.is_established):
+            association = self._createAssociation()
+          if not (association and self._sendFile(association, fileName)):
+            with self._lock:
+              self._failedFiles.append(fileName)
+      finally:
+        self._series.task_done()
+
+  @staticmethod
+  def _sendFile(association, fileName):
+    try:
+      status = association.send_c_store(readDICOMFile(fileName))
+    except Exception as exc:
+      print("Failed to send %s: %s" % (fileName, exc))
+      return False
+    return bool(status) and status.Status == 0x0000
+
+
+class StorescuSender(object):
+  """ Fallback if pynetdicom is not available: one storescu process (and association) per series.
+
+  Up to numberOfAssociations storescu processes run in parallel.
+  """
+
+  def __init__(self, host, port, numberOfAssociations=1):
+    self.host = host
+    self.port = str(port)
+    self.numberOfAssociations = max(1, int(numberOfAssociations))
+
+  def send(self, fileNames, headers=None):
+    return self.sendSeries(groupFilesBySeries(fileNames, headers))
+
+  def sendSeries(self, seriesList):
+    failedFiles = []
+    pending = list(seriesList)
+    running = []
+    while pending or running:
+      while pending and len(running) < self.numberOfAssociations:
+        seriesFiles = pending.pop(0)
+        cmd = ['storescu', self.host, self.port] + seriesFiles
+        print(" ".join(cmd[:3]) + " <%d files>" % len(seriesFiles))
+        running.append((subprocess.Popen(cmd), seriesFiles))
+      process, seriesFiles = running.pop(0)
+      if process.wait() != 0:
+        failedFiles += seriesFiles
+    return failedFiles
+
+  def close(self):
+    pass
+
+
+def createSender(host, port, numberOfAssociations=1):
+  if AE is None:
+    return StorescuSender(host, port, numberOfAssociations)
+  return StorageSCUSender(host, port, numberOfAssociations)
+
+
 class DICOMDirectoryObserver(object):
 
-  def __init__(self, directory, host, port):
+  def __init__(self, directory, host, port, polling=False, numberOfAssociations=1):
     if not os.path.isdir(directory):
       raise NotDirectoryError("The directory is actually no directory")
     self.directory = directory
     self.host = host
     self.port = port
     self.files = set()
-
-  def listdirRecursive(self, rootDir):
-    files = []
-    for root, subFolders, dirFiles in os.walk(rootDir):
-      for f in dirFiles:
-        try:
-          fileName = os.path.join(root,f)
-          dicom.read_file(fileName)
-          files.append(fileName)
-        except:
-          pass
-    return files
+    self.monitor = createDirectoryMonitor(directory, polling)
+    self.signatures = StatSignatureCache()
+    self.sender = createSender(host, port, numberOfAssociations)
 
   def watch(self, secondsToWait=1):
-    while True:
-      currentFiles = self.listdirRecursive(self.directory)
-      if len(self.files) < len(currentFiles):
-        print("Number of files changed")
-        for newFile in self.getNewFiles(currentFiles):
-          self.storeSCU(newFile)
-      time.sleep(secondsToWait)
-
-  def getNewFiles(self, files):
-    newFiles = []
-    for currentFile in files:
-      if currentFile not in self.files:
-        newFiles.append(currentFile)
-    return newFiles
-
-  def storeSCU(self, fileName):
-    cmd = ('storescu ' + self.host + ' ' + self.port + ' ' + fileName)
-    print(cmd)
-    os.system(cmd)
-    self.files.add(fileName)
+    print("Watching with %s, sending with %s" % (self.monitor.__class__.__name__, self.sender.__class__.__name__))
+    self.monitor.start()
+    try:
+      while True:
+        newFiles = self.getNewFiles()
+        if len(newFiles):
+          print("Number of files changed")
+          self.storeSCU(list(newFiles.keys()), headers=newFiles)
+        time.sleep(secondsToWait)
+    finally:
+      self.monitor.stop()
+      self.sender.close()
+
+  def getNewFiles(self):
+    """ :return: ordered dictionary file name -> header of the changed DICOM files, each header is read once """
+    headers = ((f, readDICOMHeader(f)) for f in self.signatures.getChangedFiles(self.monitor.getCandidates()))
+    return OrderedDict((f, dataset) for f, dataset in headers if dataset is not None)
+
+  def storeSCU(self, fileNames, headers=None):
+    failedFiles = self.sender.send(fileNames, headers)
+    for fileName in failedFiles:
+      print("Failed to send %s" % fileName)
+    self.files.update(set(fileNames) - set(failedFiles))
+
+def parseDICOMDateTime(dicomDate, dicomTime):
+  """ :return: seconds since epoch (or since midnight if no date is given) or None if dicomTime is empty """
+  dicomTime = str(dicomTime or "").replace(":", "").strip()
+  if not dicomTime:
+    return None
+  hhmmss, _, fraction = dicomTime.partition(".")
+  hhmmss = hhmmss.ljust(6, "0")
+  seconds = int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6]) + float("0." + (fraction or "0"))
+  dicomDate = str(dicomDate or "").strip()
+  if dicomDate:
+    date = datetime.datetime.strptime(dicomDate[:8], "%Y%m%d")
+    seconds += (date - datetime.datetime(1970, 1, 1)).total_seconds()
+  return seconds
+
+
+class ReplaySeries(object):
+
+  def __init__(self, seriesInstanceUID):
+    self.seriesInstanceUID = seriesInstanceUID
+    self.seriesNumber = None
+    self.seriesDescription = ""
+    self.acquisitionTime = None
+    self.files = []
+
+  def addFile(self, fileName, dataset):
+    self.files.append(fileName)
+    if self.seriesNumber is None:
+      self.seriesNumber = getattr(dataset, "SeriesNumber", None)
+      self.seriesDescription = str(getattr(dataset, "SeriesDescription", ""))
+    seriesDate = getattr(dataset, "SeriesDate", None)
+    for dateAttribute, timeAttribute in [("AcquisitionDate", "AcquisitionTime"), ("ContentDate", "ContentTime")]:
+      acquisitionTime = parseDICOMDateTime(getattr(dataset, dateAttribute, None) or seriesDate,
+                                           getattr(dataset, timeAttribute, None))
+      if acquisitionTime is not None:
+        if self.acquisitionTime is None or acquisitionTime < self.acquisitionTime:
+          self.acquisitionTime = acquisitionTime
+        break
+
+
+class DICOMCaseReplayer(object):
+  """ Replays a recorded case directory into a DICOM receiver.
+
+  Series are sent in the order they were acquired while keeping the original spacing between series start times
+  (AcquisitionTime, or ContentTime if not available) divided by speed. A speed of 0 sends as fast as possible. For
+  each series the send latency (time from the scheduled start until the last file has been sent) is reported.
+  """
+
+  def __init__(self, directory, host, port, speed=1.0, numberOfAssociations=1):
+    if not os.path.isdir(directory):
+      raise NotDirectoryError("The directory is actually no directory")
+    self.directory = directory
+    self.speed = float(speed)
+    self.sender = createSender(host, port, numberOfAssociations)
+    self.report = []
+
+  def getSeries(self):
+    series = OrderedDict()
+    for fileName in sorted(listdirRecursive(self.directory)):
+      dataset = readDICOMHeader(fileName)
+      if dataset is None:
+        continue
+      uid = getattr(dataset, "SeriesInstanceUID", None)
+      series.setdefault(uid, ReplaySeries(uid)).addFile(fileName, dataset)
+    return sorted(series.values(), key=lambda s: (s.acquisitionTime is None, s.acquisitionTime, s.seriesNumber))
+
+  def replay(self):
+    series = self.getSeries()
+    timedSeries = [s.acquisitionTime for s in series if s.acquisitionTime is not None]
+    firstAcquisitionTime = min(timedSeries) if timedSeries else None
+    self.report = []
+    start = time.time()
+    try:
+      for currentSeries in series:
+        offset = 0
+        if self.speed > 0 and currentSeries.acquisitionTime is not None:
+          offset = (currentSeries.acquisitionTime - firstAcquisitionTime) / self.speed
+        delay = start + offset - time.time()
+        if delay > 0:
+          time.sleep(delay)
+        sendStart = time.time()
+        failedFiles = self.sender.sendSeries([currentSeries.files])
+        sendEnd = time.time()
+        self.report.append({
+          "seriesNumber": currentSeries.seriesNumber,
+          "seriesDescription": currentSeries.seriesDescription,
+          "numberOfFiles": len(currentSeries.files),
+          "failedFiles": len(failedFiles),
+          "scheduledOffset": offset,
+          "startDelay": sendStart - start - offset,
+          "sendDuration": sendEnd - sendStart,
+          "latency": sendEnd - start - offset,
+          "sendStartTime": sendStart,
+          "sendEndTime": sendEnd
+        })
+        self.printReportEntry(self.report[-1])
+    finally:
+      self.sender.close()
+    return self.report
+
+  @staticmethod
+  def printReportEntry(entry):
+    print("Series %s (%s): %d files, %d failed, scheduled at %.2fs, latency %.3fs (send %.3fs)" % (
+      entry["seriesNumber"], entry["seriesDescription"], entry["numberOfFiles"], entry["failedFiles"],
+      entry["scheduledOffset"], entry["latency"], entry["sendDuration"]))
+
 
 def main(argv):
    watchDirectory = ''
    host = 'localhost'
    port = '11112'
    interval = 1
+   polling = False
+   associations = 1
+   replay = False
+   speed = 1.0
+   reportFile = None
+   usage = 'watch.py -d <watchDirectory> -h <host> -p <port> -i <interval [in seconds]> ' \
+           '[-a <number of parallel associations>] [--polling]\n' \
+           'watch.py --replay -d <caseDirectory> -h <host> -p <port> [-s <speed multiplier, "max" for no delay>] ' \
+           '[-a <number of parallel associations>] [--report <report.json>]'
    try:
-      opts, args = getopt.getopt(argv,"i:d:h:p:?",["help","directory=","host=","port=","interval="])
+      opts, args = getopt.getopt(argv,"i:d:h:p:a:s:?",["help","directory=","host=","port=","interval=","associations=",
+                                                      "polling","replay","speed=","report="])
    except getopt.GetoptError:
-      print('watch.py -d <watchDirectory> -h <host> -p <port> -i <interval [in seconds]>')
+      print(usage)
       sys.exit(2)
    for opt, arg in opts:
       if opt in ("-?", "--help"):
-         print('watch.py -d <watchDirectory> -h <host> -p <port>')
+         print(usage)
          sys.exit()
       elif opt in ("-d", "--directory"):
          watchDirectory = arg
@@ -72,12 +471,29 @@ def main(argv):
          port = arg
       elif opt in ("-i", "--interval"):
          interval = int(arg)
-   if watchDirectory and host and port:
+      elif opt in ("-a", "--associations"):
+         associations = int(arg)
+      elif opt == "--polling":
+         polling = True
+      elif opt == "--replay":
+         replay = True
+      elif opt in ("-s", "--speed"):
+         speed = 0 if arg.lower() == "max" else float(arg.lower().rstrip("x"))
+      elif opt == "--report":
+         reportFile = arg
+   if replay and watchDirectory and host and port:
+     print('Replaying %s to %s:%s with speed %s' % (watchDirectory, host, port, speed or "max"))
+     report = DICOMCaseReplayer(watchDirectory, host, port, speed, associations).replay()
+     if reportFile:
+       with open(reportFile, 'w') as f:
+         json.dump(report, f, indent=2)
+   elif watchDirectory and host and port:
      print('Directory to watch is: ', watchDirectory)
      print('Host to send DICOM files to is: ', host)
      print('Port to send DICOM files to is: ', port)
 
-     watcher = DICOMDirectoryObserver(directory=watchDirectory, host=host, port=port)
+     watcher = DICOMDirectoryObserver(directory=watchDirectory, host=host, port=port, polling=polling,
+                                      numberOfAssociations=associations)
      print("Will watch!")
      watcher.watch(interval)
 
@@ -87,3 +503,4 @@ if __name__ == "__main__":
 
 #client use:  $ sudo storescp -v -p 104
 #python watch.py -d "/Users/Christian/Documents/TEST1" -h localhost -p 104 -i 1
+#python watch.py --replay -d "/Users/Christian/Documents/CASE1/DICOM/Intraop" -h localhost -p 104 -s 10
@@ -0,0 +1,56 @@
+import os, sys, json, time, platform, subprocess
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+
+def getPeakMemoryUsage():
+  """ :return: peak resident set size of the current process in MB or None if it cannot be determined """
+  if resource is None:
+    return None
+  maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return maxRSS / (1024.0 * 1024.0) if sys.platform == "darwin" else maxRSS / 1024.0
+
+
+def getCPUTime():
+  """ :return: user plus system CPU time of the current process in seconds """
+  if resource is None:
+    return time.clock() if hasattr(time, "clock") else time.process_time()
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return usage.ru_utime + usage.ru_stime
+
+
+def getRevision():
+  try:
+    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                   cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def writeResults(name, parameters, metrics, outputFile=None):
+  """ Writes benchmark results as JSON so that runs can be compared with each other
+
+  :param name: name of the benchmark, used for the default output file name
+  :param parameters: dict of parameters the benchmark was run with
+  :param metrics: dict of measured values
+  :param outputFile: path of the JSON file. Defaults to <name>-<timestamp>.json in the current working directory
+  :return: path of the written file
+  """
+  timestamp = time.strftime("%Y%m%d-%H%M%S")
+  outputFile = outputFile or os.path.join(os.getcwd(), "%s-%s.json" % (name, timestamp))
+  results = {
+    "benchmark": name,
+    "timestamp": timestamp,
+    "revision": getRevision(),
+    "platform": platform.platform(),
+    "python": platform.python_version(),
+    "parameters": parameters,
+    "metrics": metrics
+  }
+  with open(outputFile, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+  print("Results written to %s" % outputFile)
+  return outputFile
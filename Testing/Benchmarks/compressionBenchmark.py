@@ -0,0 +1,132 @@
+""" Benchmark for the compression policies of saved NRRD volumes
+
+Writes representative prostate volumes with every compression policy the way NodeStorage does (VolumeSnapshot) and
+reports write time, read time (loading the file back into Slicer) and size on disk per policy. Without --volumes a
+synthetic intraop T2 volume (256x256x26, short) and a prostate label map are generated:
+
+  Slicer --no-main-window --python-script Testing/Benchmarks/compressionBenchmark.py --threads 4
+  Slicer --no-main-window --python-script Testing/Benchmarks/compressionBenchmark.py --policies none gzip:1
+    parallel-gzip:1 --volumes <case output directory>/*-GUIDANCE*.nrrd
+"""
+
+import os, sys, time, shutil, inspect, tempfile, argparse
+
+import vtk
+import numpy
+import slicer
+from vtk.util import numpy_support
+
+sys.path.append(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))))
+
+from benchmarkUtils import writeResults
+
+from SliceTrackerUtils.storage import CompressionPolicy, VolumeSnapshot
+
+
+DEFAULT_POLICIES = ["none", "gzip:1", "gzip:6", "gzip:9", "parallel-gzip:1", "parallel-gzip:6"]
+
+
+def parsePolicy(policy, numberOfThreads):
+  codec, _, level = policy.partition(":")
+  return CompressionPolicy(codec, int(level) if level else CompressionPolicy.DEFAULT_LEVEL, numberOfThreads)
+
+
+def createVolumeNode(name, voxels, spacing, labelMap=False):
+  imageData = vtk.vtkImageData()
+  imageData.SetDimensions(voxels.shape[2], voxels.shape[1], voxels.shape[0])
+  imageData.AllocateScalars(vtk.VTK_SHORT, 1)
+  numpy_support.vtk_to_numpy(imageData.GetPointData().GetScalars())[:] = voxels.ravel()
+  node = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode" if labelMap else "vtkMRMLScalarVolumeNode")
+  node.SetName(name)
+  node.SetSpacing(spacing)
+  node.SetAndObserveImageData(imageData)
+  return node
+
+
+def createSyntheticProstateVolumes(matrixSize=256, numberOfSlices=26, spacing=(0.5, 0.5, 3.6)):
+  """ :return: T2 weighted like volume (smooth anatomy, coil falloff and noise) and a label map of the gland """
+  k, j, i = numpy.mgrid[0:numberOfSlices, 0:matrixSize, 0:matrixSize].astype(numpy.float32)
+  center = numpy.array([numberOfSlices / 2.0, matrixSize / 2.0, matrixSize / 2.0])
+  distance = numpy.sqrt(((k - center[0]) * spacing[2] / 20.0) ** 2 + ((j - center[1]) * spacing[1] / 22.0) ** 2 +
+                        ((i - center[2]) * spacing[0] / 25.0) ** 2)
+  body = numpy.sqrt(((j - center[1]) / (matrixSize * 0.35)) ** 2 + ((i - center[2]) / (matrixSize * 0.45)) ** 2) < 1
+  random = numpy.random.RandomState(0)
+  anatomy = 300 + 150 * numpy.sin(i / 7.0) * numpy.cos(j / 11.0) + 250 * (distance < 1)
+  volume = body * anatomy * numpy.exp(-distance / 4.0) + random.normal(0, 15, anatomy.shape)
+  label = (distance < 1).astype(numpy.int16)
+  return [createVolumeNode("T2", numpy.clip(volume, 0, 4095).astype(numpy.int16), spacing),
+          createVolumeNode("T2-label", label, spacing, labelMap=True)]
+
+
+class CompressionBenchmark(object):
+
+  def __init__(self, policies, numberOfThreads=4, repetitions=5):
+    self.policies = policies
+    self.numberOfThreads = numberOfThreads
+    self.repetitions = repetitions
+
+  @property
+  def parameters(self):
+    return {"policies": self.policies, "threads": self.numberOfThreads, "repetitions": self.repetitions}
+
+  def run(self, volumeFileNames=None):
+    if volumeFileNames:
+      nodes = [slicer.util.loadVolume(fileName, returnNode=True)[1] for fileName in volumeFileNames]
+    else:
+      nodes = createSyntheticProstateVolumes()
+    directory = tempfile.mkdtemp(prefix="SliceTrackerCompressionBenchmark")
+    try:
+      return {node.GetName(): self.runVolume(node, directory) for node in nodes}
+    finally:
+      shutil.rmtree(directory, ignore_errors=True)
+      for node in nodes:
+        slicer.mrmlScene.RemoveNode(node)
+
+  def runVolume(self, node, directory):
+    snapshot = VolumeSnapshot(node)
+    metrics = {"uncompressedSize": snapshot.array.nbytes, "unit": "milliseconds, bytes"}
+    for policy in self.policies:
+      snapshot.compression = parsePolicy(policy, self.numberOfThreads)
+      fileName = os.path.join(directory, "%s-%s.nrrd" % (node.GetName(), policy.replace(":", "")))
+      try:
+        metrics[policy] = {
+          "write": self.measure(lambda: snapshot.write(fileName)),
+          "read": self.measure(lambda: self.readVolume(fileName, node.IsA("vtkMRMLLabelMapVolumeNode"))),
+          "size": os.path.getsize(fileName)
+        }
+        metrics[policy]["ratio"] = float(metrics["uncompressedSize"]) / metrics[policy]["size"]
+      finally:
+        snapshot.compression.stop()
+    return metrics
+
+  def measure(self, method):
+    start = time.time()
+    for _ in range(self.repetitions):
+      method()
+    return (time.time() - start) / self.repetitions * 1000
+
+  @staticmethod
+  def readVolume(fileName, labelMap):
+    load = slicer.util.loadLabelVolume if labelMap else slicer.util.loadVolume
+    success, node = load(fileName, returnNode=True)
+    if not success:
+      raise RuntimeError("Failed to read %s" % fileName)
+    slicer.mrmlScene.RemoveNode(node)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Benchmark the compression policies for saved SliceTracker volumes")
+  parser.add_argument("--policies", nargs="+", default=DEFAULT_POLICIES,
+                      help="<codec>[:<level>] with codec one of %s" % ", ".join(CompressionPolicy.CODECS))
+  parser.add_argument("--threads", type=int, default=4, help="compression threads of parallel-gzip")
+  parser.add_argument("--repetitions", type=int, default=5, help="writes and reads per measurement")
+  parser.add_argument("--volumes", nargs="+", help="NRRD volumes to use instead of synthetic prostate volumes")
+  parser.add_argument("-o", "--output", help="JSON file to write the results to")
+  args = parser.parse_args(argv)
+  benchmark = CompressionBenchmark(args.policies, args.threads, args.repetitions)
+  writeResults("compressionBenchmark", benchmark.parameters, benchmark.run(args.volumes), args.output)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()
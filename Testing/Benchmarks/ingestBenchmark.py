@@ -0,0 +1,126 @@
+""" Intraop DICOM ingest throughput benchmark
+
+Generates synthetic series into the intraop folder of a temporary case and measures how long
+SliceTrackerSession.importDICOMSeries takes until every file is indexed and every series has been announced with
+NewImageSeriesReceivedEvent. Runs inside Slicer with a temporary DICOM database:
+
+  Slicer --no-main-window --python-script Testing/Benchmarks/ingestBenchmark.py --series 10 --slices 60 --matrix 256
+"""
+
+import os, sys, ast, time, shutil, inspect, tempfile, argparse
+
+import vtk
+import slicer
+from DICOMLib import DICOMUtils
+
+sys.path.append(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))))
+
+from benchmarkUtils import getPeakMemoryUsage, writeResults
+from syntheticDICOM import SyntheticSeriesGenerator
+
+from SliceTrackerUtils.configuration import SliceTrackerConfiguration
+from SliceTrackerUtils.constants import SliceTrackerConstants
+from SliceTrackerUtils.session import SliceTrackerSession
+
+
+def loadDefaultConfiguration():
+  configuration = os.path.join(os.path.dirname(inspect.getfile(SliceTrackerConfiguration)), "..", "Resources",
+                               "default.cfg")
+  SliceTrackerConfiguration(SliceTrackerConstants.MODULE_NAME, configuration)
+
+
+def createBenchmarkSession(caseDirectory):
+  """ Opens an empty case in caseDirectory without starting any DICOM receiver """
+  loadDefaultConfiguration()
+  session = SliceTrackerSession()
+  session.newCaseCreated = True
+  session.resetAndInitializeMembers()
+  session.directory = caseDirectory
+  for directory in [session.intraopDICOMDirectory, session.outputDirectory]:
+    session.createDirectory(directory)
+  session.newCaseCreated = False
+  return session
+
+
+class IngestBenchmark(object):
+
+  def __init__(self, numberOfSeries, slicesPerSeries, matrixSize, timeout=600):
+    self.numberOfSeries = numberOfSeries
+    self.slicesPerSeries = slicesPerSeries
+    self.matrixSize = matrixSize
+    self.timeout = timeout
+    self.seriesReceivedTimes = {}
+    self.startTime = None
+
+  @property
+  def parameters(self):
+    return {"numberOfSeries": self.numberOfSeries, "slicesPerSeries": self.slicesPerSeries,
+            "matrixSize": self.matrixSize}
+
+  def run(self):
+    caseDirectory = tempfile.mkdtemp(prefix="SliceTrackerIngestBenchmark")
+    try:
+      with DICOMUtils.TemporaryDICOMDatabase(os.path.join(caseDirectory, "database")):
+        return self._run(caseDirectory)
+    finally:
+      shutil.rmtree(caseDirectory, ignore_errors=True)
+
+  def _run(self, caseDirectory):
+    session = createBenchmarkSession(caseDirectory)
+    generator = SyntheticSeriesGenerator(session.intraopDICOMDirectory, self.numberOfSeries, self.slicesPerSeries,
+                                         self.matrixSize)
+    start = time.time()
+    generator.generate()
+    generationTime = time.time() - start
+
+    session.addEventObserver(session.NewImageSeriesReceivedEvent, self.onNewImageSeriesReceived)
+    memoryBefore = getPeakMemoryUsage()
+    self.startTime = time.time()
+    session.importDICOMSeries(session.getFileList(session.intraopDICOMDirectory))
+    indexingTime = None
+    while time.time() - self.startTime < self.timeout:
+      slicer.app.processEvents()
+      if indexingTime is None and not session.intraopDICOMIngestPipeline.busy:
+        indexingTime = time.time() - self.startTime
+      if len(self.seriesReceivedTimes) >= self.numberOfSeries:
+        break
+      time.sleep(0.001)
+    session.removeEventObserver(session.NewImageSeriesReceivedEvent, self.onNewImageSeriesReceived)
+    session.close(save=False)
+
+    timesToEvent = sorted(self.seriesReceivedTimes.values())
+    return {
+      "numberOfFiles": generator.numberOfFiles,
+      "generationTime": generationTime,
+      "indexingTime": indexingTime,
+      "filesPerSecond": generator.numberOfFiles / indexingTime if indexingTime else None,
+      "timeToFirstSeriesReceived": timesToEvent[0] if timesToEvent else None,
+      "timeToLastSeriesReceived": timesToEvent[-1] if timesToEvent else None,
+      "timeToSeriesReceived": self.seriesReceivedTimes,
+      "seriesMissing": self.numberOfSeries - len(self.seriesReceivedTimes),
+      "peakMemoryBefore": memoryBefore,
+      "peakMemory": getPeakMemoryUsage()
+    }
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onNewImageSeriesReceived(self, caller, event, callData):
+    now = time.time()
+    for series in ast.literal_eval(callData):
+      self.seriesReceivedTimes.setdefault(series, now - self.startTime)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Benchmark the SliceTracker intraop DICOM ingest")
+  parser.add_argument("--series", type=int, default=5, help="number of series")
+  parser.add_argument("--slices", type=int, default=30, help="slices per series")
+  parser.add_argument("--matrix", type=int, default=256, help="rows and columns of each slice")
+  parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for all series to be announced")
+  parser.add_argument("-o", "--output", help="JSON file to write the results to")
+  args = parser.parse_args(argv)
+  benchmark = IngestBenchmark(args.series, args.slices, args.matrix, args.timeout)
+  writeResults("ingestBenchmark", benchmark.parameters, benchmark.run(), args.output)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()
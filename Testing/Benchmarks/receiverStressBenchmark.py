@@ -0,0 +1,170 @@
+""" Stress harness for the intraop DICOM receiver
+
+Starts the intraop receiver of a temporary case on a local port and lets K sender processes (watch.py --replay, one
+association each) push synthetic series simultaneously. For every K it measures dropped files, the latency from the end
+of each series transmission to NewImageSeriesReceivedEvent and the CPU usage of the Slicer process:
+
+  Slicer --no-main-window --python-script Testing/Benchmarks/receiverStressBenchmark.py --senders 1 2 4 8
+"""
+
+import os, sys, ast, json, time, shutil, inspect, tempfile, argparse, subprocess
+
+import vtk
+import slicer
+from DICOMLib import DICOMUtils
+
+sys.path.append(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))))
+
+from benchmarkUtils import getCPUTime, getPeakMemoryUsage, writeResults
+from ingestBenchmark import createBenchmarkSession
+from syntheticDICOM import SyntheticSeriesGenerator
+
+from SliceTrackerUtils import watch
+from SliceTrackerUtils.sessionData import RegistrationResult
+
+
+def getPythonExecutable():
+  pythonSlicer = os.path.join(slicer.app.slicerHome, "bin", "PythonSlicer")
+  return pythonSlicer if os.path.exists(pythonSlicer) else sys.executable
+
+
+class ReceiverStressBenchmark(object):
+
+  def __init__(self, port, seriesPerSender, slicesPerSeries, matrixSize, settleTime=60, timeout=900):
+    self.port = port
+    self.seriesPerSender = seriesPerSender
+    self.slicesPerSeries = slicesPerSeries
+    self.matrixSize = matrixSize
+    self.settleTime = settleTime
+    self.timeout = timeout
+    self.seriesReceivedTimes = {}
+
+  @property
+  def parameters(self):
+    return {"port": self.port, "seriesPerSender": self.seriesPerSender, "slicesPerSeries": self.slicesPerSeries,
+            "matrixSize": self.matrixSize}
+
+  def run(self, numbersOfSenders):
+    return {str(k): self.runTrial(k) for k in numbersOfSenders}
+
+  def runTrial(self, numberOfSenders):
+    workingDirectory = tempfile.mkdtemp(prefix="SliceTrackerReceiverStress")
+    try:
+      with DICOMUtils.TemporaryDICOMDatabase(os.path.join(workingDirectory, "database")):
+        return self._runTrial(numberOfSenders, workingDirectory)
+    finally:
+      shutil.rmtree(workingDirectory, ignore_errors=True)
+
+  def _runTrial(self, numberOfSenders, workingDirectory):
+    session = createBenchmarkSession(os.path.join(workingDirectory, "case"))
+    senderDirectories = self.generateSenderData(numberOfSenders, workingDirectory)
+    numberOfSeries = numberOfSenders * self.seriesPerSender
+
+    previousPort = session.getSetting("Incoming_DICOM_Port")
+    session.setSetting("Incoming_DICOM_Port", self.port)
+    try:
+      session.startIntraopDICOMReceiver()
+    finally:
+      session.setSetting("Incoming_DICOM_Port", previousPort)
+    self.seriesReceivedTimes = {}
+    session.addEventObserver(session.NewImageSeriesReceivedEvent, self.onNewImageSeriesReceived)
+
+    cpuStart, wallStart = getCPUTime(), time.time()
+    senders = [self.startSender(directory) for directory in senderDirectories]
+    while any(process.poll() is None for process, reportFile in senders) and time.time() - wallStart < self.timeout:
+      slicer.app.processEvents()
+      time.sleep(0.005)
+    sendingFinished = time.time()
+    while len(self.seriesReceivedTimes) < numberOfSeries and time.time() - sendingFinished < self.settleTime:
+      slicer.app.processEvents()
+      time.sleep(0.005)
+    session.waitForDICOMImport()
+    cpuTime, wallTime = getCPUTime() - cpuStart, time.time() - wallStart
+
+    reports = [entry for process, reportFile in senders for entry in self.readReport(process, reportFile)]
+    metrics = self.evaluate(session, reports, numberOfSeries)
+    metrics.update({
+      "numberOfSenders": numberOfSenders,
+      "wallTime": wallTime,
+      "cpuTime": cpuTime,
+      "cpuUsage": cpuTime / wallTime if wallTime else None,
+      "peakMemory": getPeakMemoryUsage()
+    })
+    session.removeEventObserver(session.NewImageSeriesReceivedEvent, self.onNewImageSeriesReceived)
+    session.close(save=False)
+    return metrics
+
+  def generateSenderData(self, numberOfSenders, workingDirectory):
+    directories = []
+    for index in range(numberOfSenders):
+      directory = os.path.join(workingDirectory, "sender%d" % index)
+      SyntheticSeriesGenerator(directory, self.seriesPerSender, self.slicesPerSeries, self.matrixSize,
+                               firstSeriesNumber=index * self.seriesPerSender + 1).generate()
+      directories.append(directory)
+    return directories
+
+  def startSender(self, directory):
+    reportFile = directory + "-report.json"
+    script = os.path.splitext(inspect.getfile(watch))[0] + ".py"
+    cmd = [getPythonExecutable(), script, "--replay", "-d", directory, "-h", "localhost", "-p", str(self.port),
+           "-s", "max", "--report", reportFile]
+    return subprocess.Popen(cmd), reportFile
+
+  @staticmethod
+  def readReport(process, reportFile):
+    if process.poll() is None:
+      process.kill()
+    if not os.path.exists(reportFile):
+      return []
+    with open(reportFile) as f:
+      return json.load(f)
+
+  def evaluate(self, session, reports, numberOfSeries):
+    receivedTimes = {RegistrationResult.getSeriesNumberFromString(series): receivedTime
+                     for series, receivedTime in self.seriesReceivedTimes.items()}
+    latencies = []
+    sentFiles = failedFiles = droppedFiles = 0
+    for entry in reports:
+      sent = entry["numberOfFiles"] - entry["failedFiles"]
+      sentFiles += sent
+      failedFiles += entry["failedFiles"]
+      droppedFiles += max(0, sent - len(session.intraopDICOMIndex.getFilesForSeries(entry["seriesNumber"])))
+      if entry["seriesNumber"] in receivedTimes:
+        latencies.append(receivedTimes[entry["seriesNumber"]] - entry["sendEndTime"])
+    latencies = sorted(latencies)
+    return {
+      "numberOfSeries": numberOfSeries,
+      "seriesReceived": len(receivedTimes),
+      "sentFiles": sentFiles,
+      "failedFiles": failedFiles,
+      "droppedFiles": droppedFiles,
+      "latencyMin": latencies[0] if latencies else None,
+      "latencyMedian": latencies[len(latencies) // 2] if latencies else None,
+      "latencyMax": latencies[-1] if latencies else None
+    }
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onNewImageSeriesReceived(self, caller, event, callData):
+    now = time.time()
+    for series in ast.literal_eval(callData):
+      self.seriesReceivedTimes.setdefault(series, now)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Stress the SliceTracker intraop DICOM receiver with concurrent senders")
+  parser.add_argument("--senders", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of concurrent senders")
+  parser.add_argument("--port", type=int, default=11113, help="local port for the intraop receiver")
+  parser.add_argument("--series", type=int, default=3, help="series per sender")
+  parser.add_argument("--slices", type=int, default=30, help="slices per series")
+  parser.add_argument("--matrix", type=int, default=256, help="rows and columns of each slice")
+  parser.add_argument("--settle-time", type=float, default=60,
+                      help="seconds to wait for series announcements after all senders finished")
+  parser.add_argument("-o", "--output", help="JSON file to write the results to")
+  args = parser.parse_args(argv)
+  benchmark = ReceiverStressBenchmark(args.port, args.series, args.slices, args.matrix, args.settle_time)
+  writeResults("receiverStressBenchmark", benchmark.parameters, benchmark.run(args.senders), args.output)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()
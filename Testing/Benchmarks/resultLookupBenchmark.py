@@ -0,0 +1,73 @@
+""" Micro-benchmark for the registration result lookups of SessionData
+
+Fills SessionData with a growing number of results (every second one approved) and measures the time per call of the
+"most recent approved" and registrationResultWas* queries. With the incrementally maintained indices the time per
+query stays flat while the number of results grows:
+
+  Slicer --no-main-window --python-script Testing/Benchmarks/resultLookupBenchmark.py --results 10 100 500 1000
+"""
+
+import os, sys, inspect, timeit, argparse
+
+import slicer
+
+sys.path.append(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))))
+
+from benchmarkUtils import writeResults
+from ingestBenchmark import loadDefaultConfiguration
+
+from SliceTrackerUtils.sessionData import SessionData, RegistrationStatus
+
+
+class ResultLookupBenchmark(object):
+
+  def __init__(self, repetitions=10000):
+    self.repetitions = repetitions
+
+  @property
+  def parameters(self):
+    return {"repetitions": self.repetitions}
+
+  def run(self, numbersOfResults):
+    loadDefaultConfiguration()
+    return {str(n): self.runTrial(n) for n in numbersOfResults}
+
+  def runTrial(self, numberOfResults):
+    data = SessionData()
+    self.createResults(data, numberOfResults)
+    lastSeries = "%d: GUIDANCE" % (numberOfResults + 1)
+    queries = {
+      "getMostRecentApprovedCoverProstateRegistration": data.getMostRecentApprovedCoverProstateRegistration,
+      "getMostRecentApprovedTransform": data.getMostRecentApprovedTransform,
+      "getMostRecentApprovedResult": data.getMostRecentApprovedResult,
+      "getMostRecentApprovedResultPriorTo": lambda: data.getMostRecentApprovedResult(numberOfResults // 2),
+      "registrationResultWasApproved": lambda: data.registrationResultWasApproved(lastSeries),
+      "registrationResultWasSkipped": lambda: data.registrationResultWasSkipped(lastSeries)
+    }
+    metrics = {name: timeit.timeit(query, number=self.repetitions) / self.repetitions * 1e6
+               for name, query in queries.items()}
+    metrics["unit"] = "microseconds per call"
+    return metrics
+
+  @staticmethod
+  def createResults(data, numberOfResults):
+    result = data.createResult("1: COVER PROSTATE", invokeEvent=False)
+    result.status = RegistrationStatus.APPROVED_STATUS
+    for seriesNumber in range(2, numberOfResults + 2):
+      result = data.createResult("%d: GUIDANCE" % seriesNumber, invokeEvent=False)
+      result.status = RegistrationStatus.APPROVED_STATUS if seriesNumber % 2 else RegistrationStatus.SKIPPED_STATUS
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Benchmark the SliceTracker registration result lookups")
+  parser.add_argument("--results", type=int, nargs="+", default=[10, 100, 500, 1000], help="numbers of results")
+  parser.add_argument("--repetitions", type=int, default=10000, help="calls per query")
+  parser.add_argument("-o", "--output", help="JSON file to write the results to")
+  args = parser.parse_args(argv)
+  benchmark = ResultLookupBenchmark(args.repetitions)
+  writeResults("resultLookupBenchmark", benchmark.parameters, benchmark.run(args.results), args.output)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()
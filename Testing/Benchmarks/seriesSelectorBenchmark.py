@@ -0,0 +1,120 @@
+""" Benchmark for refreshing the intraop series selector model
+
+Registers a growing number of series (with approved, skipped and rejected results) in a temporary case and measures
+the time for a full rebuild of the selector model, as done before it was updated in place, next to the in place
+updates of IntraopSeriesSelectorModel for a new series, a single status change and a full recolor. No widget is
+created, so it runs headless:
+
+  Slicer --no-main-window --python-script Testing/Benchmarks/seriesSelectorBenchmark.py --series 50 100 200 400
+"""
+
+import os, sys, time, shutil, inspect, tempfile, argparse
+
+import qt
+import slicer
+
+sys.path.append(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))))
+
+from benchmarkUtils import writeResults
+from ingestBenchmark import createBenchmarkSession
+
+from SliceTrackerUtils.sessionData import RegistrationStatus
+from SliceTrackerUtils.seriesSelectorModel import IntraopSeriesSelectorModel
+
+
+STATUSES = [RegistrationStatus.APPROVED_STATUS, RegistrationStatus.SKIPPED_STATUS, RegistrationStatus.REJECTED_STATUS,
+            None]
+
+
+class SeriesSelectorBenchmark(object):
+
+  def __init__(self, repetitions=20):
+    self.repetitions = repetitions
+
+  @property
+  def parameters(self):
+    return {"repetitions": self.repetitions}
+
+  def run(self, numbersOfSeries):
+    caseDirectory = tempfile.mkdtemp(prefix="SliceTrackerSelectorBenchmark")
+    try:
+      session = createBenchmarkSession(caseDirectory)
+      try:
+        return {str(n): self.runTrial(session, n) for n in numbersOfSeries}
+      finally:
+        session.close(save=False)
+    finally:
+      shutil.rmtree(caseDirectory, ignore_errors=True)
+
+  def runTrial(self, session, numberOfSeries):
+    session.seriesRegistry.clear()
+    session.data.initializeRegistrationResults()
+    for seriesNumber in range(1, numberOfSeries + 1):
+      self.addSeries(session, seriesNumber)
+
+    model = IntraopSeriesSelectorModel()
+    metrics = {"initialUpdate": self.measure(lambda: model.update(), 1)}
+    metrics["fullRebuild"] = self.measure(lambda: self.rebuildModel(session, qt.QStandardItemModel(), model))
+
+    nextSeriesNumber = [numberOfSeries + 1]
+
+    def appendSeries():
+      self.addSeries(session, nextSeriesNumber[0])
+      nextSeriesNumber[0] += 1
+      model.update()
+    metrics["newSeries"] = self.measure(appendSeries)
+
+    lastSeries = session.seriesList[-1]
+
+    def changeStatus():
+      session.data.getResult(lastSeries).status = RegistrationStatus.SKIPPED_STATUS \
+        if session.data.registrationResultWasApproved(lastSeries) else RegistrationStatus.APPROVED_STATUS
+      model.invalidate([lastSeries])
+      model.update()
+    metrics["statusChange"] = self.measure(changeStatus)
+
+    def recolorAll():
+      model.invalidate()
+      model.update()
+    metrics["invalidateAll"] = self.measure(recolorAll)
+    metrics["unit"] = "milliseconds per update"
+    return metrics
+
+  def measure(self, method, repetitions=None):
+    repetitions = repetitions or self.repetitions
+    start = time.time()
+    for _ in range(repetitions):
+      method()
+    return (time.time() - start) / repetitions * 1000
+
+  @staticmethod
+  def addSeries(session, seriesNumber):
+    series = "%d: GUIDANCE" % seriesNumber
+    session.seriesRegistry.add(series)
+    status = STATUSES[seriesNumber % len(STATUSES)]
+    if status:
+      session.data.createResult(series, invokeEvent=False).status = status
+
+  @staticmethod
+  def rebuildModel(session, model, colors):
+    """ Refresh of the selector model before it was updated in place: clear and recolor every series """
+    model.clear()
+    for series in session.seriesList:
+      item = qt.QStandardItem(series)
+      model.appendRow(item)
+      model.setData(item.index(), colors.getSeriesColor(series), qt.Qt.BackgroundRole)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Benchmark updates of the SliceTracker intraop series selector model")
+  parser.add_argument("--series", type=int, nargs="+", default=[50, 100, 200, 400], help="numbers of series")
+  parser.add_argument("--repetitions", type=int, default=20, help="updates per measurement")
+  parser.add_argument("-o", "--output", help="JSON file to write the results to")
+  args = parser.parse_args(argv)
+  benchmark = SeriesSelectorBenchmark(args.repetitions)
+  writeResults("seriesSelectorBenchmark", benchmark.parameters, benchmark.run(args.series), args.output)
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()
@@ -0,0 +1,132 @@
+""" Generator for synthetic intraop MR series
+
+Writes series with the descriptions SliceTracker expects (COVER TEMPLATE, COVER PROSTATE, GUIDANCE) into a directory,
+e.g. the DICOM/Intraop folder of a case:
+
+  python syntheticDICOM.py -d <case>/DICOM/Intraop --series 10 --slices 60 --matrix 256
+"""
+
+import os, sys, uuid, time, argparse
+
+try:
+  from pydicom.dataset import Dataset, FileDataset
+except ImportError:
+  from dicom.dataset import Dataset, FileDataset
+
+
+MR_IMAGE_STORAGE = "1.2.840.10008.5.1.4.1.1.4"
+EXPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2.1"
+
+
+def generateUID():
+  return "2.25.%d" % uuid.uuid4().int
+
+
+class SyntheticSeriesGenerator(object):
+
+  SERIES_DESCRIPTIONS = ["COVER TEMPLATE", "COVER PROSTATE"]
+  DEFAULT_SERIES_DESCRIPTION = "GUIDANCE"
+
+  def __init__(self, directory, numberOfSeries=5, slicesPerSeries=30, matrixSize=256, patientID="SLICETRACKER_BM",
+               patientName="Benchmark^Synthetic", firstSeriesNumber=1):
+    self.directory = directory
+    self.numberOfSeries = numberOfSeries
+    self.slicesPerSeries = slicesPerSeries
+    self.matrixSize = matrixSize
+    self.patientID = patientID
+    self.patientName = patientName
+    self.firstSeriesNumber = firstSeriesNumber
+    self.studyInstanceUID = generateUID()
+    self.frameOfReferenceUID = generateUID()
+    self._pixelData = (b"\x00\x01" * (matrixSize * matrixSize))
+
+  @property
+  def numberOfFiles(self):
+    return self.numberOfSeries * self.slicesPerSeries
+
+  def getSeriesDescription(self, index):
+    return self.SERIES_DESCRIPTIONS[index] if index < len(self.SERIES_DESCRIPTIONS) else self.DEFAULT_SERIES_DESCRIPTION
+
+  def generate(self):
+    """ :return: list of (seriesNumber, [file paths]) in generation order """
+    return [self.generateSeries(self.firstSeriesNumber + index, self.getSeriesDescription(index))
+            for index in range(self.numberOfSeries)]
+
+  def generateSeries(self, seriesNumber, seriesDescription):
+    if not os.path.exists(self.directory):
+      os.makedirs(self.directory)
+    seriesInstanceUID = generateUID()
+    acquisitionTime = time.strftime("%H%M%S")
+    files = []
+    for instanceNumber in range(1, self.slicesPerSeries + 1):
+      fileName = os.path.join(self.directory, "%d-%d.dcm" % (seriesNumber, instanceNumber))
+      dataset = self.createDataset(fileName, seriesNumber, seriesDescription, seriesInstanceUID, instanceNumber,
+                                   acquisitionTime)
+      dataset.save_as(fileName)
+      files.append(fileName)
+    return seriesNumber, files
+
+  def createDataset(self, fileName, seriesNumber, seriesDescription, seriesInstanceUID, instanceNumber,
+                    acquisitionTime):
+    sopInstanceUID = generateUID()
+    fileMeta = Dataset()
+    fileMeta.MediaStorageSOPClassUID = MR_IMAGE_STORAGE
+    fileMeta.MediaStorageSOPInstanceUID = sopInstanceUID
+    fileMeta.TransferSyntaxUID = EXPLICIT_VR_LITTLE_ENDIAN
+
+    dataset = FileDataset(fileName, {}, file_meta=fileMeta, preamble=b"\0" * 128)
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+
+    dataset.SOPClassUID = MR_IMAGE_STORAGE
+    dataset.SOPInstanceUID = sopInstanceUID
+    dataset.StudyInstanceUID = self.studyInstanceUID
+    dataset.SeriesInstanceUID = seriesInstanceUID
+    dataset.FrameOfReferenceUID = self.frameOfReferenceUID
+    dataset.Modality = "MR"
+    dataset.PatientID = self.patientID
+    dataset.PatientName = self.patientName
+    dataset.PatientBirthDate = "19700101"
+    dataset.StudyDate = time.strftime("%Y%m%d")
+    dataset.StudyTime = acquisitionTime
+    dataset.AcquisitionTime = acquisitionTime
+    dataset.ContentTime = acquisitionTime
+    dataset.SeriesNumber = seriesNumber
+    dataset.SeriesDescription = seriesDescription
+    dataset.InstanceNumber = instanceNumber
+    dataset.ImagesInAcquisition = self.slicesPerSeries
+
+    dataset.ImagePositionPatient = [0.0, 0.0, 3.0 * instanceNumber]
+    dataset.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+    dataset.PixelSpacing = [0.5, 0.5]
+    dataset.SliceThickness = 3.0
+
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.Rows = self.matrixSize
+    dataset.Columns = self.matrixSize
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 0
+    dataset.PixelData = self._pixelData
+    return dataset
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Write synthetic intraop MR series")
+  parser.add_argument("-d", "--directory", required=True, help="destination directory")
+  parser.add_argument("--series", type=int, default=5, help="number of series")
+  parser.add_argument("--slices", type=int, default=30, help="slices per series")
+  parser.add_argument("--matrix", type=int, default=256, help="rows and columns of each slice")
+  parser.add_argument("--first-series-number", type=int, default=1)
+  args = parser.parse_args(argv)
+  generator = SyntheticSeriesGenerator(args.directory, args.series, args.slices, args.matrix,
+                                       firstSeriesNumber=args.first_series_number)
+  start = time.time()
+  generator.generate()
+  print("Wrote %d files in %.2f s" % (generator.numberOfFiles, time.time() - start))
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
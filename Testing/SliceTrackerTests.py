@@ -1,9 +1,32 @@
 import unittest
-import os, inspect, slicer
+import ast
+import io
+import json
+import zlib
+import numpy
+import os, sys, time, inspect, shutil, tempfile, slicer, vtk, qt
 from SliceTrackerUtils.session import SliceTrackerSession
-from SliceTrackerUtils.sessionData import SessionData
+from SliceTrackerUtils.sessionData import SessionData, RegistrationStatus, ApprovedResultsIndex
+from SliceTrackerUtils.volumeCache import LoadedSeriesCache
+from SliceTrackerUtils.storage import NodeStorage, VolumeSnapshot, FiducialsSnapshot, CompressionPolicy, AsyncNodeWriter
+from SliceTrackerUtils.journal import SessionJournal
+from SliceTrackerUtils.dicomIndex import IntraopDICOMIndex, DICOMHeaderRecord, SeriesCompletenessDetector
+from SliceTrackerUtils.seriesRegistry import SeriesRegistry
+from SliceTrackerUtils.seriesSelectorModel import IntraopSeriesSelectorModel
+from SliceTrackerUtils import watch, storeMigration
+from SliceTrackerUtils.helpers import SeriesTypeManager
+from SliceTrackerUtils.constants import SliceTrackerConstants
+from SliceTrackerUtils.configuration import SliceTrackerConfiguration
+from SlicerDevelopmentToolboxUtils.constants import COLOR
 
-__all__ = ['SliceTrackerSessionTests', 'RegistrationResultsTest']
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))), "Benchmarks"))
+from syntheticDICOM import SyntheticSeriesGenerator
+
+__all__ = ['SliceTrackerSessionTests', 'RegistrationResultsTest', 'ApprovedResultsIndexTest', 'ResultStatusLookupTest',
+           'LoadedSeriesCacheTest', 'IntraopDICOMIndexTest', 'SeriesCompletenessDetectorTest', 'SeriesRegistryTest',
+           'SeriesTypeManagerTest', 'IntraopSeriesSelectorModelTest', 'SkipSeriesTest', 'NodeStorageTest',
+           'AsyncNodeWriterTest', 'FiducialsSnapshotTest', 'CompressionPolicyTest', 'SessionJournalTest',
+           'ContentStoreTest', 'DICOMSenderLoopbackTest']
 
 tempDir =  os.path.join(slicer.app.temporaryPath, "SliceTrackerResults")
 
@@ -40,6 +63,7 @@ class RegistrationResultsTest(unittest.TestCase):
 
   def runTest(self):
     self.test_Reading_json()
+    self.test_Loading_result_data_on_first_access()
     self.test_Writing_json()
 
   def test_Reading_json(self):
@@ -47,7 +71,855 @@ class RegistrationResultsTest(unittest.TestCase):
     inputFileName = os.path.join(directory, "output_example.json")
     self.registrationResults.load(inputFileName)
 
+  def test_Loading_result_data_on_first_access(self):
+    results = {result.seriesNumber: result for result in self.registrationResults.getResultsAsList()}
+    self.assertTrue(results[3].dataLoaded and results[10].dataLoaded)
+    self.assertFalse(any(results[seriesNumber].dataLoaded for seriesNumber in [5, 6, 9]))
+    self.assertEqual([results[5]], self.registrationResults.getResultsToPrefetch(1))
+    results[5].targets
+    self.assertTrue(results[5].dataLoaded)
+
   def test_Writing_json(self):
     self.registrationResults.resumed = True
     self.registrationResults.completed = True
-    self.registrationResults.save(tempDir)
\ No newline at end of file
+    self.registrationResults.save(tempDir)
+
+
+class ApprovedResultsIndexTest(unittest.TestCase):
+
+  def runTest(self):
+    self.test_KeepsResultsOrderedByKey()
+    self.test_RemovesAndReplacesResults()
+
+  def test_KeepsResultsOrderedByKey(self):
+    index = ApprovedResultsIndex()
+    self.assertIsNone(index.first())
+    self.assertIsNone(index.last())
+    for key in [(7, 4), (3, 0), (7, 2), (5, 1)]:
+      index.update(key, "%d-%d" % key)
+    self.assertEqual(4, len(index))
+    self.assertEqual("3-0", index.first())
+    self.assertEqual("7-4", index.last())
+    self.assertEqual("5-1", index.last(priorTo=(7,)))
+    self.assertEqual("7-2", index.last(priorTo=(7, 3)))
+    self.assertIsNone(index.last(priorTo=(3,)))
+
+  def test_RemovesAndReplacesResults(self):
+    index = ApprovedResultsIndex()
+    index.update((3, 0), "3-0")
+    index.update((5, 1), "5-1")
+    index.update((5, 1), None)
+    index.update((2, 2), None)
+    self.assertEqual(1, len(index))
+    self.assertEqual("3-0", index.last())
+    index.update((3, 0), "3-0 retry")
+    self.assertEqual(1, len(index))
+    self.assertEqual("3-0 retry", index.first())
+
+
+class ResultStatusLookupTest(unittest.TestCase):
+
+  SERIES = ["2: COVER PROSTATE", "3: COVER PROSTATE", "5: GUIDANCE", "6: GUIDANCE", "6: GUIDANCE RETRY",
+            "8: GUIDANCE", "9: GUIDANCE"]
+
+  def runTest(self):
+    self.test_Lookups_match_linear_scan_after_status_changes()
+
+  def test_Lookups_match_linear_scan_after_status_changes(self):
+    data = SessionData()
+    results = [data.createResult(series, invokeEvent=False) for series in self.SERIES]
+    self.assertLookupsMatchLinearScan(data, results)
+    data.changeResultsStatus(results[:4], RegistrationStatus.APPROVED_STATUS, invokeEvent=False)
+    self.assertLookupsMatchLinearScan(data, results)
+    results[3].reject()
+    results[4].skip()
+    results[5].skip()
+    self.assertLookupsMatchLinearScan(data, results)
+    results[0].skip()
+    results[4].status = RegistrationStatus.APPROVED_STATUS
+    results[6].reject()
+    self.assertLookupsMatchLinearScan(data, results)
+
+  def assertLookupsMatchLinearScan(self, data, results):
+    for seriesNumber in range(1, 11):
+      statuses = [r.status for r in results if r.seriesNumber == seriesNumber]
+      self.assertEqual(RegistrationStatus.APPROVED_STATUS in statuses, data.registrationResultWasApproved(seriesNumber))
+      for status, method in [(RegistrationStatus.SKIPPED_STATUS, data.registrationResultWasSkipped),
+                             (RegistrationStatus.REJECTED_STATUS, data.registrationResultWasRejected)]:
+        self.assertEqual(len(statuses) > 0 and all(s == status for s in statuses), method(seriesNumber))
+      approved = [r for r in results if r.approved and r.seriesNumber < seriesNumber]
+      self.assertIs(approved[-1] if approved else None, data.getMostRecentApprovedResult(seriesNumber))
+    approved = [r for r in results if r.approved]
+    self.assertIs(approved[-1] if approved else None, data.getMostRecentApprovedResult())
+    approvedCoverProstate = [r for r in approved if "COVER PROSTATE" in r.name]
+    self.assertIs(approvedCoverProstate[0] if approvedCoverProstate else None,
+                  data.getMostRecentApprovedCoverProstateRegistration())
+
+
+class LoadedSeriesCacheTest(unittest.TestCase):
+
+  def runTest(self):
+    self.test_EvictsLeastRecentlyUsed()
+    self.test_KeepsVolumesInUse()
+
+  @staticmethod
+  def createVolume(name):
+    imageData = vtk.vtkImageData()
+    imageData.SetDimensions(256, 256, 16)
+    imageData.AllocateScalars(vtk.VTK_SHORT, 1)
+    volume = slicer.vtkMRMLScalarVolumeNode()
+    volume.SetName(name)
+    volume.SetAndObserveImageData(imageData)
+    slicer.mrmlScene.AddNode(volume)
+    return volume
+
+  def test_EvictsLeastRecentlyUsed(self):
+    cache = LoadedSeriesCache(memoryBudget=4.5)
+    volumes = [self.createVolume("%d: GUIDANCE" % i) for i in range(3)]
+    cache.add("1: GUIDANCE", volumes[0])
+    cache.add("2: GUIDANCE", volumes[1])
+    cache.get("1: GUIDANCE")
+    cache.add("3: GUIDANCE", volumes[2])
+    self.assertFalse("2: GUIDANCE" in cache)
+    self.assertIsNone(volumes[1].GetScene())
+    self.assertTrue("1: GUIDANCE" in cache and "3: GUIDANCE" in cache)
+    cache.clear()
+
+  def test_KeepsVolumesInUse(self):
+    cache = LoadedSeriesCache(memoryBudget=1, isInUse=lambda series, volume: series == "1: GUIDANCE")
+    cache.add("1: GUIDANCE", self.createVolume("1: GUIDANCE"))
+    cache.add("2: GUIDANCE", self.createVolume("2: GUIDANCE"))
+    cache.add("3: GUIDANCE", self.createVolume("3: GUIDANCE"))
+    self.assertEqual(["1: GUIDANCE", "3: GUIDANCE"], sorted(s for s in ["1: GUIDANCE", "2: GUIDANCE", "3: GUIDANCE"]
+                                                            if s in cache))
+    cache.clear()
+
+
+class IntraopDICOMIndexTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp(prefix="SliceTrackerIndexTest")
+    self.indexFile = os.path.join(self.directory, "index", "dicomIndex.json")
+    self.series = SyntheticSeriesGenerator(self.directory, numberOfSeries=2, slicesPerSeries=3,
+                                           matrixSize=8).generate()
+    self.fileNames = [os.path.basename(f) for _, seriesFiles in self.series for f in seriesFiles]
+
+  def tearDown(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def runTest(self):
+    self.test_IndexesEveryFileOnce()
+    self.test_RestoresRecordsFromIndexFile()
+    self.test_ReindexesChangedFiles()
+    self.test_SynchronizesWithDirectory()
+
+  def test_IndexesEveryFileOnce(self):
+    index = IntraopDICOMIndex(self.directory, self.indexFile)
+    self.assertEqual(sorted(self.fileNames), sorted(index.update(self.fileNames)))
+    self.assertEqual([], index.update(self.fileNames))
+    self.assertEqual([1, 2], index.getSeriesNumbers())
+    self.assertEqual(self.series[1][1], index.getFilesForSeries(2))
+    self.assertEqual("COVER PROSTATE", index.getRecord("2-1.dcm").seriesDescription)
+
+  def test_RestoresRecordsFromIndexFile(self):
+    index = IntraopDICOMIndex(self.directory, self.indexFile)
+    index.update(self.fileNames)
+    index.save()
+    restored = IntraopDICOMIndex(self.directory, self.indexFile)
+    self.assertEqual([], restored.update(self.fileNames))
+    self.assertEqual(index.getFilesForSeries(1), restored.getFilesForSeries(1))
+    self.assertEqual(3, restored.getRecord("1-3.dcm").instanceNumber)
+
+  def test_ReindexesChangedFiles(self):
+    index = IntraopDICOMIndex(self.directory, self.indexFile)
+    index.update(self.fileNames)
+    SyntheticSeriesGenerator(self.directory, numberOfSeries=1, slicesPerSeries=3, matrixSize=16,
+                             firstSeriesNumber=1).generate()
+    self.assertEqual(["1-1.dcm", "1-2.dcm", "1-3.dcm"], sorted(index.update(self.fileNames)))
+    self.assertEqual("COVER TEMPLATE", index.getRecord("1-1.dcm").seriesDescription)
+
+  def test_SynchronizesWithDirectory(self):
+    index = IntraopDICOMIndex(self.directory, self.indexFile)
+    index.update(self.fileNames)
+    with open(os.path.join(self.directory, "notes.txt"), "w") as f:
+      f.write("not a DICOM file")
+    index.save()
+    restored = IntraopDICOMIndex(self.directory, self.indexFile)
+    self.assertEqual(["notes.txt"], restored.synchronize(self.fileNames + ["notes.txt"]))
+    restored.ignoreFile("notes.txt", restored.getSignature("notes.txt"))
+    restored.save()
+    restored = IntraopDICOMIndex(self.directory, self.indexFile)
+    self.assertEqual([], restored.synchronize(self.fileNames + ["notes.txt"]))
+    self.assertFalse(restored.isIndexed("notes.txt"))
+    SyntheticSeriesGenerator(self.directory, numberOfSeries=1, slicesPerSeries=1, matrixSize=16,
+                             firstSeriesNumber=2).generate()
+    os.remove(os.path.join(self.directory, "1-3.dcm"))
+    self.assertEqual(["2-1.dcm"], restored.synchronize(self.fileNames[:2] + self.fileNames[3:] + ["notes.txt"]))
+    self.assertFalse(restored.isIndexed("1-3.dcm"))
+    with open(os.path.join(self.directory, "notes.txt"), "a") as f:
+      f.write(", still not a DICOM file")
+    os.remove(os.path.join(self.directory, "2-2.dcm"))
+    restored.update(["2-1.dcm"])
+    self.assertEqual(["notes.txt"], restored.synchronize(self.fileNames[:2] + self.fileNames[3:4] + ["notes.txt"]))
+
+
+class SeriesCompletenessDetectorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = IntraopDICOMIndex(tempfile.gettempdir(), None)
+    self.detector = SeriesCompletenessDetector(self.index, quietPeriod=2, timeout=30)
+
+  def runTest(self):
+    self.test_CompleteWhenExpectedImagesArrived()
+    self.test_WaitsForFurtherAcquisitions()
+    self.test_CompleteWhenContiguousAndQuiet()
+    self.test_CompleteAfterTimeout()
+
+  def addRecords(self, seriesNumber, instanceNumbers, imagesInAcquisition=None, receiveTime=100,
+                 acquisitionNumber=None):
+    for instanceNumber in instanceNumbers:
+      self.index.addRecord("%d-%d.dcm" % (seriesNumber, instanceNumber), DICOMHeaderRecord.createFromJSON({
+        "seriesNumber": seriesNumber, "instanceNumber": instanceNumber, "acquisitionNumber": acquisitionNumber,
+        "imagesInAcquisition": imagesInAcquisition, "signature": [1024, receiveTime]}))
+
+  def test_CompleteWhenExpectedImagesArrived(self):
+    self.addRecords(1, [1, 2], imagesInAcquisition=3)
+    self.assertFalse(self.detector.isComplete(1, now=110))
+    self.addRecords(1, [3], imagesInAcquisition=3)
+    self.assertFalse(self.detector.isComplete(1, now=101))
+    self.assertTrue(self.detector.isComplete(1, now=102))
+    self.assertFalse(self.detector.isComplete(2, now=102))
+
+  def test_WaitsForFurtherAcquisitions(self):
+    self.addRecords(3, [1, 2], imagesInAcquisition=2, acquisitionNumber=1)
+    self.assertFalse(self.detector.isComplete(3, now=101))
+    self.addRecords(3, [3], imagesInAcquisition=2, receiveTime=101, acquisitionNumber=2)
+    self.assertFalse(self.detector.isComplete(3, now=105))
+    self.addRecords(3, [4], imagesInAcquisition=2, receiveTime=106, acquisitionNumber=2)
+    self.assertFalse(self.detector.isComplete(3, now=107))
+    self.assertTrue(self.detector.isComplete(3, now=108))
+
+  def test_CompleteWhenContiguousAndQuiet(self):
+    self.addRecords(4, [1, 2, 4])
+    self.assertFalse(self.detector.isComplete(4, now=110))
+    self.addRecords(4, [3])
+    self.assertFalse(self.detector.isComplete(4, now=101))
+    self.assertTrue(self.detector.isComplete(4, now=102))
+
+  def test_CompleteAfterTimeout(self):
+    self.addRecords(5, [1, 3], imagesInAcquisition=10)
+    self.addRecords(6, [2, 5])
+    self.assertFalse(self.detector.isComplete(5, now=129) or self.detector.isComplete(6, now=129))
+    self.assertTrue(self.detector.isComplete(5, now=130) and self.detector.isComplete(6, now=130))
+
+
+class SeriesRegistryTest(unittest.TestCase):
+
+  class SeriesTypeManager(object):
+
+    def __init__(self):
+      self.assignedTypes = {}
+
+    def getSeriesType(self, series):
+      return self.assignedTypes.get(series, series.split(": ")[1])
+
+  def runTest(self):
+    self.test_KeepsSeriesOrderedByNumber()
+    self.test_ReplacesAndRemovesSeries()
+    self.test_UpdatesSeriesOfTypeAfterInvalidation()
+
+  def createRegistry(self):
+    self.seriesTypeManager = self.SeriesTypeManager()
+    self.registry = SeriesRegistry(self.seriesTypeManager)
+    for series in ["10: GUIDANCE", "2: COVER PROSTATE", "7: GUIDANCE", "1: COVER TEMPLATE"]:
+      self.registry.add(series)
+
+  def test_KeepsSeriesOrderedByNumber(self):
+    self.createRegistry()
+    self.assertEqual(("1: COVER TEMPLATE", "2: COVER PROSTATE", "7: GUIDANCE", "10: GUIDANCE"),
+                     self.registry.seriesList)
+    self.assertEqual(("1: COVER TEMPLATE", "2: COVER PROSTATE"), self.registry.getSeriesBefore(7))
+    self.assertEqual(7, self.registry.getSeriesNumber("7: GUIDANCE"))
+    self.assertEqual("10: GUIDANCE", self.registry.getMostRecentSeriesOfType("GUIDANCE"))
+
+  def test_ReplacesAndRemovesSeries(self):
+    self.createRegistry()
+    self.registry.add("7: GUIDANCE RETRY")
+    self.assertFalse("7: GUIDANCE" in self.registry)
+    self.assertEqual("7: GUIDANCE RETRY", self.registry.getSeries(7))
+    self.assertEqual(4, len(self.registry))
+    self.assertEqual("2: COVER PROSTATE", self.registry.remove(2))
+    self.assertIsNone(self.registry.remove(2))
+    self.assertEqual([1, 7, 10], self.registry.getSeriesNumbers())
+    self.assertEqual(("1: COVER TEMPLATE",), self.registry.getSeriesBefore(7))
+
+  def test_UpdatesSeriesOfTypeAfterInvalidation(self):
+    self.createRegistry()
+    self.assertEqual(["7: GUIDANCE", "10: GUIDANCE"], self.registry.getSeriesOfType("GUIDANCE"))
+    self.seriesTypeManager.assignedTypes["10: GUIDANCE"] = "COVER PROSTATE"
+    self.assertEqual(["7: GUIDANCE", "10: GUIDANCE"], self.registry.getSeriesOfType("GUIDANCE"))
+    self.registry.invalidateSeriesTypes()
+    self.assertEqual(["7: GUIDANCE"], self.registry.getSeriesOfType("GUIDANCE"))
+    self.assertEqual("10: GUIDANCE", self.registry.getMostRecentSeriesOfType("COVER PROSTATE"))
+
+
+class SeriesTypeManagerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.seriesTypeManager = SeriesTypeManager()
+    self.needleImagePattern = self.seriesTypeManager.getSetting("NEEDLE_IMAGE_PATTERN")
+
+  def tearDown(self):
+    self.seriesTypeManager.setSetting("NEEDLE_IMAGE_PATTERN", self.needleImagePattern)
+    SeriesTypeManager.invalidateSeriesTypePatterns()
+
+  def runTest(self):
+    self.test_FirstPatternTakesPrecedence()
+    self.test_PatternsAreMatchedLiterallyAfterReloadingConfiguration()
+    self.test_MatchesRegularExpressionPatterns()
+
+  def test_FirstPatternTakesPrecedence(self):
+    expectedTypes = {
+      "5: COVER PROSTATE GUIDANCE": SliceTrackerConstants.COVER_PROSTATE,
+      "6: GUIDANCE COVER TEMPLATE": SliceTrackerConstants.COVER_TEMPLATE,
+      "7: VIBE GUIDANCE": SliceTrackerConstants.GUIDANCE_IMAGE,
+      "8: VIBE": SliceTrackerConstants.VIBE_IMAGE,
+      "9: AX T2": SliceTrackerConstants.OTHER_IMAGE
+    }
+    for series, seriesType in expectedTypes.items():
+      self.assertEqual(seriesType, self.seriesTypeManager.computeSeriesType(series))
+
+  def test_PatternsAreMatchedLiterallyAfterReloadingConfiguration(self):
+    self.assertEqual(SliceTrackerConstants.OTHER_IMAGE, self.seriesTypeManager.computeSeriesType("10: NEEDLE (3D)"))
+    self.seriesTypeManager.setSetting("NEEDLE_IMAGE_PATTERN", "NEEDLE (3D)")
+    configFile = os.path.join(os.path.dirname(inspect.getfile(SliceTrackerConfiguration)), "..", "Resources",
+                              "default.cfg")
+    SliceTrackerConfiguration(SliceTrackerConstants.MODULE_NAME, configFile)
+    self.assertEqual(SliceTrackerConstants.GUIDANCE_IMAGE, self.seriesTypeManager.computeSeriesType("10: NEEDLE (3D)"))
+    self.assertEqual(SliceTrackerConstants.OTHER_IMAGE, self.seriesTypeManager.computeSeriesType("11: NEEDLE 3D"))
+
+  def test_MatchesRegularExpressionPatterns(self):
+    self.seriesTypeManager.setSetting("NEEDLE_IMAGE_PATTERN", r"re:NEEDLE\s*\(?3D")
+    SeriesTypeManager.invalidateSeriesTypePatterns()
+    for series in ["12: NEEDLE 3D", "13: NEEDLE(3D)"]:
+      self.assertEqual(SliceTrackerConstants.GUIDANCE_IMAGE, self.seriesTypeManager.computeSeriesType(series))
+    self.assertEqual(SliceTrackerConstants.OTHER_IMAGE, self.seriesTypeManager.computeSeriesType("14: NEEDLE 2D"))
+    self.assertEqual(SliceTrackerConstants.COVER_PROSTATE,
+                     self.seriesTypeManager.computeSeriesType("15: COVER PROSTATE NEEDLE 3D"))
+    self.seriesTypeManager.setSetting("NEEDLE_IMAGE_PATTERN", "re:NEEDLE (3D")
+    SeriesTypeManager.invalidateSeriesTypePatterns()
+    self.assertEqual(SliceTrackerConstants.OTHER_IMAGE, self.seriesTypeManager.computeSeriesType("16: NEEDLE (3D"))
+    self.assertEqual(SliceTrackerConstants.VIBE_IMAGE, self.seriesTypeManager.computeSeriesType("17: VIBE"))
+
+
+class IntraopSeriesSelectorModelTest(unittest.TestCase):
+
+  def setUp(self):
+    self.session = SliceTrackerSession()
+    self.session.seriesRegistry.clear()
+    self.session.data.resetAndInitializeData()
+    for series in ["4: GUIDANCE", "6: GUIDANCE", "8: GUIDANCE"]:
+      self.session.seriesRegistry.add(series)
+    self.model = IntraopSeriesSelectorModel()
+    self.model.update()
+
+  def tearDown(self):
+    self.session.seriesRegistry.clear()
+    self.session.data.resetAndInitializeData()
+
+  def runTest(self):
+    self.test_AppendsAndRemovesRows()
+    self.test_RecolorsOnlyChangedRows()
+    self.test_RecolorsRowsOfChangedResults()
+
+  def getRows(self):
+    return [self.model.getSeries(row) for row in range(self.model.rowCount())]
+
+  def test_AppendsAndRemovesRows(self):
+    self.assertEqual(["4: GUIDANCE", "6: GUIDANCE", "8: GUIDANCE"], self.getRows())
+    self.session.seriesRegistry.add("9: GUIDANCE")
+    self.assertEqual(1, self.model.update())
+    self.session.seriesRegistry.add("5: GUIDANCE")
+    self.session.seriesRegistry.remove(6)
+    self.assertEqual(2, self.model.update())
+    self.assertEqual(["4: GUIDANCE", "5: GUIDANCE", "8: GUIDANCE", "9: GUIDANCE"], self.getRows())
+    self.assertEqual(2, self.model.getRow("8: GUIDANCE"))
+    self.assertEqual(-1, self.model.getRow("6: GUIDANCE"))
+    self.assertEqual(0, self.model.update())
+
+  def test_RecolorsOnlyChangedRows(self):
+    result = self.session.data.createResult("8: GUIDANCE", invokeEvent=False)
+    self.model.invalidate()
+    self.assertEqual(0, self.model.update())
+    self.session.data.changeResultsStatus([result], RegistrationStatus.SKIPPED_STATUS, invokeEvent=False)
+    self.model.invalidate()
+    self.assertEqual(1, self.model.update())
+    self.assertEqual(COLOR.RED, self.model.data(self.model.index(self.model.getRow("8: GUIDANCE"), 0),
+                                                qt.Qt.BackgroundRole))
+    self.model.invalidate(["4: GUIDANCE"])
+    self.assertEqual(0, self.model.update())
+
+  def test_RecolorsRowsOfChangedResults(self):
+    result = self.session.data.createResult("4: GUIDANCE", invokeEvent=False)
+    self.session.data.changeResultsStatus([result], RegistrationStatus.REJECTED_STATUS, invokeEvent=False)
+    self.model.invalidateResults(["7: GUIDANCE"])
+    self.assertEqual(0, self.model.update())
+    self.model.invalidateResults([result.name, "7: GUIDANCE"])
+    self.assertEqual(1, self.model.update())
+    self.assertEqual(COLOR.GRAY, self.model.data(self.model.index(self.model.getRow("4: GUIDANCE"), 0),
+                                                 qt.Qt.BackgroundRole))
+
+
+class SkipSeriesTest(unittest.TestCase):
+
+  SERIES = ["5: GUIDANCE", "6: GUIDANCE", "7: GUIDANCE"]
+
+  def setUp(self):
+    self.session = SliceTrackerSession()
+    self.session.data.resetAndInitializeData()
+    self.changedResults = []
+    self.numberOfSaves = 0
+    self.session.createResultForSkippedSeries = lambda series: self.session.data.createResult(series,
+                                                                                               invokeEvent=False)
+    self.session.save = self.onSave
+    self.session.data.addEventObserver(self.session.data.ResultsStatusChangedEvent, self.onResultsStatusChanged)
+
+  def tearDown(self):
+    self.session.data.removeEventObserver(self.session.data.ResultsStatusChangedEvent, self.onResultsStatusChanged)
+    del self.session.createResultForSkippedSeries
+    del self.session.save
+    self.session.data.resetAndInitializeData()
+
+  def onSave(self):
+    self.numberOfSaves += 1
+    return True, ""
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onResultsStatusChanged(self, caller, event, callData):
+    self.changedResults.append(ast.literal_eval(callData))
+
+  def runTest(self):
+    self.test_SkipsSeriesWithOneEventAndOneSave()
+
+  def test_SkipsSeriesWithOneEventAndOneSave(self):
+    results = self.session.skipSeries(self.SERIES)
+    self.assertEqual([self.SERIES], self.changedResults)
+    self.assertEqual(1, self.numberOfSaves)
+    self.assertTrue(all(result.skipped for result in results))
+    self.assertTrue(all(self.session.data.registrationResultWasSkipped(series) for series in self.SERIES))
+    self.session.skipSeries(["8: GUIDANCE"], invokeEvent=False)
+    self.assertEqual(1, len(self.changedResults))
+    self.assertEqual(1, self.numberOfSaves)
+    self.assertTrue(self.session.data.registrationResultWasSkipped("8: GUIDANCE"))
+
+
+class NodeStorageTest(unittest.TestCase):
+
+  def setUp(self):
+    self.outputDir = tempfile.mkdtemp(prefix="SliceTrackerStorageTest")
+    self.storage = NodeStorage()
+    self.numberOfWriterThreads = self.storage.writer.numberOfThreads if self.storage.writer else 0
+    self.storage.setNumberOfWriterThreads(0)
+
+  def tearDown(self):
+    self.storage.setNumberOfWriterThreads(self.numberOfWriterThreads)
+    shutil.rmtree(self.outputDir, ignore_errors=True)
+
+  def runTest(self):
+    self.test_WritesNodeDataOnlyIfChanged()
+    self.test_ForgetsSavedStateOfFailedWrites()
+    self.test_CopiesFilesOnlyIfChanged()
+
+  def markStale(self, fileName):
+    with open(fileName, "w") as f:
+      f.write("stale")
+
+  def isStale(self, fileName):
+    with open(fileName) as f:
+      return f.read() == "stale"
+
+  def test_WritesNodeDataOnlyIfChanged(self):
+    volume = LoadedSeriesCacheTest.createVolume("5-GUIDANCE")
+    fileName = os.path.join(self.outputDir, "5-GUIDANCE.nrrd")
+    self.assertEqual((True, "5-GUIDANCE"), self.storage.saveNodeData(volume, self.outputDir, ".nrrd"))
+    self.assertFalse(self.isStale(fileName))
+    self.markStale(fileName)
+    self.storage.saveNodeData(volume, self.outputDir, ".nrrd")
+    self.assertTrue(self.isStale(fileName))
+    volume.GetImageData().Modified()
+    self.storage.saveNodeData(volume, self.outputDir, ".nrrd")
+    self.assertFalse(self.isStale(fileName))
+    os.remove(fileName)
+    self.storage.saveNodeData(volume, self.outputDir, ".nrrd")
+    self.assertTrue(os.path.exists(fileName))
+    slicer.mrmlScene.RemoveNode(volume)
+
+  def test_ForgetsSavedStateOfFailedWrites(self):
+    self.storage.setNumberOfWriterThreads(2)
+    volume = LoadedSeriesCacheTest.createVolume("6-GUIDANCE")
+    fileName = os.path.join(self.outputDir, "6-GUIDANCE.nrrd")
+    os.makedirs(fileName + ".writing")
+    self.assertEqual((True, "6-GUIDANCE"), self.storage.saveNodeData(volume, self.outputDir, ".nrrd"))
+    self.assertEqual([os.path.abspath(fileName)], self.storage.waitForPendingWrites())
+    self.assertFalse(self.storage.isUpToDate(fileName, self.storage.getNodeState(volume)))
+    os.rmdir(fileName + ".writing")
+    self.storage.saveNodeData(volume, self.outputDir, ".nrrd")
+    self.assertEqual([], self.storage.waitForPendingWrites())
+    self.assertTrue(self.storage.isUpToDate(fileName, self.storage.getNodeState(volume)))
+    self.storage.setNumberOfWriterThreads(0)
+    slicer.mrmlScene.RemoveNode(volume)
+
+  def test_CopiesFilesOnlyIfChanged(self):
+    source = os.path.join(self.outputDir, "source.txt")
+    destination = os.path.join(self.outputDir, "destination.txt")
+    with open(source, "w") as f:
+      f.write("source")
+    self.assertTrue(self.storage.copyFile(source, destination))
+    self.assertFalse(self.storage.copyFile(source, destination))
+    with open(source, "w") as f:
+      f.write("changed source")
+    self.assertTrue(self.storage.copyFile(source, destination))
+    os.remove(destination)
+    self.assertTrue(self.storage.copyFile(source, destination))
+
+
+class AsyncNodeWriterTest(unittest.TestCase):
+
+  class Snapshot(object):
+
+    def __init__(self, content, delay=0):
+      self.content = content
+      self.delay = delay
+
+    def write(self, fileName):
+      time.sleep(self.delay)
+      if self.content is None:
+        raise IOError("Cannot write %s" % fileName)
+      with open(fileName, "w") as f:
+        f.write(self.content)
+
+  def setUp(self):
+    self.outputDir = tempfile.mkdtemp(prefix="SliceTrackerWriterTest")
+    self.writer = AsyncNodeWriter(numberOfThreads=3)
+
+  def tearDown(self):
+    self.writer.stop()
+    shutil.rmtree(self.outputDir, ignore_errors=True)
+
+  def runTest(self):
+    self.test_AppliesWritesOfSameFileInOrder()
+    self.test_WaitsForPendingWrites()
+    self.test_ReportsFailedWrites()
+
+  def read(self, fileName):
+    with open(fileName) as f:
+      return f.read()
+
+  def test_AppliesWritesOfSameFileInOrder(self):
+    fileName = os.path.join(self.outputDir, "targets.fcsv")
+    for index in range(5):
+      self.writer.write(self.Snapshot(str(index), delay=0.05 if index % 2 else 0), fileName)
+    self.assertEqual([], self.writer.waitForPendingWrites())
+    self.assertEqual("4", self.read(fileName))
+
+  def test_WaitsForPendingWrites(self):
+    fileNames = [os.path.join(self.outputDir, "%d.nrrd" % index) for index in range(6)]
+    for fileName in fileNames:
+      self.writer.write(self.Snapshot(os.path.basename(fileName), delay=0.05), fileName)
+    self.assertTrue(any(self.writer.isPending(fileName) for fileName in fileNames))
+    self.assertEqual([], self.writer.waitForPendingWrites())
+    self.assertFalse(any(self.writer.isPending(fileName) for fileName in fileNames))
+    self.assertEqual([os.path.basename(fileName) for fileName in fileNames],
+                     [self.read(fileName) for fileName in fileNames])
+    self.assertFalse(any(name.endswith(".writing") for name in os.listdir(self.outputDir)))
+
+  def test_ReportsFailedWrites(self):
+    fileName = os.path.join(self.outputDir, "failed.nrrd")
+    failures = []
+    self.writer.write(self.Snapshot(None), fileName, onFailure=lambda: failures.append(fileName))
+    self.assertEqual([fileName], self.writer.waitForPendingWrites())
+    self.assertEqual([fileName], failures)
+    self.assertEqual([], self.writer.waitForPendingWrites())
+    self.assertFalse(os.path.exists(fileName))
+
+
+class FiducialsSnapshotTest(unittest.TestCase):
+
+  LABELS = [("F-1", ""), ("needle, tip", "left"), ('"base"', 'say "hi", then "bye"')]
+
+  def setUp(self):
+    self.outputDir = tempfile.mkdtemp(prefix="SliceTrackerFiducialsTest")
+    self.fiducials = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode", "targets")
+    for index, (label, description) in enumerate(self.LABELS):
+      self.fiducials.AddFiducial(index * 1.5, -index / 3.0, 10.0 + index, label)
+      self.fiducials.SetNthMarkupDescription(index, description)
+    self.fiducials.SetNthFiducialLocked(1, True)
+
+  def tearDown(self):
+    slicer.mrmlScene.RemoveNode(self.fiducials)
+    shutil.rmtree(self.outputDir, ignore_errors=True)
+
+  def runTest(self):
+    self.test_QuotesFieldsLikeStorageNode()
+    self.test_WrittenFiducialsReadBack()
+
+  def test_QuotesFieldsLikeStorageNode(self):
+    self.assertEqual("F-1", FiducialsSnapshot.toStorageFormat("F-1"))
+    self.assertEqual('"needle, tip"', FiducialsSnapshot.toStorageFormat("needle, tip"))
+    self.assertEqual('"say ""hi"""', FiducialsSnapshot.toStorageFormat('say "hi"'))
+
+  def test_WrittenFiducialsReadBack(self):
+    fileName = os.path.join(self.outputDir, "targets.fcsv")
+    FiducialsSnapshot(self.fiducials).write(fileName)
+    success, loaded = slicer.util.loadMarkupsFiducialList(fileName, returnNode=True)
+    self.assertTrue(success)
+    self.assertEqual(len(self.LABELS), loaded.GetNumberOfFiducials())
+    position, loadedPosition = [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+    for index, (label, description) in enumerate(self.LABELS):
+      self.fiducials.GetNthFiducialPosition(index, position)
+      loaded.GetNthFiducialPosition(index, loadedPosition)
+      self.assertEqual(position, loadedPosition)
+      self.assertEqual(label, loaded.GetNthFiducialLabel(index))
+      self.assertEqual(description, loaded.GetNthMarkupDescription(index))
+      self.assertEqual(self.fiducials.GetNthFiducialLocked(index), loaded.GetNthFiducialLocked(index))
+    slicer.mrmlScene.RemoveNode(loaded)
+
+
+class CompressionPolicyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.outputDir = tempfile.mkdtemp(prefix="SliceTrackerCompressionTest")
+    self.volume = LoadedSeriesCacheTest.createVolume("5-GUIDANCE")
+    self.volume.GetImageData().SetDimensions(256, 256, 26)
+    self.volume.GetImageData().AllocateScalars(vtk.VTK_SHORT, 1)
+    voxels = slicer.util.arrayFromVolume(self.volume)
+    voxels[:] = (numpy.arange(voxels.size) % 3001).reshape(voxels.shape)
+    self.volume.SetSpacing(0.5, 0.5, 3.6)
+
+  def tearDown(self):
+    slicer.mrmlScene.RemoveNode(self.volume)
+    shutil.rmtree(self.outputDir, ignore_errors=True)
+
+  def runTest(self):
+    self.test_WrittenVolumesReadBack()
+    self.test_ParallelGzipWritesSingleStream()
+
+  def test_WrittenVolumesReadBack(self):
+    for codec in CompressionPolicy.CODECS:
+      compression = CompressionPolicy(codec, level=1, numberOfThreads=4)
+      fileName = os.path.join(self.outputDir, "%s.nrrd" % codec)
+      VolumeSnapshot(self.volume, compression).write(fileName)
+      compression.stop()
+      success, loaded = slicer.util.loadVolume(fileName, returnNode=True)
+      self.assertTrue(success, codec)
+      self.assertTrue(numpy.array_equal(slicer.util.arrayFromVolume(self.volume), slicer.util.arrayFromVolume(loaded)),
+                      codec)
+      self.assertEqual(self.volume.GetSpacing(), loaded.GetSpacing())
+      slicer.mrmlScene.RemoveNode(loaded)
+
+  def test_ParallelGzipWritesSingleStream(self):
+    compression = CompressionPolicy(CompressionPolicy.PARALLEL_GZIP, level=1, numberOfThreads=4)
+    for size in [0, 1, CompressionPolicy.BLOCK_SIZE, 3 * CompressionPolicy.BLOCK_SIZE + 1]:
+      data = bytes(bytearray(index % 251 for index in range(size)))
+      f = io.BytesIO()
+      compression.write(f, data)
+      decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+      self.assertEqual(data, decompressor.decompress(f.getvalue()))
+      self.assertTrue(decompressor.eof)
+      self.assertEqual(b"", decompressor.unused_data)
+    compression.stop()
+
+
+class SessionJournalTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp(prefix="SliceTrackerJournalTest")
+    self.snapshotFileName = os.path.join(self.directory, "results.json")
+    self.journalFileName = SessionJournal.getJournalFileName(self.snapshotFileName)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def runTest(self):
+    self.test_ReadingReplaysSavedChanges()
+    self.test_ResumingCompactsJournal()
+    self.test_IgnoresCutOffLastLine()
+    self.test_CompactsAfterThreshold()
+
+  @staticmethod
+  def createData(*statuses):
+    return {
+      "procedureEvents": {"caseStarted": "2017-01-01 10:00:00"},
+      "results": [{"name": "%d: GUIDANCE" % (index + 5), "status": {"state": status}}
+                  for index, status in enumerate(statuses)]
+    }
+
+  def test_ReadingReplaysSavedChanges(self):
+    journal = SessionJournal(self.snapshotFileName)
+    self.assertTrue(journal.save(self.createData("approved")))
+    self.assertFalse(os.path.exists(self.journalFileName))
+    data = self.createData("rejected", "skipped")
+    data["completed"] = True
+    self.assertTrue(journal.save(data))
+    self.assertFalse(journal.save(data))
+    self.assertEqual(3, len(SessionJournal.readEntries(self.journalFileName)))
+    self.assertEqual(data, SessionJournal.read(self.snapshotFileName))
+
+  def test_ResumingCompactsJournal(self):
+    self.assertTrue(os.path.exists(self.journalFileName))
+    data = SessionJournal.read(self.snapshotFileName)
+    journal = SessionJournal(self.snapshotFileName)
+    journal.save(data)
+    self.assertFalse(os.path.exists(self.journalFileName))
+    with open(self.snapshotFileName) as f:
+      self.assertEqual(data, json.load(f))
+
+  def test_IgnoresCutOffLastLine(self):
+    journal = SessionJournal(self.snapshotFileName)
+    journal.save(self.createData("approved"))
+    journal.save(self.createData("approved", "skipped"))
+    with open(self.journalFileName, "a") as f:
+      f.write('{"event": "resultCreated", "result": {"name": "7: GUI')
+    self.assertEqual(self.createData("approved", "skipped"), SessionJournal.read(self.snapshotFileName))
+    journal.save(self.createData("approved", "skipped", "rejected"))
+    self.assertEqual(self.createData("approved", "skipped", "rejected"), SessionJournal.read(self.snapshotFileName))
+
+  def test_CompactsAfterThreshold(self):
+    journal = SessionJournal(self.snapshotFileName)
+    journal.COMPACTION_THRESHOLD = 3
+    journal.save(self.createData())
+    for numberOfResults in range(1, 4):
+      journal.save(self.createData(*["approved"] * numberOfResults))
+    self.assertEqual(3, len(SessionJournal.readEntries(self.journalFileName)))
+    journal.save(self.createData(*["approved"] * 4))
+    self.assertFalse(os.path.exists(self.journalFileName))
+    self.assertEqual(self.createData(*["approved"] * 4), SessionJournal.read(self.snapshotFileName))
+
+
+class ContentStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.outputDir = tempfile.mkdtemp(prefix="SliceTrackerStoreTest")
+    self.storage = NodeStorage()
+    self.numberOfWriterThreads = self.storage.writer.numberOfThreads if self.storage.writer else 0
+    self.storage.setNumberOfWriterThreads(0)
+
+  def tearDown(self):
+    self.storage.setNumberOfWriterThreads(self.numberOfWriterThreads)
+    shutil.rmtree(self.outputDir, ignore_errors=True)
+
+  def runTest(self):
+    self.test_StoresIdenticalVolumesOnce()
+    self.test_HashesVolumesOnWriterThreads()
+    self.test_SavesResultAgainAfterFailedStore()
+    self.test_MigratesIdenticalVolumesOfCase()
+
+  @staticmethod
+  def createLabels(names):
+    volumes = [LoadedSeriesCacheTest.createVolume(name) for name in names]
+    for volume in volumes:
+      volume.GetImageData().GetPointData().GetScalars().FillComponent(0, 7)
+    return volumes
+
+  def test_StoresIdenticalVolumesOnce(self):
+    volumes = self.createLabels(["5-GUIDANCE-label", "5-GUIDANCE-retry-label"])
+    hashes = [self.storage.storeNodeData(volume, self.outputDir)[1] for volume in volumes]
+    self.assertEqual(hashes[0], hashes[1])
+    self.assertEqual([hashes[0] + ".nrrd"], os.listdir(os.path.join(self.outputDir, "store")))
+    for volume in volumes:
+      slicer.mrmlScene.RemoveNode(volume)
+
+  def test_HashesVolumesOnWriterThreads(self):
+    self.storage.setNumberOfWriterThreads(2)
+    volumes = self.createLabels(["6-GUIDANCE-label", "6-GUIDANCE-retry-label"])
+    volumes[1].GetImageData().GetPointData().GetScalars().FillComponent(0, 3)
+    self.storage.computeContentHashes(volumes + volumes, whileWaiting=slicer.app.processEvents)
+    hashes = [VolumeSnapshot.computeContentHash(volume) for volume in volumes]
+    self.assertEqual(hashes, [self.storage.getContentHash(volume) for volume in volumes])
+    self.assertEqual(hashes, [self.storage.storeNodeData(volume, self.outputDir)[1] for volume in volumes])
+    self.assertEqual([], self.storage.waitForPendingWrites())
+    self.assertTrue(all(os.path.exists(self.storage.getStoredFileName(self.outputDir, contentHash))
+                        for contentHash in hashes))
+    for volume in volumes:
+      slicer.mrmlScene.RemoveNode(volume)
+
+  def test_SavesResultAgainAfterFailedStore(self):
+    self.storage.setNumberOfWriterThreads(1)
+    data = SliceTrackerSession().data
+    data.resetAndInitializeData()
+    result = data.createResult("5: GUIDANCE", invokeEvent=False)
+    result.volumes.fixed = self.createLabels(["5-GUIDANCE"])[0]
+    result.volumes.fixed.GetImageData().GetPointData().GetScalars().FillComponent(0, 11)
+    storedFileName = self.storage.getStoredFileName(self.outputDir, self.storage.getContentHash(result.volumes.fixed))
+    os.makedirs(storedFileName + ".writing")
+    self.assertEqual([], data.saveRegistrationResults(self.outputDir))
+    self.assertEqual([os.path.abspath(storedFileName)], self.storage.waitForPendingWrites())
+    os.rmdir(storedFileName + ".writing")
+    data.saveRegistrationResults(self.outputDir)
+    self.assertEqual([], self.storage.waitForPendingWrites())
+    self.assertTrue(os.path.exists(storedFileName))
+    self.assertEqual(set(), self.storage.popFailedStores())
+    slicer.mrmlScene.RemoveNode(result.volumes.fixed)
+    data.resetAndInitializeData()
+
+  def test_MigratesIdenticalVolumesOfCase(self):
+    caseDir = os.path.join(self.outputDir, "Case001", "SliceTrackerOutputs")
+    os.makedirs(caseDir)
+    fileNames = ["6-GUIDANCE-label.nrrd", "7-GUIDANCE-label.nrrd"]
+    for volume, fileName in zip(self.createLabels(["6-GUIDANCE-label", "7-GUIDANCE-label"]), fileNames):
+      VolumeSnapshot(volume).write(os.path.join(caseDir, fileName))
+      slicer.mrmlScene.RemoveNode(volume)
+    snapshotFileName = os.path.join(caseDir, "results.json")
+    with open(snapshotFileName, "w") as f:
+      json.dump({"results": [{"name": "%s: GUIDANCE" % fileName.split("-")[0], "labels": {"fixed": fileName}}
+                             for fileName in fileNames]}, f)
+
+    report = storeMigration.main([self.outputDir, "--dry-run"])
+    self.assertEqual((2, 1), (report["files"], report["storedFiles"]))
+    self.assertEqual(sorted(fileNames + ["results.json"]), sorted(os.listdir(caseDir)))
+
+    storeMigration.main([self.outputDir])
+    references = [result["labels"]["fixed"] for result in SessionJournal.read(snapshotFileName)["results"]]
+    self.assertEqual(["6-GUIDANCE-label", "7-GUIDANCE-label"], [reference["name"] for reference in references])
+    self.assertEqual(references[0]["hash"], references[1]["hash"])
+    self.assertEqual([references[0]["hash"] + ".nrrd"], os.listdir(os.path.join(caseDir, "store")))
+    self.assertFalse(any(os.path.exists(os.path.join(caseDir, fileName)) for fileName in fileNames))
+
+
+@unittest.skipIf(watch.AE is None, "pynetdicom is not available")
+class DICOMSenderLoopbackTest(unittest.TestCase):
+
+  PORT = 11199
+
+  def setUp(self):
+    from pynetdicom import AE, AllStoragePresentationContexts, evt
+    self.received = []
+    self.associations = set()
+    applicationEntity = AE()
+    applicationEntity.supported_contexts = AllStoragePresentationContexts
+    self.storescp = applicationEntity.start_server(("127.0.0.1", self.PORT), block=False,
+                                                   evt_handlers=[(evt.EVT_C_STORE, self.onCStore)])
+    self.directory = tempfile.mkdtemp(prefix="SliceTrackerSenderTest")
+    self.series = SyntheticSeriesGenerator(self.directory, numberOfSeries=3, slicesPerSeries=4,
+                                           matrixSize=16).generate()
+
+  def tearDown(self):
+    self.storescp.shutdown()
+    shutil.rmtree(self.directory, ignore_errors=True)
+
+  def onCStore(self, event):
+    self.received.append(event.dataset.SOPInstanceUID)
+    self.associations.add(id(event.assoc))
+    return 0x0000
+
+  def runTest(self):
+    self.test_SendsAllFilesOverPersistentAssociations()
+
+  def test_SendsAllFilesOverPersistentAssociations(self):
+    sender = watch.StorageSCUSender("127.0.0.1", self.PORT, numberOfAssociations=2)
+    files = [f for seriesNumber, seriesFiles in self.series for f in seriesFiles]
+    self.assertEqual([], sender.send(files[:4]))
+    self.assertEqual([], sender.send(files[4:]))
+    sender.close()
+    self.assertEqual(len(files), len(self.received))
+    self.assertLessEqual(len(self.associations), 2)